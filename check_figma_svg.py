@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+SVG 精简自检：路径数据与变换取整的回归用例（figma_svg.compact_path / round_transform / minify_svg）。
+
+用法：python check_figma_svg.py（只用标准库与本仓库代码）
+"""
+
+import sys
+
+from figma_svg import compact_path, minify_svg, round_transform
+
+# (输入, 精度, 期望输出, 说明)
+PATH_CASES = [
+    ("M 10.123456 20 L 30 -0.5 Z", 3, "M10.123 20L30-.5Z", "取整并去掉多余分隔符"),
+    ("M0 0a1 1 0 011 1", 3, "M0 0a1 1 0 0 1 1 1", "紧凑写法的弧线标志位不与后面的坐标合并"),
+    ("M0,0 A10,10 0 1,0 20.12345,-0.5", 2, "M0 0A10 10 0 1 0 20.12-.5", "弧线标志位原样保留，坐标取整"),
+    ("m0 0a.5.5 0 1 1 1e-3 2", 3, "m0 0a.5.5 0 1 1 .001 2", "弧线半径为 .5 这类数字"),
+    ("M0 0a1 1 0 0 1 1 1 1 1 0 110 10", 3, "M0 0a1 1 0 0 1 1 1 1 1 0 1 1 0 10",
+     "同一 a 命令的第二组参数也按标志位切分"),
+    ("M1 2 3 4h5v-6", 2, "M1 2 3 4h5v-6", "隐式重复的参数组"),
+    ("M0 0a1 1 0 2 1 1 1", 3, "M0 0a1 1 0 2 1 1 1", "无法解析的路径原样返回"),
+]
+TRANSFORM_CASES = [
+    ("scale(0.00390625)", 3, "scale(0.00390625)", "小缩放系数按有效数字保留"),
+    ("matrix(1.23456789 0 0 1 10.123456 -5)", 3, "matrix(1.23457 0 0 1 10.1235 -5)", "矩阵分量保留 6 位有效数字"),
+]
+
+
+def main() -> bool:
+    failures = 0
+    for label, func, cases in (("compact_path", compact_path, PATH_CASES),
+                               ("round_transform", round_transform, TRANSFORM_CASES)):
+        for value, precision, expected, note in cases:
+            got = func(value, precision)
+            ok = got == expected
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {label}: {note}" + ("" if ok else f"\n   输入 {value!r}\n   期望 {expected!r}\n   得到 {got!r}"))
+
+    svg = '<svg xmlns="http://www.w3.org/2000/svg"><path d="M0 0a1 1 0 011 1"/></svg>'
+    ok = 'd="M0 0a1 1 0 0 1 1 1"' in minify_svg(svg, 3)
+    failures += not ok
+    print(f"{'✅' if ok else '❌'} minify_svg: 整个文档精简时弧线标志位保持不变")
+
+    print()
+    if failures:
+        print(f"❌ SVG 精简自检失败：{failures} 项")
+        return False
+    print("✅ SVG 精简自检通过")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
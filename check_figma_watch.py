@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+监视模式自检：在本机起一个 Figma API 替身（FIGMA_API_BASE 指向它），
+用 FileWatcher.run(max_checks=...) 走完整个监视流程，确认只有改动 / 改名的画板被重新导出，
+删除和改名前的画板文件被删掉，未变化的画板文件原样保留。
+
+用法：python check_figma_watch.py（只用标准库与本仓库代码，不访问真实的 Figma）
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FILE_KEY = "watchCheck"
+PAGE = "Page 1"
+
+
+class FakeFigma:
+    """替身 API 的状态：画板 {id: {"name", "rev"}} 与文件版本；记录每个画板被下载的次数。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 1
+        self.frames = {
+            "1:1": {"name": "Home", "rev": 1},
+            "1:2": {"name": "Profile", "rev": 1},
+            "1:3": {"name": "Settings", "rev": 1},
+            "1:4": {"name": "About", "rev": 1},
+        }
+        self.downloads: dict[str, int] = {}
+        self.full_fetches = 0
+
+    def document(self) -> dict:
+        children = [
+            {
+                "id": nid, "name": frame["name"], "type": "FRAME",
+                "absoluteBoundingBox": {"x": 0, "y": 0, "width": 100, "height": 100},
+                "children": [{"id": f"{nid}:{frame['rev']}", "name": f"rev {frame['rev']}", "type": "RECTANGLE",
+                              "absoluteBoundingBox": {"x": 0, "y": 0, "width": 10, "height": 10}}],
+            }
+            for nid, frame in self.frames.items()
+        ]
+        return {"id": "0:0", "type": "DOCUMENT", "children": [{"id": "0:1", "name": PAGE, "type": "CANVAS",
+                                                               "children": children}]}
+
+    def render(self, node_id: str) -> bytes:
+        """同一画板同一修订的内容固定，修订变化后内容也变化。"""
+        rev = self.frames[node_id]["rev"]
+        return b"\x89PNG\r\n\x1a\n" + f"{node_id}@{rev}".encode()
+
+
+def _handler(fake: FakeFigma):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, body, content_type="application/json") -> None:
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            host = f"http://{self.headers['Host']}"
+            with fake.lock:
+                if url.path == f"/v1/files/{FILE_KEY}":
+                    if query.get("depth") == ["1"]:
+                        return self._send({"version": str(fake.version), "name": "Watch",
+                                           "document": {"id": "0:0", "type": "DOCUMENT", "children": []}})
+                    fake.full_fetches += 1
+                    return self._send({"version": str(fake.version), "name": "Watch", "document": fake.document()})
+                if url.path == f"/v1/images/{FILE_KEY}":
+                    ids = query["ids"][0].split(",")
+                    images = {nid: f"{host}/cdn/{nid.replace(':', '_')}_{fake.frames[nid]['rev']}.png" for nid in ids}
+                    return self._send({"err": None, "images": images})
+                if url.path.startswith("/cdn/"):
+                    node_id = url.path.rsplit("/", 1)[1].rsplit("_", 1)[0].replace("_", ":")
+                    fake.downloads[node_id] = fake.downloads.get(node_id, 0) + 1
+                    return self._send(fake.render(node_id), "image/png")
+            self.send_response(404)
+            self.end_headers()
+
+    return Handler
+
+
+def _snapshot(output_dir: Path) -> dict[Path, bytes]:
+    return {p.relative_to(output_dir): p.read_bytes() for p in output_dir.rglob("*.png")}
+
+
+def main() -> bool:
+    fake = FakeFigma()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tmp = tempfile.TemporaryDirectory(prefix="figmad-watch-check-")
+    # 每次请求时读取 FIGMA_API_BASE
+    os.environ["FIGMA_API_BASE"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["FIGMAD_CACHE_DIR"] = str(Path(tmp.name) / "cache")
+
+    import download_figma_image as core
+    from figma_client import FigmaClient
+    from figma_render_cache import RenderUrlCache
+    from figma_watch import FileWatcher
+
+    output_dir = Path(tmp.name) / "out"
+    args = core.build_parser().parse_args([
+        "--space", f"https://www.figma.com/design/{FILE_KEY}/watch", "--output-dir", str(output_dir),
+        "--no-compress", "--watch",
+    ])
+    export_options = dict(scale=args.scale, format=args.format, scales=None, native_scales=False, compress=False)
+    failures = []
+
+    def expect(ok: bool, message: str) -> None:
+        print(f"{'✅' if ok else '❌'} {message}")
+        if not ok:
+            failures.append(message)
+
+    def path_of(node_id: str, name: str) -> Path:
+        return core.generate_space_output_filename(PAGE, name, node_id, args.scale, args.format, output_dir)
+
+    def watch_once(checks: int) -> bool:
+        # 每轮新建 FileWatcher 与客户端，等同于重启监视进程：从快照恢复，不共享内存缓存
+        client = FigmaClient("check-token", None, render_cache=RenderUrlCache(persist=False))
+        watcher = FileWatcher(client, FILE_KEY, FILE_KEY, output_dir, args, None, export_options, interval=1)
+        return watcher.run(max_checks=checks)
+
+    try:
+        core.set_api_rate(None)
+
+        print("\n== 第 1 轮：没有快照，完整导出 ==")
+        expect(watch_once(0), "首次同步成功")
+        before = _snapshot(output_dir)
+        expect(len(before) == 4 and all(fake.downloads.get(nid) == 1 for nid in fake.frames),
+               f"导出全部 4 个画板（{len(before)} 个文件）")
+
+        print("\n== 第 2 轮：改动 Home、改名 Profile → Account、删除 Settings，About 不变 ==")
+        with fake.lock:
+            fake.frames["1:1"]["rev"] = 2
+            fake.frames["1:2"]["name"] = "Account"
+            del fake.frames["1:3"]
+            fake.version = 2
+            fake.downloads.clear()
+        about = path_of("1:4", "About")
+        about_mtime = about.stat().st_mtime_ns
+        expect(watch_once(1), "增量同步成功")
+        after = _snapshot(output_dir)
+        home = path_of("1:1", "Home").relative_to(output_dir)
+        account = path_of("1:2", "Account").relative_to(output_dir)
+        expect(sorted(fake.downloads) == ["1:1", "1:2"], f"只重新下载改动和改名的画板（{sorted(fake.downloads)}）")
+        expect(after.get(home) == fake.render("1:1") and after[home] != before[home], "Home 已按新内容重写")
+        expect(after.get(account) == fake.render("1:2"), "Account 写到新路径")
+        expect(not path_of("1:2", "Profile").exists(), "改名前的 Profile 文件已删除")
+        expect(not path_of("1:3", "Settings").exists(), "已删除画板 Settings 的文件已删除")
+        expect(about.stat().st_mtime_ns == about_mtime and after.get(about.relative_to(output_dir)) == before[
+            about.relative_to(output_dir)], "未变化的 About 没有被重写")
+        expect(set(after) == {home, account, about.relative_to(output_dir)}, f"输出目录只剩 3 个文件（{len(after)} 个）")
+
+        print("\n== 第 3 轮：版本未变 ==")
+        with fake.lock:
+            fake.downloads.clear()
+            fetches = fake.full_fetches
+        expect(watch_once(1), "检查成功")
+        expect(not fake.downloads and fake.full_fetches == fetches, "版本未变时不拉取文件结构、不下载")
+        expect(_snapshot(output_dir) == after, "输出目录保持不变")
+    finally:
+        server.shutdown()
+        server.server_close()
+        tmp.cleanup()
+
+    print()
+    if failures:
+        print(f"❌ 监视模式自检失败：{len(failures)} 项")
+        return False
+    print("✅ 监视模式自检通过")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -8,420 +8,424 @@ import os
 import sys
 import argparse
 import time
-import requests
 import json
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
 
-# Figma API 请求重试配置
-FIGMA_API_RETRIES = 4
-FIGMA_API_TIMEOUT = 90
-FIGMA_API_RETRY_DELAY = 2
+from figma_api import (
+    FIGMA_API_RETRIES, FIGMA_API_RETRY_DELAY, FILE_WORKERS, generate_output_filename, get_config_value,
+    get_image_fill_urls, parse_figma_url, resolve_figma_token, resolve_tinypng_key,
+)
+from figma_archive import ArchiveSink, archive_kind
+from figma_batching import DEFAULT_PIXEL_BUDGET_MP
+from figma_compress import TinyPngKeyPool
+from figma_dedup import ContentStore, group_identical, link_or_copy, render_key
+from figma_http import TokenPool, set_api_rate
+from figma_render_cache import RenderUrlCache
+from figma_selection import NodeIndex, add_selection_arguments, selection_from_args
+from figma_schedule import print_plan
+from figma_scales import RASTER_FORMATS, parse_scales, pillow_available, variant_path
+from figma_progress import TransferProgress
+from figma_svg import add_svg_arguments, svg_optimizer_from_args
+from figma_transcode import add_transcode_arguments, transcode_error, transcoded_path, transcoder_from_args
+from figma_transfer import download_to_file
 
-# TinyPNG API 配置
-TINYPNG_API_URL = "https://api.tinify.com/shrink"
+# 图片填充原图下载配置（--image-fills）
+IMAGE_FILL_WORKERS = 8
+IMAGE_FILL_DIR = "image_fills"
+IMAGE_FILL_MAP = "image_fills.json"
 
 
-def load_env_file(file_path):
+def collect_frame_nodes(index, selection=None):
     """
-    从 .env 文件中加载环境变量
+    通过节点索引（NodeIndex，迭代遍历文档树）收集可导出的节点，默认为每页的直接子节点（画板）
     
-    支持格式：
-    - KEY=value
-    - KEY="value"
-    - KEY='value'
-    - # 注释行
-    - 空行
-    
-    返回: dict 包含加载的环境变量
+    selection: NodeIndex.select 的筛选参数（页面正则、名称通配、类型、层级等）
+    返回: [(node_id, node_name, page_name), ...]
     """
-    env_vars = {}
-    if not file_path or not file_path.exists():
-        return env_vars
-    
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                # 跳过空行和注释
-                if not line or line.startswith('#'):
-                    continue
-                
-                # 解析 KEY=value
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    # 移除引号
-                    if (value.startswith('"') and value.endswith('"')) or \
-                       (value.startswith("'") and value.endswith("'")):
-                        value = value[1:-1]
-                    
-                    env_vars[key] = value
-    except Exception as e:
-        print(f"⚠️  读取环境变量文件失败 {file_path}: {e}")
-    
-    return env_vars
+    return [(e['id'], e['name'], e['page']) for e in index.select(**(selection or {}))]
+
 
+def guess_image_extension(path):
+    """按文件头判断原图格式，未知时返回 'bin'"""
+    with open(path, 'rb') as f:
+        head = f.read(16)
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[4:12] in (b'ftypavif', b'ftypheic', b'ftypmif1'):
+        return 'avif' if head[8:12] == b'avif' else 'heic'
+    return 'bin'
 
-def get_config_value(key, env_file=None, default=None):
+
+def download_image_fills(file_key, index, nodes_list, access_token, output_dir, progress=None):
     """
-    按优先级获取配置值：
-    1. 指定的环境变量文件
-    2. 当前目录下的 .env 文件
-    3. 终端环境变量
+    直接下载选中节点（含子树）里图片填充的原始位图，不经 /v1/images 渲染、不重新编码
+    
+    - 一次 /v1/files/{key}/images 请求拿到全部 imageRef 的地址
+    - 每个 imageRef 只下载一次，多线程并发；已下载过的直接复用
+    - 输出 {output_dir}/image_fills/{imageRef}.{ext}，映射写入 {output_dir}/image_fills.json：
+      节点 → imageRef → 文件路径
     
-    返回: 配置值或 None
+    返回: 是否全部成功
     """
-    # 优先级 1: 指定的环境变量文件
-    if env_file:
-        env_vars = load_env_file(Path(env_file))
-        if key in env_vars:
-            return env_vars[key]
+    fills = []
+    for node_id, _, _ in nodes_list:
+        fills.extend(index.image_fills(node_id))
+    fills = list(dict.fromkeys(fills))
+    refs = list(dict.fromkeys(ref for _, ref in fills))
+    if not refs:
+        print("⚠️  选中的节点中没有图片填充")
+        return False
+    print(f"🖼️  {len(fills)} 处图片填充，{len(refs)} 张不同的原图")
     
-    # 优先级 2: 当前目录下的 .env 文件
-    current_dir = Path.cwd()
-    env_path = current_dir / '.env'
-    if env_path.exists():
-        env_vars = load_env_file(env_path)
-        if key in env_vars:
-            return env_vars[key]
+    print("🔄 正在获取图片填充地址...")
+    fill_urls = get_image_fill_urls(file_key, access_token)
+    if fill_urls is None:
+        return False
+    
+    fill_dir = Path(output_dir) / IMAGE_FILL_DIR
+    fill_dir.mkdir(parents=True, exist_ok=True)
+    
+    def fetch(ref):
+        safe_ref = sanitize_filename(ref)
+        existing = [p for p in fill_dir.glob(f"{safe_ref}.*") if p.suffix != '.download']
+        if existing:
+            return existing[0]
+        url = fill_urls.get(ref)
+        if not url:
+            print(f"   ⚠️  跳过 {ref}: 无下载地址")
+            return None
+        temp_path = fill_dir / f"{safe_ref}.download"
+        try:
+            download_to_file(
+                url,
+                temp_path,
+                retries=FIGMA_API_RETRIES,
+                retry_delay=FIGMA_API_RETRY_DELAY,
+                on_progress=progress.on_bytes if progress else None
+            )
+            path = fill_dir / f"{safe_ref}.{guess_image_extension(temp_path)}"
+            os.replace(temp_path, path)
+            return path
+        except Exception as e:
+            print(f"   ❌ 下载失败 {ref}: {e}")
+            return None
+    
+    def fetch_and_count(ref):
+        path = fetch(ref)
+        if progress:
+            progress.item_done(path is not None)
+        return path
+    
+    if progress:
+        progress.add_items(len(refs))
+    with ThreadPoolExecutor(max_workers=IMAGE_FILL_WORKERS) as pool:
+        paths = dict(zip(refs, pool.map(fetch_and_count, refs)))
+    
+    def rel(path):
+        return path.relative_to(output_dir).as_posix() if path else None
     
-    # 优先级 3: 终端环境变量
-    return os.getenv(key, default)
+    mapping = {"file_key": file_key, "nodes": {}, "images": {ref: rel(p) for ref, p in paths.items()}}
+    for node_id, ref in fills:
+        entry = index.get(node_id)
+        record = mapping["nodes"].setdefault(node_id, {
+            "name": entry['name'],
+            "page": entry['page'],
+            "path": index.name_path(node_id),
+            "images": {},
+        })
+        record["images"][ref] = rel(paths[ref])
+    map_path = Path(output_dir) / IMAGE_FILL_MAP
+    map_path.write_text(json.dumps(mapping, ensure_ascii=False, indent=2), encoding='utf-8')
+    
+    ok = sum(1 for p in paths.values() if p)
+    print(f"✅ 图片填充原图：{ok}/{len(refs)} 张 → {fill_dir}")
+    print(f"🗺️  映射文件: {map_path}")
+    return ok == len(refs)
+
+
+def postprocessor_from_args(args, root=None):
+    """下载后的进程池处理阶段：--transcode 时为 Transcoder，SVG 导出时为 SvgOptimizer，否则为 None"""
+    return transcoder_from_args(args, root=root) or svg_optimizer_from_args(args, root=root)
+
+
+def print_export_result(result, label):
+    """打印一条 ExportResult（路径、大小、耗时或失败原因）"""
+    if result.ok:
+        target = result.path if result.path else "归档"
+        print(
+            f"   ✅ {label} @{result.scale:g}x → {target}"
+            f"（{result.size / 1024:.1f} KB，渲染 {result.render_sec:.1f}s，下载 {result.download_sec:.1f}s）"
+        )
+    else:
+        print(f"   ❌ {label} @{result.scale:g}x: {result.error}")
 
 
-def parse_figma_url(url):
+def resolve_space_files(args, client):
     """
-    从 Figma URL 中解析出 file-key 和 node-id
+    解析空间模式的文件来源（--space / --files / --project）
     
-    支持的 URL 格式：
-    - https://www.figma.com/design/{file_key}/文件名?node-id={node_id}
-    - https://www.figma.com/file/{file_key}/文件名?node-id={node_id}
-    - https://figma.com/design/{file_key}/文件名?node-id={node_id}
-    
-    返回: (file_key, node_id) 或 (None, None)，无 node-id 时返回 (file_key, None)
+    返回: [(file_key, 文件名或 None), ...]；失败时返回 None
     """
-    try:
-        # 解析 URL
-        parsed = urlparse(url)
-        
-        # 提取 file-key（从路径中）
-        path_parts = parsed.path.strip('/').split('/')
-        if len(path_parts) >= 2 and path_parts[0] in ['design', 'file']:
-            file_key = path_parts[1]
-        else:
-            return None, None
-        
-        # 提取 node-id（从查询参数中）
-        query_params = parse_qs(parsed.query)
-        node_id_param = query_params.get('node-id', [None])[0]
-        
-        if not node_id_param:
-            return file_key, None
-        
-        # 将 node-id 中的 - 替换为 :（Figma URL 使用 -，API 使用 :）
-        node_id = node_id_param.replace('-', ':')
-        
-        return file_key, node_id
-    except Exception as e:
-        print(f"⚠️  URL 解析失败: {e}")
-        return None, None
-
-
-def get_file_structure(file_key, access_token):
-    """获取 Figma 文件的完整结构（带重试，应对 Response ended prematurely 等网络问题）"""
-    url = f"https://api.figma.com/v1/files/{file_key}"
-    headers = {
-        "X-Figma-Token": access_token,
-        "User-Agent": "figmad/1.0",
-    }
-    last_error = None
-    for attempt in range(1, FIGMA_API_RETRIES + 1):
+    from figma_client import FigmaError
+    if args.project:
+        print(f"🔄 正在获取项目 {args.project} 的文件列表...")
         try:
-            response = requests.get(url, headers=headers, timeout=FIGMA_API_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            last_error = e
-            if attempt < FIGMA_API_RETRIES:
-                delay = FIGMA_API_RETRY_DELAY * attempt
-                print(f"   ⚠️  第 {attempt} 次尝试失败: {e}")
-                print(f"   🔄 {delay} 秒后重试 ({attempt + 1}/{FIGMA_API_RETRIES})...")
-                time.sleep(delay)
-            else:
-                break
-    print(f"❌ 获取文件结构失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
-    if hasattr(last_error, 'response') and last_error.response is not None:
-        print(f"   响应状态码: {last_error.response.status_code}")
-        if last_error.response.text:
-            print(f"   响应内容: {last_error.response.text[:500]}")
-    return None
-
-
-def collect_frame_nodes(node, page_name="", nodes_list=None):
-    """
-    递归遍历节点树，收集可导出的 Frame 节点（每页的直接子节点）
-    返回: [(node_id, node_name, page_name), ...]
-    """
-    if nodes_list is None:
-        nodes_list = []
-    
-    if not node or 'id' not in node:
-        return nodes_list
-    
-    node_type = node.get('type', '')
-    
-    # DOCUMENT 是根节点，遍历其子节点（CANVAS 页面）
-    if node_type == 'DOCUMENT':
-        children = node.get('children', [])
-        for child in children:
-            page_name = child.get('name', 'Page') if child.get('name') else 'Page'
-            collect_frame_nodes(child, page_name, nodes_list)
-        return nodes_list
-    
-    # CANVAS 是页面，遍历其直接子节点（通常是 Frame/画板）
-    if node_type == 'CANVAS':
-        children = node.get('children', [])
-        for child in children:
-            if child.get('id'):
-                child_name = child.get('name', 'unnamed')
-                nodes_list.append((child['id'], child_name, page_name))
-        return nodes_list
-    
-    return nodes_list
-
-
-def optimize_image_with_tinypng(input_path, output_path, api_key):
-    """使用 TinyPNG API 优化图片，压缩文件大小但保持高质量"""
-    if not api_key:
-        print("   ⚠️  TinyPNG API key 未提供，跳过压缩")
-        # 如果 API key 不可用，直接复制文件
-        import shutil
-        shutil.copy2(input_path, output_path)
-        return False
+            project_files = client.project_files(args.project)
+        except FigmaError as e:
+            print(f"❌ 错误: {e}")
+            return None
+        return [(f['key'], f.get('name')) for f in project_files if f.get('key')]
     
-    try:
-        # 获取原始文件大小
-        original_size = os.path.getsize(input_path)
-        
-        # 读取图片文件
-        with open(input_path, 'rb') as f:
-            image_data = f.read()
-        
-        # 调用 TinyPNG API
-        print("   🔄 正在使用 TinyPNG API 压缩...")
-        response = requests.post(
-            TINYPNG_API_URL,
-            auth=('api', api_key),
-            data=image_data,
-            timeout=30
-        )
-        
-        if response.status_code == 201:
-            # 获取压缩后的图片 URL
-            compressed_url = response.json()['output']['url']
-            
-            # 下载压缩后的图片
-            compressed_response = requests.get(compressed_url, timeout=30)
-            compressed_response.raise_for_status()
-            
-            # 保存压缩后的图片
-            with open(output_path, 'wb') as f:
-                f.write(compressed_response.content)
-            
-            # 获取压缩后文件大小
-            compressed_size = os.path.getsize(output_path)
-            compression_ratio = (1 - compressed_size / original_size) * 100
-            
-            # 显示压缩信息
-            if compressed_size < original_size:
-                print(f"   ✨ TinyPNG 压缩: {original_size / 1024:.1f} KB → {compressed_size / 1024:.1f} KB (减少 {compression_ratio:.1f}%)")
-            else:
-                print(f"   ℹ️  大小: {compressed_size / 1024:.1f} KB (已优化)")
-            
-            # 显示 API 使用情况
-            if 'compression-count' in response.headers:
-                remaining = response.headers.get('compression-count', 'N/A')
-                print(f"   📊 API 剩余次数: {remaining}")
-            
-            return True
-        else:
-            error_data = response.json() if response.content else {}
-            error_msg = error_data.get('error', response.text)
-            print(f"   ❌ TinyPNG API 错误: {error_msg}")
-            # 如果 API 调用失败，使用原始文件
-            import shutil
-            shutil.copy2(input_path, output_path)
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        print(f"   ⚠️  TinyPNG API 请求失败: {e}")
-        # 如果请求失败，使用原始文件
-        import shutil
-        shutil.copy2(input_path, output_path)
-        return False
-    except Exception as e:
-        print(f"   ⚠️  压缩失败: {e}，使用原始文件")
-        # 如果压缩失败，使用原始文件
-        import shutil
-        shutil.copy2(input_path, output_path)
-        return False
+    entries = []
+    for item in (args.files or [args.space]):
+        # 支持完整 URL 或直接传 file-key
+        file_key = parse_figma_url(item)[0] if '/' in item else item.strip()
+        if not file_key:
+            print(f"❌ 错误: 无法从 URL 中解析 file-key: {item}")
+            return None
+        entries.append((file_key, None))
+    return list(dict.fromkeys(entries))
 
 
-def download_image(url, output_path, optimize=True, api_key=None):
-    """下载图片到指定路径，并可选地进行优化压缩"""
-    try:
-        print(f"📥 正在下载: {url}")
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # 确保目录存在
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # 临时文件路径
-        temp_path = output_path.with_suffix('.tmp')
-        
-        # 获取文件大小
-        total_size = int(response.headers.get('content-length', 0))
-        
-        # 下载图片到临时文件
-        downloaded = 0
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        print(f"\r   进度: {percent:.1f}%", end='', flush=True)
-        
-        print(f"\n✅ 下载完成: {downloaded / 1024:.1f} KB")
-        
-        # 优化图片（使用 TinyPNG API）
-        if optimize and api_key:
-            print("🔧 正在使用 TinyPNG 优化图片...")
-            optimize_image_with_tinypng(temp_path, output_path, api_key)
-            # 删除临时文件
-            if temp_path.exists():
-                temp_path.unlink()
-        else:
-            # 直接移动文件
-            import shutil
-            shutil.move(temp_path, output_path)
-        
-        final_size = os.path.getsize(output_path)
-        print(f"✅ 最终文件: {output_path.name} ({final_size / 1024:.1f} KB)")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"\n❌ 下载失败 {output_path}: {e}")
-        return False
-    except Exception as e:
-        print(f"\n❌ 处理失败 {output_path}: {e}")
-        return False
+def space_output_dirs(files, output_dir, multi):
+    """多文件时每个文件输出到 {output_dir}/{文件名}/（重名时追加 file-key），单文件直接用 output_dir"""
+    output_dir = Path(output_dir)
+    if not multi:
+        return {file_key: output_dir for file_key, _ in files}
+    dirs, used = {}, set()
+    for file_key, name in files:
+        subdir = sanitize_filename(name or file_key)
+        if subdir in used:
+            subdir = f"{subdir}_{file_key}"
+        used.add(subdir)
+        dirs[file_key] = output_dir / subdir
+    return dirs
 
 
-def get_file_node_info(file_key, node_id, access_token):
-    """获取 Figma 文件的节点详细信息"""
-    url = f"https://api.figma.com/v1/files/{file_key}/nodes"
-    params = {
-        "ids": node_id
-    }
-    headers = {
-        "X-Figma-Token": access_token
-    }
+def run_space_export(client, files, args, scales, export_options, only=None, synced=None, postprocessor=None):
+    """
+    空间模式导出（一个或多个文件）
     
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 获取节点信息失败: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"响应状态码: {e.response.status_code}")
-            print(f"响应内容: {e.response.text}")
-        return None
-
-
-def get_image_export_url(file_key, node_ids, scale=3, format="png", access_token=None):
-    """获取图片导出 URL（带重试）"""
-    url = f"https://api.figma.com/v1/images/{file_key}"
-    params = {
-        "ids": ",".join(node_ids),
-        "format": format,
-        "scale": scale
-    }
-    headers = {"User-Agent": "figmad/1.0"}
-    if access_token:
-        headers["X-Figma-Token"] = access_token
-    last_error = None
-    for attempt in range(1, FIGMA_API_RETRIES + 1):
+    每个文件各自筛选节点、做实例去重，所有文件的节点交给同一次 client.export：
+    渲染与下载共用一条限速流水线，多个文件同时推进；结束后按文件汇总
+    
+    files:  [(file_key, 文件名, 文件结构, 输出目录), ...]
+    only:   {file_key: 节点 id 集合}，只导出其中的节点（监视模式只重新导出有变化的画板）
+    synced: 传入集合时，写入所有倍率都导出成功的 (file_key, node_id)
+    postprocessor: Transcoder（--transcode）或 SvgOptimizer（--format svg），每张图下载后交给进程池处理，
+                   输出路径换成处理后的扩展名
+    返回: 是否至少成功一个
+    """
+    from figma_client import FigmaError, NodeRef
+    multi = len(files) > 1
+    output_root = Path(args.output_dir)
+    outputs_per_node = len(scales) if scales else 1
+    
+    def base_path(job, node):
+        node_id, node_name, page_name = node
+        clash = (sanitize_filename(page_name), sanitize_filename(node_name)) in job['clashes']
+        return generate_space_output_filename(
+            page_name, node_name, node_id, None if scales else args.scale, args.format, job['output_dir'],
+            with_id=clash
+        )
+    
+    def final_path(path):
+        return postprocessor.target(path) if postprocessor else path
+    
+    def output_files(job, node):
+        base = base_path(job, node)
+        return [final_path(variant_path(base, s)) for s in scales] if scales else [final_path(base)]
+    
+    # 按筛选条件收集每个文件可导出的节点（默认每页的顶级画板）
+    jobs = {}
+    refs = []
+    for file_key, file_name, file_data, file_dir in files:
+        label = f"[{file_name}] " if multi else ""
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=FIGMA_API_TIMEOUT)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            last_error = e
-            if attempt < FIGMA_API_RETRIES:
-                time.sleep(FIGMA_API_RETRY_DELAY * attempt)
-            else:
-                break
-    print(f"❌ 获取图片导出 URL 失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
-    if hasattr(last_error, 'response') and last_error.response is not None:
-        print(f"   响应状态码: {last_error.response.status_code}")
-        if last_error.response.text:
-            print(f"   响应内容: {last_error.response.text[:300]}")
-    return None
-
-
-def download_single_image(url, output_path, figma_token, tinypng_key, scale=3, format='png', no_compress=False, file_key=None, node_id=None):
-    """下载单张图片的辅助函数"""
-    # 如果提供了 file_key 和 node_id，直接使用；否则从 URL 解析
-    if not file_key or not node_id:
-        if url:
-            file_key, node_id = parse_figma_url(url)
-            if not file_key or not node_id:
-                print(f"❌ 无法解析 URL: {url}")
-                return False
-        else:
-            print("❌ 错误: 需要提供 URL 或 file_key 和 node_id")
+            index = NodeIndex(file_data['document'])
+            nodes_list = collect_frame_nodes(index, selection_from_args(args))
+        except re.error as e:
+            print(f"❌ 错误: --page 正则无效: {e}")
             return False
+        # 重名按完整的筛选结果判断：监视模式只重新导出部分画板时，文件名与完整导出一致
+        clashes = space_name_clashes(nodes_list)
+        if only is not None:
+            nodes_list = [n for n in nodes_list if n[0] in only.get(file_key, ())]
+        if not nodes_list:
+            print(f"⚠️  {label}未找到可导出的画板（每页的顶级 Frame）")
+            continue
+        print(f"✅ {label}找到 {len(nodes_list)} 个画板")
+        clashing = sum(1 for _, name, page in nodes_list if (sanitize_filename(page), sanitize_filename(name)) in clashes)
+        if clashing:
+            print(f"ℹ️  {label}{clashing} 个节点与同页其他节点重名，文件名附加节点 id")
+        
+        # 同一组件、无覆盖、同尺寸的实例只渲染一个代表节点
+        duplicates = {}
+        if not args.no_dedup:
+            duplicates = group_identical({n[0]: render_key(index.get(n[0])['node']) for n in nodes_list})
+        skipped = {nid for dups in duplicates.values() for nid in dups}
+        if skipped:
+            print(f"♻️  {label}{len(skipped)} 个实例与其他节点渲染结果相同，只渲染 {len(duplicates)} 个代表节点")
+        job = {
+            'name': file_name,
+            'index': index,
+            'output_dir': file_dir,
+            'all_nodes': nodes_list,
+            'clashes': clashes,
+            'by_id': {n[0]: n for n in nodes_list},
+            'duplicates': duplicates,
+            'skipped': skipped,
+            'rendered_ok': {},
+            'ok': 0,
+            'failed': 0,
+            'bytes': 0,
+        }
+        jobs[file_key] = job
+        # 归档模式不落盘：节点不指定输出路径，结果以字节返回
+        refs.extend(
+            NodeRef(
+                file_key,
+                node_id,
+                node_name,
+                page_name,
+                output=None if args.output_archive else base_path(job, (node_id, node_name, page_name)),
+                bbox=index.get(node_id)['bbox']
+            )
+            for node_id, node_name, page_name in nodes_list
+            if node_id not in skipped
+        )
     
-    # 获取节点信息
-    node_info = get_file_node_info(file_key, node_id, figma_token)
-    if not node_info:
-        print(f"❌ 无法获取节点信息: {node_id}")
+    if not jobs:
+        print("   提示: 确保 Figma 文件中每页有至少一个画板/Frame，或放宽 --page/--name/--types 等筛选条件")
         return False
     
-    # 获取图片导出 URL
-    image_urls = get_image_export_url(
-        file_key,
-        [node_id],
-        scale=scale,
-        format=format,
-        access_token=figma_token
-    )
+    # 只下载图片填充原图，不渲染画板
+    if args.image_fills:
+        print()
+        ok = 0
+        with TransferProgress() as progress:
+            for file_key, job in jobs.items():
+                ok += download_image_fills(file_key, job['index'], job['all_nodes'], client.token, job['output_dir'],
+                                           progress)
+        return ok > 0
+    print()
     
-    if not image_urls or 'images' not in image_urls or node_id not in image_urls['images']:
-        print(f"❌ 无法获取图片导出 URL: {node_id}")
-        return False
+    if args.dry_run:
+        plans = client.plan(refs, **{k: v for k, v in export_options.items() if k != 'compress'})
+        print_plan(plans, {ref.node_id: ref.name for ref in refs}, extra_calls=len(files))
+        return True
     
-    image_url = image_urls['images'][node_id]
-    if not image_url:
-        print(f"❌ 图片导出 URL 为空: {node_id}")
-        return False
+    if not args.output_archive:
+        output_root.mkdir(parents=True, exist_ok=True)
     
-    # 下载并压缩图片
-    output_path_obj = Path(output_path)
-    return download_image(
-        image_url,
-        output_path_obj,
-        optimize=not no_compress,
-        api_key=tinypng_key if not no_compress else None
-    )
+    dup_written = 0
+    
+    def emit(file_key, node_id, path_scale, data):
+        """写入归档（路径与目录输出相同）；代表节点的字节同时写到各重复实例的路径下"""
+        nonlocal dup_written
+        job = jobs[file_key]
+        for target in [node_id] + job['duplicates'].get(node_id, []):
+            base = base_path(job, job['by_id'][target])
+            path = final_path(variant_path(base, path_scale) if scales else base)
+            if archive.write(path.relative_to(output_root).as_posix(), data) and target != node_id:
+                dup_written += 1
+    
+    # 内容寻址存储：先断开上次留下的链接，避免原地写入改坏共享对象（多个文件共用一个存储，跨文件去重）
+    content_store = None
+    if args.content_store:
+        content_store = ContentStore(output_root / '.objects', symlink=args.symlink)
+        content_store.release(
+            path for job in jobs.values() for node in job['all_nodes'] for path in output_files(job, node)
+        )
+    
+    started = time.monotonic()
+    archive_sink = ArchiveSink(Path(args.output_archive)) if args.output_archive else nullcontext()
+    export_error = False
+    with TransferProgress() as progress, archive_sink as archive:
+        try:
+            for result in client.export(refs, progress=progress, **export_options):
+                job = jobs[result.ref.file_key]
+                label = f"{result.ref.page} / {result.ref.name}"
+                print_export_result(result, f"[{job['name']}] {label}" if multi else label)
+                if not result.ok:
+                    job['failed'] += 1
+                    continue
+                if archive is not None and postprocessor:
+                    postprocessor.submit_bytes(
+                        result.data,
+                        lambda data, ref=result.ref, scale=result.scale: emit(ref.file_key, ref.node_id, scale, data),
+                        label
+                    )
+                elif archive is not None:
+                    emit(result.ref.file_key, result.ref.node_id, result.scale, result.data)
+                elif postprocessor:
+                    postprocessor.submit(result.path)
+                job['ok'] += 1
+                job['bytes'] += result.size
+                job['rendered_ok'][result.ref.node_id] = job['rendered_ok'].get(result.ref.node_id, 0) + 1
+        except FigmaError as e:
+            print(f"❌ 错误: {e}")
+            export_error = True
+        # 去重副本与内容存储都基于处理后的文件：先等处理完成（归档模式下处理结果要在归档关闭前写入）
+        if postprocessor:
+            postprocessor.wait()
+            postprocessor.print_summary()
+        # 导出中途出错时不用残缺的归档替换上一次的产物（异常退出 with 块时 ArchiveSink 自动 abort）
+        if export_error and archive is not None:
+            archive.abort()
+    
+    linked = dup_written
+    saved_renders = 0
+    for job in jobs.values():
+        saved_renders += len(job['skipped']) * outputs_per_node
+        for rep_id, dups in job['duplicates'].items():
+            if not job['rendered_ok'].get(rep_id):
+                continue
+            for dup in dups:
+                for src, dst in zip(output_files(job, job['by_id'][rep_id]), output_files(job, job['by_id'][dup])):
+                    if not args.output_archive and src.exists():
+                        link_or_copy(src, dst)
+                        linked += 1
+                job['ok'] += job['rendered_ok'][rep_id]
+    if saved_renders:
+        print(f"♻️  去重：由代表节点生成 {linked} 个文件，少渲染 {saved_renders} 次")
+    
+    if synced is not None:
+        for file_key, job in jobs.items():
+            for rep_id, count in job['rendered_ok'].items():
+                if count >= outputs_per_node:
+                    synced.update((file_key, nid) for nid in [rep_id] + job['duplicates'].get(rep_id, []))
+    
+    if content_store:
+        for path in dict.fromkeys(
+            p for job in jobs.values() for node in job['all_nodes'] for p in output_files(job, node)
+        ):
+            content_store.add(path)
+        content_store.print_summary()
+    
+    success_count = sum(job['ok'] for job in jobs.values())
+    total = sum(len(job['all_nodes']) for job in jobs.values()) * outputs_per_node
+    if multi:
+        print(f"📚 多文件汇总（{len(jobs)} 个文件，用时 {time.monotonic() - started:.1f}s）:")
+        for job in jobs.values():
+            job_total = len(job['all_nodes']) * outputs_per_node
+            failed = f"，失败 {job['failed']}" if job['failed'] else ""
+            print(
+                f"   📄 {job['name']}: 成功 {job['ok']}/{job_total}{failed}，"
+                f"{job['bytes'] / 1024 / 1024:.2f} MB → {job['output_dir']}"
+            )
+    print(f"✅ 空间下载完成：成功 {success_count}/{total}")
+    return success_count > 0
 
 
 def load_urls_from_file(file_path):
@@ -446,18 +450,6 @@ def load_urls_from_file(file_path):
     return urls
 
 
-def generate_output_filename(node_id, scale=3, format='png', output_dir=None):
-    """根据 node-id 生成输出文件名"""
-    # 将 node_id 中的 : 替换为 _，作为文件名
-    safe_node_id = node_id.replace(':', '_')
-    filename = f"{safe_node_id}@{scale}x.{format}"
-    
-    if output_dir:
-        return Path(output_dir) / filename
-    else:
-        return Path(filename)
-
-
 def sanitize_filename(name):
     """将节点名称转为安全的文件名"""
     if not name:
@@ -468,12 +460,26 @@ def sanitize_filename(name):
     return safe[:100] if safe else "unnamed"
 
 
-def generate_space_output_filename(page_name, frame_name, node_id, scale=3, format='png', output_dir=None):
-    """为空间模式生成输出文件名：页面名/画板名@倍数.格式"""
+def space_name_clashes(nodes):
+    """
+    同一页面下（文件名清理后）重名的节点：[(node_id, 名称, 页面名), ...] → {(页面, 名称)}
+    --types / --name / --depth 会选中大量同名的嵌套节点（Icon、Vector…），这些节点的文件名要带上 node id
+    """
+    counts = Counter((sanitize_filename(page), sanitize_filename(name)) for _, name, page in nodes)
+    return {key for key, count in counts.items() if count > 1}
+
+
+def generate_space_output_filename(page_name, frame_name, node_id, scale=3, format='png', output_dir=None,
+                                   with_id=False):
+    """
+    为空间模式生成输出文件名：页面名/画板名@倍数.格式（scale 为 None 时不带 @倍数）
+    with_id 为 True 时（同页重名，见 space_name_clashes）文件名为 画板名_节点id@倍数.格式，互不覆盖
+    """
     safe_page = sanitize_filename(page_name)
     safe_frame = sanitize_filename(frame_name)
-    safe_node_id = node_id.replace(':', '_')
-    filename = f"{safe_frame}@{scale}x.{format}"
+    if with_id:
+        safe_frame = f"{safe_frame}_{node_id.replace(':', '_')}"
+    filename = f"{safe_frame}@{scale}x.{format}" if scale is not None else f"{safe_frame}.{format}"
     
     if output_dir:
         return Path(output_dir) / safe_page / filename
@@ -481,7 +487,8 @@ def generate_space_output_filename(page_name, frame_name, node_id, scale=3, form
         return Path(safe_page) / filename
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    """命令行参数定义（check_figma_watch.py 等脚本也用它构造 args）。"""
     parser = argparse.ArgumentParser(
         description='从 Figma 下载图片并使用 TinyPNG 压缩',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -510,13 +517,22 @@ def main():
 
   # 不使用压缩
   %(prog)s --url "https://www.figma.com/design/..." --output output.png --no-compress
+  
+  # 监视文件，变化时只重新导出有变化的画板
+  %(prog)s --space "https://www.figma.com/design/..." --output-dir ./exports --watch
 
   # 下载整个空间（文件内所有页面的顶级画板）
   %(prog)s --space "https://www.figma.com/design/mVCcQJPK1pHXRauJULaQiC/ugc" --output-dir ./exports
+
+  # 空间模式只导出 Icons 页面中名称以 ic_ 开头的组件（含两层以内的嵌套）
+  %(prog)s --space "https://www.figma.com/design/..." --page "^Icons$" --name "ic_*" --components-only --depth 2
+
+  # 空间模式只下载设计稿中用到的原始照片/位图（不渲染）
+  %(prog)s --space "https://www.figma.com/design/..." --image-fills --output-dir ./photos
         """
     )
     
-    # URL、批量文件、整个空间或单独参数（四选一）
+    # URL、批量文件、整个空间、多个文件/项目或单独参数（六选一）
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument(
         '--url',
@@ -537,6 +553,17 @@ def main():
         metavar='URL',
         help='Figma 空间/文件 URL（下载整个文件内所有页面的顶级画板）'
     )
+    input_group.add_argument(
+        '--files',
+        nargs='+',
+        metavar='FILE',
+        help='多个 Figma 文件（URL 或 file-key），按空间模式导出，每个文件输出到 --output-dir 下以文件名命名的子目录'
+    )
+    input_group.add_argument(
+        '--project',
+        metavar='PROJECT_ID',
+        help='Figma 项目 ID：导出项目中的所有文件（/v1/projects/{id}/files），输出方式同 --files'
+    )
     
     # 单独参数（与 --url、--urls、--urls-file 互斥）
     file_key_group = parser.add_argument_group('单独参数（与 --url 和 --urls-file 互斥）')
@@ -572,7 +599,7 @@ def main():
     parser.add_argument(
         '--tinypng-key',
         default=None,
-        help='TinyPNG API Key（优先级：命令行参数 > 环境变量文件 > .env 文件 > 终端环境变量）'
+        help='TinyPNG API Key，多个用逗号分隔（优先级：命令行参数 > 环境变量文件 > .env 文件 > 终端环境变量）'
     )
     parser.add_argument(
         '--scale',
@@ -581,6 +608,16 @@ def main():
         choices=[1, 2, 3, 4],
         help='图片分辨率倍数（1x, 2x, 3x, 4x），默认 3'
     )
+    parser.add_argument(
+        '--scales',
+        help='多倍率输出，如 1,2,3：每个节点只按最高倍率渲染一次，本地高质量缩放出其余倍率，'
+             '输出为 Flutter 资源结构（1x 在根目录，其余在 2.0x/、3.0x/ 子目录），指定后忽略 --scale'
+    )
+    parser.add_argument(
+        '--native-scales',
+        action='store_true',
+        help='配合 --scales：每个倍率都由 Figma 原生渲染（像素精确，渲染与下载次数按倍率数翻倍）'
+    )
     parser.add_argument(
         '--format',
         default='png',
@@ -592,15 +629,158 @@ def main():
         action='store_true',
         help='跳过 TinyPNG 压缩'
     )
+    parser.add_argument(
+        '--no-render-cache',
+        action='store_true',
+        help='不读写渲染 URL 缓存（默认缓存到 ~/.cache/figmad，可用 FIGMAD_CACHE_DIR 修改）'
+    )
+    
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='空间模式下不合并相同组件实例的渲染，每个节点都单独渲染'
+    )
+    
+    parser.add_argument(
+        '--pixel-budget',
+        type=float,
+        default=DEFAULT_PIXEL_BUDGET_MP,
+        help=f'每次渲染请求的像素预算（百万像素，按包围盒面积 × 倍率² 估算），随渲染耗时自动调整（默认: {DEFAULT_PIXEL_BUDGET_MP}）'
+    )
+    
+    parser.add_argument(
+        '--output-archive',
+        metavar='OUT.zip|OUT.tar',
+        help='空间模式直接写入 zip/tar（.tar.gz）归档，成员路径与目录输出相同，不生成目录树'
+    )
+    
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='空间模式只打印导出计划（API 请求数、预计下载字节数与耗时），不渲染不下载'
+    )
+    
+    parser.add_argument(
+        '--file-workers',
+        type=int,
+        default=FILE_WORKERS,
+        help=f'--files / --project 时同时获取结构、同时渲染下载的文件数（默认: {FILE_WORKERS}）'
+    )
+    
+    parser.add_argument(
+        '--api-rate',
+        type=float,
+        default=None,
+        help='每个 Figma 令牌每分钟的请求数上限，所有文件与线程共用（默认读取 FIGMA_API_RATE，未设置时不限，收到 429 时该令牌退避）'
+    )
+    
+    parser.add_argument(
+        '--image-fills',
+        action='store_true',
+        help='配合 --space：不渲染画板，直接下载选中节点内图片填充的原图（一次元数据请求），并写出映射文件'
+    )
+    
+    parser.add_argument(
+        '--content-store',
+        action='store_true',
+        help='空间模式下相同内容只存一份（输出目录下 .objects/），页面/画板目录树用硬链接指向它'
+    )
+    
+    parser.add_argument(
+        '--symlink',
+        action='store_true',
+        help='配合 --content-store，用相对符号链接代替硬链接'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='配合 --space：持续监视文件，版本变化时只重新导出有变化的画板（Ctrl+C 结束）'
+    )
     
-    args = parser.parse_args()
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=60,
+        help='--watch 时查询文件版本的间隔秒数（默认: 60）'
+    )
+    
+    parser.add_argument(
+        '--webhook',
+        metavar='[HOST:]PORT',
+        help='--watch 时在本地监听 Figma webhook（FILE_UPDATE / FILE_VERSION_UPDATE），收到后立即检查；默认只监听 127.0.0.1，passcode 取自 FIGMA_WEBHOOK_PASSCODE'
+    )
+    
+    add_selection_arguments(parser)
+    add_transcode_arguments(parser)
+    add_svg_arguments(parser)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    
+    space_mode = bool(args.space or args.files or args.project)
+    if args.image_fills and not space_mode:
+        print("❌ 错误: --image-fills 需要配合 --space / --files / --project 使用")
+        return False
+    
+    if args.output_archive:
+        if not space_mode or args.image_fills:
+            print("❌ 错误: --output-archive 目前只支持 --space / --files / --project 渲染导出")
+            return False
+        if not archive_kind(Path(args.output_archive)):
+            print("❌ 错误: --output-archive 仅支持 .zip / .tar / .tar.gz")
+            return False
+        if args.content_store:
+            print("❌ 错误: --output-archive 不能与 --content-store 同时使用")
+            return False
+    
+    if args.watch:
+        if not args.space:
+            print("❌ 错误: --watch 需要配合 --space 使用（监视单个文件）")
+            return False
+        if args.output_archive or args.dry_run or args.image_fills:
+            print("❌ 错误: --watch 不能与 --output-archive / --dry-run / --image-fills 同时使用")
+            return False
+    if args.webhook and not args.watch:
+        print("❌ 错误: --webhook 需要配合 --watch 使用")
+        return False
+    
+    # WebP/AVIF 转码本身就是压缩，不再先走 TinyPNG
+    error = transcode_error(args, args.format)
+    if error:
+        print(f"❌ 错误: {error}")
+        return False
+    if args.transcode and not args.no_compress:
+        print(f"ℹ️  转码为 {args.transcode.upper()}，跳过 TinyPNG 压缩")
+        args.no_compress = True
+    
+    if args.svg_precision < 0:
+        print("❌ 错误: --svg-precision 不能为负数")
+        return False
+    
+    # 多倍率参数
+    scales = None
+    if args.scales:
+        try:
+            scales = parse_scales(args.scales)
+        except ValueError as e:
+            print(f"❌ 错误: --scales 格式不正确: {e}")
+            return False
+        if args.format not in RASTER_FORMATS:
+            print(f"❌ 错误: --scales 仅支持 {'/'.join(RASTER_FORMATS)} 格式（矢量格式无需多倍率）")
+            return False
+        if not args.native_scales and not pillow_available():
+            print("⚠️  未安装 Pillow，无法本地缩放，改为每个倍率原生渲染（pip install Pillow）")
+            args.native_scales = True
     
     # 加载环境变量（按优先级）
     env_file_path = Path(args.env_file) if args.env_file else None
     
     # 获取配置值（按优先级：命令行参数 > 环境变量文件 > .env 文件 > 终端环境变量）
-    figma_token = args.figma_token or get_config_value('FIGMA_ACCESS_TOKEN', env_file_path)
-    tinypng_key = args.tinypng_key or get_config_value('TINYPNG_API_KEY', env_file_path)
+    figma_token = args.figma_token or resolve_figma_token(env_file_path)
+    tinypng_key = args.tinypng_key or resolve_tinypng_key(env_file_path)
     
     # 验证必需参数
     if not figma_token:
@@ -609,7 +789,7 @@ def main():
         print("   1. --figma-token 参数")
         print("   2. --env-file 指定的环境变量文件")
         print("   3. 当前目录下的 .env 文件")
-        print("   4. 终端环境变量 FIGMA_ACCESS_TOKEN")
+        print("   4. 终端环境变量 FIGMA_ACCESS_TOKEN（多个令牌用 FIGMA_ACCESS_TOKENS，逗号分隔）")
         return False
     
     # 显示环境变量来源
@@ -618,8 +798,20 @@ def main():
     elif (Path.cwd() / '.env').exists():
         print(f"📄 环境变量文件: {Path.cwd() / '.env'}")
     
-    if tinypng_key and not args.no_compress:
-        print(f"🗜️  TinyPNG API: 已配置")
+    if isinstance(figma_token, TokenPool):
+        print(f"🔑 Figma 令牌池: {len(figma_token)} 个令牌，请求分摊到各令牌")
+    
+    if args.format not in RASTER_FORMATS:
+        # 矢量格式不上传 TinyPNG；SVG 由本地精简代替
+        print(f"🗜️  TinyPNG 压缩: {args.format} 是矢量格式，跳过")
+        if args.format == 'svg':
+            print("🧹 SVG 精简: 已禁用" if args.no_svg_optimize
+                  else f"🧹 SVG 精简: 坐标保留 {args.svg_precision} 位小数，合并重复定义与路径")
+    elif tinypng_key and not args.no_compress:
+        if isinstance(tinypng_key, TinyPngKeyPool):
+            print(f"🗜️  TinyPNG API: {len(tinypng_key)} 个 key，按剩余额度分配，用完后改用本地压缩")
+        else:
+            print(f"🗜️  TinyPNG API: 已配置（额度用完后改用本地压缩）")
     elif args.no_compress:
         print(f"🗜️  TinyPNG 压缩: 已禁用")
     else:
@@ -632,91 +824,85 @@ def main():
         print(f"   📝 获取 API key: https://tinypng.com/developers")
     print()
     
-    # 处理整个空间下载（--space）
-    if args.space:
-        print(f"📂 空间模式：下载整个 Figma 文件")
-        print(f"🔗 URL: {args.space}")
-        file_key, _ = parse_figma_url(args.space)
-        if not file_key:
-            print("❌ 错误: 无法从 URL 中解析 file-key")
+    # 渲染 URL 缓存：重试与重复运行时复用未过期的渲染地址
+    render_cache = RenderUrlCache(persist=False) if args.no_render_cache else RenderUrlCache.shared()
+    
+    # 命令行只负责参数解析与输出，导出流程由 FigmaClient 完成
+    from figma_client import FigmaClient, FigmaError, NodeRef
+    client = FigmaClient(
+        figma_token,
+        tinypng_key,
+        render_cache=render_cache,
+        pixel_budget_mp=args.pixel_budget,
+        file_workers=args.file_workers,
+        log=print
+    )
+    # 每次调用都重新设置：常驻进程中未指定 --api-rate 时恢复为 FIGMA_API_RATE / 不限
+    set_api_rate(args.api_rate)
+    export_options = dict(
+        scale=args.scale,
+        format=args.format,
+        scales=scales,
+        native_scales=args.native_scales,
+        compress=not args.no_compress
+    )
+    
+    # 多倍率：默认只渲染最高倍率并在本地缩放，--native-scales 时逐倍率渲染
+    if scales:
+        scale_desc = ", ".join(f"{s:g}x" for s in scales)
+        scale_desc += "（逐倍率原生渲染）" if args.native_scales else f"（渲染 {max(scales):g}x，本地缩放其余倍率）"
+    else:
+        scale_desc = f"{args.scale}x"
+    
+    # 处理空间下载（--space 单个文件，--files / --project 多个文件）
+    if space_mode:
+        if args.space:
+            print(f"📂 空间模式：下载整个 Figma 文件")
+            print(f"🔗 URL: {args.space}")
+        elif args.project:
+            print(f"📚 多文件模式：导出项目 {args.project} 中的所有文件")
+        else:
+            print(f"📚 多文件模式：导出 {len(args.files)} 个文件")
+        entries = resolve_space_files(args, client)
+        if not entries:
+            if entries is not None:
+                print("⚠️  没有可导出的文件")
             return False
+        multi = not args.space
         
-        print(f"🔑 文件 Key: {file_key}")
+        if not multi:
+            print(f"🔑 文件 Key: {entries[0][0]}")
         print(f"📁 输出目录: {args.output_dir}")
-        print(f"📐 分辨率: {args.scale}x")
+        print(f"📐 分辨率: {scale_desc}")
         print(f"📄 格式: {args.format}")
         print()
         
-        # 获取文件结构
-        print("🔄 正在获取文件结构...")
-        file_data = get_file_structure(file_key, figma_token)
-        if not file_data:
-            return False
-        
-        document = file_data.get('document')
-        if not document:
-            print("❌ 错误: 文件结构中没有 document 节点")
-            return False
+        # 监视模式：有快照时先只查版本，变化时才拉取文件结构并同步有变化的画板
+        if args.watch:
+            from figma_watch import FileWatcher
+            file_key = entries[0][0]
+            with postprocessor_from_args(args, root=Path(args.output_dir)) or nullcontext() as postprocessor:
+                watcher = FileWatcher(
+                    client, file_key, file_key, Path(args.output_dir), args, scales, export_options,
+                    interval=args.watch_interval,
+                    passcode=get_config_value('FIGMA_WEBHOOK_PASSCODE', env_file_path),
+                    postprocessor=postprocessor
+                )
+                return watcher.run(webhook=args.webhook)
         
-        # 收集所有可导出的 Frame 节点
-        nodes_list = collect_frame_nodes(document)
-        if not nodes_list:
-            print("⚠️  未找到可导出的画板（每页的顶级 Frame）")
-            print("   提示: 确保 Figma 文件中每页有至少一个画板/Frame")
+        # 获取文件结构（多个文件并发获取）
+        print("🔄 正在获取文件结构..." if not multi else f"🔄 正在获取 {len(entries)} 个文件的结构...")
+        structures, errors = client.files(key for key, _ in entries)
+        for file_key, e in errors.items():
+            print(f"❌ 错误: {e}")
+        entries = [(key, name or structures[key].get('name') or key) for key, name in entries if key in structures]
+        if not entries:
             return False
         
-        print(f"✅ 找到 {len(nodes_list)} 个画板")
-        print()
-        
-        # 批量获取图片导出 URL（Figma API 单次最多 50 个节点）
-        BATCH_SIZE = 50
-        output_dir = Path(args.output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        success_count = 0
-        for i in range(0, len(nodes_list), BATCH_SIZE):
-            batch = nodes_list[i:i + BATCH_SIZE]
-            node_ids = [n[0] for n in batch]
-            
-            image_urls = get_image_export_url(
-                file_key,
-                node_ids,
-                scale=args.scale,
-                format=args.format,
-                access_token=figma_token
-            )
-            
-            if not image_urls or 'images' not in image_urls:
-                print(f"❌ 获取导出 URL 失败")
-                continue
-            
-            for node_id, node_name, page_name in batch:
-                image_url = image_urls['images'].get(node_id)
-                if not image_url:
-                    print(f"   ⚠️  跳过 {page_name}/{node_name}: 无导出 URL")
-                    continue
-                
-                output_path = generate_space_output_filename(
-                    page_name, node_name, node_id,
-                    args.scale, args.format, args.output_dir
-                )
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                print(f"📥 [{success_count + 1}/{len(nodes_list)}] {page_name} / {node_name}")
-                if download_image(
-                    image_url,
-                    output_path,
-                    optimize=not args.no_compress,
-                    api_key=tinypng_key if not args.no_compress else None
-                ):
-                    success_count += 1
-                    print(f"   ✅ 完成")
-                else:
-                    print(f"   ❌ 失败")
-                print()
-        
-        print(f"✅ 空间下载完成：成功 {success_count}/{len(nodes_list)}")
-        return success_count > 0
+        output_dirs = space_output_dirs(entries, args.output_dir, multi)
+        files = [(key, name, structures[key], output_dirs[key]) for key, name in entries]
+        with postprocessor_from_args(args, root=Path(args.output_dir)) or nullcontext() as postprocessor:
+            return run_space_export(client, files, args, scales, export_options, postprocessor=postprocessor)
     
     # 处理批量下载（--urls 或 --urls-file）
     urls = None
@@ -734,7 +920,7 @@ def main():
         else:
             print(f"📋 批量下载模式：命令行传入 {len(urls)} 个 URL")
         print(f"📁 输出目录: {args.output_dir}")
-        print(f"📐 分辨率: {args.scale}x")
+        print(f"📐 分辨率: {scale_desc}")
         print(f"📄 格式: {args.format}")
         print()
 
@@ -745,38 +931,40 @@ def main():
         print(f"✅ 找到 {len(urls)} 个 URL")
         print()
         
-        # 批量下载
-        success_count = 0
         output_dir = Path(args.output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
         
+        refs = []
         for idx, url in enumerate(urls, 1):
             print(f"[{idx}/{len(urls)}] 处理 URL: {url}")
-            
-            # 解析 URL 获取 node_id
-            file_key, node_id = parse_figma_url(url)
-            if not file_key or not node_id:
+            try:
+                # 如果指定了输出，只对第一张图片使用；其余按 node-id 自动生成文件名
+                ref = NodeRef.from_url(url, args.output if args.output and idx == 1 else None)
+            except ValueError:
                 print(f"   ❌ 跳过：无法解析 URL")
                 continue
-            
-            # 生成输出文件名
-            if args.output and idx == 1:
-                # 如果指定了输出，只对第一张图片使用
-                output_path = Path(args.output)
-            else:
-                # 自动生成文件名（基于 node-id）
-                output_path = generate_output_filename(node_id, args.scale, args.format, args.output_dir)
-            
-            print(f"   📁 输出: {output_path}")
-            
-            # 下载图片
-            if download_single_image(url, output_path, figma_token, tinypng_key, args.scale, args.format, args.no_compress):
-                success_count += 1
-                print(f"   ✅ 完成")
-            else:
-                print(f"   ❌ 失败")
-            print()
+            if ref.output is None:
+                ref.output = generate_output_filename(ref.node_id, None if scales else args.scale, args.format,
+                                                      output_dir)
+            print(f"   📁 输出: {ref.output}")
+            refs.append(ref)
+        print()
+        
+        # 所有 URL 一起按像素预算组批渲染，下载并发进行（转码 / SVG 精简与下载并行）
+        failed = set()
+        with TransferProgress() as progress, postprocessor_from_args(args) or nullcontext() as postprocessor:
+            try:
+                for result in client.export(refs, progress=progress, **export_options):
+                    print_export_result(result, result.ref.name or result.ref.node_id)
+                    if not result.ok:
+                        failed.add(id(result.ref))
+                    elif postprocessor:
+                        postprocessor.submit(result.path)
+            except FigmaError as e:
+                print(f"❌ 错误: {e}")
+                return False
         
+        success_count = sum(1 for ref in refs if id(ref) not in failed)
         print(f"✅ 批量下载完成：成功 {success_count}/{len(urls)}")
         return success_count > 0
     
@@ -792,7 +980,8 @@ def main():
             print("❌ 错误: 无法从 URL 中解析 file-key")
             return False
         if not node_id:
-            print("⚠️  警告: URL 中没有 node-id，请确保 URL 包含 node-id 参数")
+            print("❌ 错误: URL 中没有 node-id，请确保 URL 包含 node-id 参数")
+            return False
     else:
         # 使用单独参数
         file_key = args.file_key
@@ -806,10 +995,7 @@ def main():
         output_path = Path(args.output)
     else:
         # 自动生成文件名（基于 node-id）
-        if not node_id:
-            print("❌ 错误: 未指定输出路径且无法从 URL 中获取 node-id")
-            return False
-        output_path = generate_output_filename(node_id, args.scale, args.format)
+        output_path = generate_output_filename(node_id, None if scales else args.scale, args.format)
         print(f"💡 未指定输出路径，自动生成: {output_path}")
     
     # 输出配置信息
@@ -817,27 +1003,28 @@ def main():
     print(f"📁 输出文件: {output_path}")
     print(f"🔑 文件 Key: {file_key}")
     print(f"📍 节点 ID: {node_id}")
-    print(f"📐 分辨率: {args.scale}x")
+    print(f"📐 分辨率: {scale_desc}")
     print(f"📄 格式: {args.format}")
     print()
     
     # 下载单张图片
-    success = download_single_image(
-        args.url if args.url else None,
-        output_path,
-        figma_token,
-        tinypng_key,
-        args.scale,
-        args.format,
-        args.no_compress,
-        file_key,
-        node_id
-    )
+    results = []
+    with TransferProgress() as progress, postprocessor_from_args(args) or nullcontext() as postprocessor:
+        try:
+            for result in client.export([NodeRef(file_key, node_id, output=output_path)], progress=progress,
+                                        **export_options):
+                print_export_result(result, result.ref.name or node_id)
+                results.append(result)
+                if result.ok and postprocessor:
+                    postprocessor.submit(result.path)
+        except FigmaError as e:
+            print(f"❌ 错误: {e}")
+    success = bool(results) and all(result.ok for result in results)
     
     if success:
         print()
         print("✅ 图片下载和优化完成！")
-        print(f"📁 文件位置: {output_path.absolute()}")
+        print(f"📁 文件位置: {(transcoded_path(output_path, args.transcode) if args.transcode else output_path).absolute()}")
     else:
         print()
         print("❌ 图片下载失败")
@@ -846,5 +1033,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # figma_client 以模块名导入本文件，直接运行时让它拿到同一个模块（共用缓存等模块状态）
+    sys.modules.setdefault("download_figma_image", sys.modules[__name__])
     success = main()
     sys.exit(0 if success else 1)
@@ -6,17 +6,35 @@ Figma 空间/文件 图片批量下载
 """
 
 import argparse
+import os
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import requests
 
-FIGMA_API_BASE = "https://api.figma.com/v1"
+from figma_archive import ArchiveSink, archive_kind
+from figma_batching import DEFAULT_PIXEL_BUDGET_MP, BatchPlanner, PixelBudget, estimate_pixels
+from figma_dedup import ContentStore, group_identical, link_or_copy, render_key
+from figma_http import http_session
+from figma_progress import TransferProgress
+from figma_render_cache import RenderUrlCache
+from figma_selection import NodeIndex, add_selection_arguments, selection_from_args
+from figma_schedule import TimingHistory, largest_first, node_costs, plan_export, print_plan
+from figma_scales import RASTER_FORMATS, VariantDeriver, master_path, parse_scales, pillow_available, variant_path
+from figma_transcode import Transcoder, add_transcode_arguments, transcode_error, transcoder_from_args
+from figma_transfer import download_bytes
+
+FIGMA_API_BASE = os.environ.get("FIGMA_API_BASE", "https://api.figma.com/v1").rstrip("/")
 REQUEST_DELAY_SEC = 5
 MAX_RETRIES = 3
 RETRY_DELAY_SEC = 10
+# 同一批渲染结果的并发下载数：大图先派发，小图在其余线程里同时下载
+DOWNLOAD_WORKERS = 4
+# 未指定 --types 时导出的节点类型
+DEFAULT_NODE_TYPES = ("FRAME", "COMPONENT")
 
 
 def parse_file_key(url_or_key: str) -> str | None:
@@ -35,28 +53,31 @@ def sanitize_filename(name: str) -> str:
     return re.sub(r'[/\\:*?"<>|]', "_", name).strip() or "unnamed"
 
 
-def collect_nodes_top_level(document: dict) -> list[dict]:
-    """收集每页直接子节点中的 FRAME 和 COMPONENT。"""
-    result = []
-    for page in document.get("children", []):
-        if page.get("type") != "CANVAS":
-            continue
-        page_name = sanitize_filename(page.get("name", "Page"))
-        for child in page.get("children", []):
-            if child.get("type") in ("FRAME", "COMPONENT"):
-                result.append({
-                    "id": child.get("id"),
-                    "name": child.get("name", "unnamed"),
-                    "page": page_name,
-                    "path": sanitize_filename(child.get("name", "unnamed")),
-                })
-    return result
+def collect_nodes_top_level(document: dict, selection: dict | None = None) -> list[dict]:
+    """
+    通过节点索引收集待导出节点，默认为每页直接子节点中的 FRAME 和 COMPONENT。
+
+    selection 为 NodeIndex.select 的筛选参数；嵌套节点的 path 为从顶级节点起的名称路径。
+    """
+    index = NodeIndex(document)
+    selection = selection or {"types": list(DEFAULT_NODE_TYPES)}
+    return [
+        {
+            "id": entry["id"],
+            "name": entry["name"],
+            "page": sanitize_filename(entry["page"]),
+            "path": sanitize_filename(index.name_path(entry["id"])),
+            "render_key": render_key(entry["node"]),
+            "bbox": entry["bbox"],
+        }
+        for entry in index.select(**selection)
+    ]
 
 
 def get_file(token: str, file_key: str) -> dict:
     """获取 Figma 文件结构。"""
     url = f"{FIGMA_API_BASE}/files/{file_key}"
-    resp = requests.get(url, headers={"X-Figma-Token": token}, timeout=30)
+    resp = http_session().get(url, headers={"X-Figma-Token": token}, timeout=30)
     resp.raise_for_status()
     return resp.json()
 
@@ -67,7 +88,7 @@ def _request_with_retry(method: str, url: str, retry_on: tuple = (), **kwargs) -
     resp = None
     for attempt in range(MAX_RETRIES):
         try:
-            resp = requests.request(method, url, timeout=120, **kwargs)
+            resp = http_session().request(method, url, timeout=120, **kwargs)
             if resp.ok:
                 return resp
             if resp.status_code not in retry_on:
@@ -108,20 +129,41 @@ def get_image_urls(token: str, file_key: str, node_ids: list[str], scale: float,
     raise requests.HTTPError(f"{resp.status_code} {resp.reason}: {err_msg}", response=resp)
 
 
-def download_image_bytes(url: str) -> bytes:
-    """下载图片二进制内容，SSL/连接错误时自动重试。"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            resp = requests.get(url, timeout=120)
-            resp.raise_for_status()
-            return resp.content
-        except (requests.exceptions.SSLError, requests.exceptions.ConnectionError, OSError) as e:
-            if attempt < MAX_RETRIES - 1:
-                wait = RETRY_DELAY_SEC * (attempt + 1)
-                print(f"    [重试] 下载连接错误，{wait} 秒后重试: {e!r}")
-                time.sleep(wait)
-            else:
-                raise
+def download_image_bytes(url: str, progress: TransferProgress | None = None) -> bytes:
+    """下载图片二进制内容，SSL/连接错误时用 Range 从已收到的字节续传。"""
+    return download_bytes(
+        url,
+        retries=MAX_RETRIES,
+        retry_delay=RETRY_DELAY_SEC,
+        on_progress=progress.on_bytes if progress else None,
+        log=lambda msg: print(f"    [重试] {msg.strip()}"),
+    )
+
+
+def download_node_bytes(
+    token: str,
+    file_key: str,
+    node_id: str,
+    url: str,
+    scale: float,
+    fmt: str,
+    version: str | None,
+    render_cache: RenderUrlCache,
+    progress: TransferProgress | None = None,
+) -> bytes:
+    """下载节点图片；渲染地址过期（CDN 返回 403）时作废缓存、只对该节点重新渲染一次。"""
+    try:
+        return download_image_bytes(url, progress)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 403:
+            raise
+    print(f"    [重渲染] {node_id} 渲染地址已失效")
+    render_cache.invalidate(file_key, node_id, scale, fmt, version)
+    new_url = get_image_urls(token, file_key, [node_id], scale, fmt).get(node_id)
+    if not new_url:
+        raise RuntimeError("重新渲染未返回地址")
+    render_cache.put(file_key, node_id, scale, fmt, version, new_url)
+    return download_image_bytes(new_url, progress)
 
 
 def compress_png_oxipng(filepath: Path, level: int = 4) -> None:
@@ -135,6 +177,20 @@ def compress_png_oxipng(filepath: Path, level: int = 4) -> None:
         print(f"  [警告] 压缩失败 {filepath}: {e}")
 
 
+def compress_png_bytes(data: bytes, level: int = 4) -> bytes:
+    """内存中的 PNG 用 pyoxipng 无损压缩（写入归档时使用）；未安装或失败时原样返回。"""
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        return data
+    try:
+        import oxipng
+        return oxipng.optimize_from_memory(data, level=level)
+    except ImportError:
+        return data
+    except Exception as e:
+        print(f"  [警告] 压缩失败: {e}")
+        return data
+
+
 def run_export(
     token: str,
     file_key: str,
@@ -144,12 +200,44 @@ def run_export(
     compress: bool,
     batch_size: int = 5,
     fmt: str = "png",
+    version: str | None = None,
+    render_cache: RenderUrlCache | None = None,
+    scales: list[float] | None = None,
+    native_scales: bool = False,
+    dedupe: bool = True,
+    content_store: ContentStore | None = None,
+    pixel_budget: PixelBudget | None = None,
+    history: TimingHistory | None = None,
+    dry_run: bool = False,
+    archive: ArchiveSink | None = None,
+    transcoder: Transcoder | None = None,
+    download_workers: int = DOWNLOAD_WORKERS,
 ) -> int:
-    """导出一批节点到指定目录。"""
+    """
+    导出一批节点到指定目录。已缓存且未过期的渲染地址直接复用，不再请求 /images。
+
+    scales 非空时输出 Flutter 多倍率结构（1x 在原位置，其余在同级 2.0x/、3.0x/ 下）：
+    默认只渲染最高倍率，其余倍率在进程池中本地缩放；native_scales=True 时逐倍率渲染。
+
+    dedupe=True 时，同一组件、无覆盖、同尺寸的实例只渲染一个，其余输出用硬链接生成。
+    content_store 非空时，导出完成后把所有输出收入内容寻址存储，目录树改为指向对象的链接。
+
+    每次 /images 请求按像素预算组批（包围盒面积 × 倍率²），batch_size 只是单批节点数上限；
+    超出预算的节点单独请求，预算随实际渲染耗时调整，批次失败时缩小预算并拆分重试。
+    节点按估算代价（像素数 + history 中上次的实测耗时）从大到小处理，每批的下载按同样顺序提交到
+    download_workers 个线程，最大的图最先开始下载；写文件、归档与日志仍在主线程按完成顺序进行。
+    dry_run=True 时只打印计划。
+    archive 非空时不写目录，图片字节（含多倍率变体、去重副本）按相同的相对路径直接写进归档。
+    transcoder 非空时每张图（含变体）写好后交给进程池转码为 WebP/AVIF，与后续下载并行，不再做 oxipng 压缩。
+    """
     if not nodes:
         return 0
+    if render_cache is None:
+        render_cache = RenderUrlCache(persist=False)
+    budget = pixel_budget or PixelBudget()
+    if history is None:
+        history = TimingHistory(persist=False)
 
-    output_dir.mkdir(parents=True, exist_ok=True)
     used_paths: dict[str, int] = {}
 
     def unique_path(node: dict) -> Path:
@@ -166,44 +254,218 @@ def run_export(
             name = f"{base_flat}_{safe_id}_{idx}{ext}"
         return output_dir / sanitize_filename(page) / sanitize_filename(name)
 
+    paths = {n["id"]: unique_path(n) for n in nodes}
+    if scales:
+        render_scales = scales if native_scales else [max(scales)]
+    else:
+        render_scales = [scale]
+    derive_locally = bool(scales) and not native_scales
+    pending = []
+
+    duplicates = group_identical({n["id"]: n.get("render_key") for n in nodes}) if dedupe else {}
+    skipped = {nid for dups in duplicates.values() for nid in dups}
+    if skipped:
+        print(f"  [去重] {len(skipped)} 个实例与其他节点渲染结果相同，由 {len(duplicates)} 个代表节点生成")
+        nodes = [n for n in nodes if n["id"] not in skipped]
+    rendered_ok: dict[str, int] = {}
+
+    def final_path(path: Path) -> Path:
+        return transcoder.target(path) if transcoder else path
+
+    def output_files(nid: str) -> list[Path]:
+        return [final_path(variant_path(paths[nid], s)) for s in scales] if scales else [final_path(paths[nid])]
+
+    by_id = {n["id"]: n for n in nodes}
+    pixels_by_scale = {
+        s: {n["id"]: estimate_pixels(n.get("bbox"), s) for n in nodes} for s in render_scales
+    }
+    costs_by_scale = {
+        s: node_costs(history, file_key, list(by_id), pixels_by_scale[s], s, fmt) for s in render_scales
+    }
+
+    if dry_run:
+        plans = {}
+        for s in render_scales:
+            cached, _ = render_cache.split_cached(file_key, list(by_id), s, fmt, version)
+            plans[s] = plan_export(
+                list(by_id), pixels_by_scale[s], costs_by_scale[s], budget.pixels, batch_size,
+                cached=set(cached), request_delay=REQUEST_DELAY_SEC,
+            )
+        print_plan(plans, {nid: n["name"] for nid, n in by_id.items()})
+        return 0
+
+    if archive is None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    if content_store:
+        content_store.release(f for nid in paths for f in output_files(nid))
+    dup_written = 0
+
+    def emit(nid: str, path_scale: float, data: bytes) -> None:
+        """写入归档；代表节点的字节同时写到各重复实例的路径下。"""
+        nonlocal dup_written
+        for target in [nid] + duplicates.get(nid, []):
+            path = final_path(variant_path(paths[target], path_scale) if scales else paths[target])
+            if archive.write(path.relative_to(output_dir).as_posix(), data) and target != nid:
+                dup_written += 1
+
+    def emit_output(nid: str, path_scale: float, data: bytes) -> None:
+        """归档模式的一张输出：转码（进程池，完成后写入归档）或压缩后直接写入。"""
+        if transcoder:
+            label = (variant_path(paths[nid], path_scale) if scales else paths[nid]).relative_to(output_dir).as_posix()
+            transcoder.submit_bytes(data, lambda out: emit(nid, path_scale, out), label)
+        else:
+            emit(nid, path_scale, compress_png_bytes(data) if compress else data)
+
+    def finish_file(path: Path) -> None:
+        """目录模式的一张输出：转码或 oxipng 压缩。"""
+        if transcoder:
+            transcoder.submit(path)
+        elif compress and fmt == "png":
+            compress_png_oxipng(path)
+
     count = 0
-    i = 0
-    while i < len(nodes):
-        batch = nodes[i : i + batch_size]
-        ids = [n["id"] for n in batch]
-        print(f"  请求 {len(ids)} 个节点...")
-        try:
-            urls = get_image_urls(token, file_key, ids, scale, fmt)
-            time.sleep(REQUEST_DELAY_SEC)
-
-            for node in batch:
-                nid = node["id"]
-                url = urls.get(nid)
-                if not url:
-                    print(f"  [跳过] {node['name']} ({nid}) - 无法渲染")
-                    continue
-                out_path = unique_path(node)
-                out_path.parent.mkdir(parents=True, exist_ok=True)
+    total = len(nodes) * len(render_scales)
+    def fetch(nid: str, url: str, render_scale: float) -> tuple[bytes, float]:
+        """下载线程：只取字节并计时。"""
+        started = time.monotonic()
+        data = download_node_bytes(token, file_key, nid, url, render_scale, fmt, version, render_cache, progress)
+        return data, time.monotonic() - started
+
+    with TransferProgress(total_items=total, label="导出") as progress, VariantDeriver() as deriver, \
+            ThreadPoolExecutor(max_workers=max(1, download_workers)) as pool:
+        for render_scale in render_scales:
+            pixels = pixels_by_scale[render_scale]
+            order = largest_first(list(by_id), costs_by_scale[render_scale])
+            planner = BatchPlanner(order, pixels, budget, max_nodes=batch_size)
+            if planner.oversized:
+                print(f"  [大图] {planner.oversized} 个节点超过 {budget.pixels / 1e6:g} MP 预算，单独请求")
+            while planner:
+                ids = planner.next_batch()
+                batch = [by_id[nid] for nid in ids]
+                urls, missing = render_cache.split_cached(file_key, ids, render_scale, fmt, version)
+                if urls:
+                    print(f"  复用 {len(urls)} 个未过期的渲染地址")
+                if missing:
+                    cost = planner.cost(missing)
+                    print(f"  请求 {len(missing)} 个节点（约 {cost / 1e6:.1f} MP）...")
+                    started = time.monotonic()
+                    try:
+                        fresh = get_image_urls(token, file_key, missing, render_scale, fmt)
+                    except (requests.HTTPError, requests.exceptions.Timeout) as e:
+                        status = getattr(e.response, "status_code", None)
+                        if not isinstance(e, requests.exceptions.Timeout) and status not in (400, 500):
+                            raise
+                        shrunk = budget.on_failure(cost)
+                        if len(ids) > 1:
+                            if shrunk:
+                                print(f"  [拆分] 批次渲染失败，预算降至 {budget.pixels / 1e6:g} MP 后重试...")
+                            else:
+                                print(f"  [拆分] 批次渲染失败，预算已到下限，改为逐个节点重试...")
+                            planner.retry(ids, shrunk=shrunk)
+                        else:
+                            print(f"  [跳过] 节点渲染失败: {e}")
+                            progress.item_done(False)
+                        continue
+                    elapsed = time.monotonic() - started
+                    budget.observe(cost, elapsed)
+                    for nid in missing:
+                        history.record(file_key, nid, render_scale, fmt, pixels[nid],
+                                       render_sec=elapsed * pixels[nid] / cost)
+                    for nid, url in fresh.items():
+                        if url:
+                            render_cache.put(file_key, nid, render_scale, fmt, version, url)
+                            urls[nid] = url
+                    time.sleep(REQUEST_DELAY_SEC)
+
+                futures = {}
+                for node in batch:
+                    nid = node["id"]
+                    url = urls.get(nid)
+                    if not url:
+                        print(f"  [跳过] {node['name']} ({nid}) - 无法渲染")
+                        progress.item_done(False)
+                        continue
+                    futures[pool.submit(fetch, nid, url, render_scale)] = node
+
+                for future in as_completed(futures):
+                    node = futures[future]
+                    nid = node["id"]
+                    base_path = paths[nid]
+                    if derive_locally:
+                        out_path = master_path(base_path)
+                    elif scales:
+                        out_path = variant_path(base_path, render_scale)
+                    else:
+                        out_path = base_path
+                    if archive is None:
+                        out_path.parent.mkdir(parents=True, exist_ok=True)
+                    try:
+                        data, download_sec = future.result()
+                        history.record(file_key, nid, render_scale, fmt, pixels[nid],
+                                       download_sec=download_sec, size=len(data))
+                        if archive is not None:
+                            if derive_locally:
+                                pending.append((deriver.submit_bytes(data, render_scale, scales, fmt), nid))
+                            else:
+                                emit_output(nid, render_scale, data)
+                        else:
+                            out_path.write_bytes(data)
+                            if derive_locally:
+                                pending.append((deriver.submit(out_path, render_scale, base_path, scales, fmt), out_path))
+                            elif transcoder or data[:8] == b"\x89PNG\r\n\x1a\n":
+                                finish_file(out_path)
+                        count += 1
+                        rendered_ok[nid] = rendered_ok.get(nid, 0) + 1
+                        progress.item_done(True)
+                        print(f"  [OK] {out_path.relative_to(output_dir)}")
+                    except Exception as e:
+                        progress.item_done(False)
+                        print(f"  [失败] {node['name']}: {e}")
+                render_cache.save()
+                history.save()
+
+        if pending:
+            print(f"  生成多倍率变体（{len(pending)} 个节点）...")
+        for future, master in pending:
+            if archive is not None:
                 try:
-                    data = download_image_bytes(url)
-                    out_path.write_bytes(data)
-                    if compress and fmt == "png" and data[:8] == b"\x89PNG\r\n\x1a\n":
-                        compress_png_oxipng(out_path)
-                    count += 1
-                    print(f"  [OK] {out_path.relative_to(output_dir)}")
+                    for variant_scale, blob in future.result().items():
+                        emit_output(master, variant_scale, blob)
+                        print(f"  [变体] {variant_path(paths[master], variant_scale).relative_to(output_dir)}")
                 except Exception as e:
-                    print(f"  [失败] {node['name']}: {e}")
-            i += len(batch)
-        except requests.HTTPError as e:
-            if batch_size > 1 and e.response is not None and e.response.status_code in (400, 500):
-                print(f"  [拆分] 批次失败，改为逐节点请求...")
-                batch_size = 1
+                    print(f"  [失败] 生成多倍率变体 {master}: {e}")
                 continue
-            if batch_size == 1:
-                print(f"  [跳过] 节点渲染失败，跳过本批: {e}")
-                i += 1
+            try:
+                for written in future.result():
+                    written = Path(written)
+                    finish_file(written)
+                    print(f"  [变体] {written.relative_to(output_dir)}")
+            except Exception as e:
+                print(f"  [失败] 生成多倍率变体 {master.name}: {e}")
+            finally:
+                master.unlink(missing_ok=True)
+
+        # 去重副本与内容存储都基于转码后的文件：先等转码完成（归档模式下转码结果要在归档关闭前写入）
+        if transcoder:
+            transcoder.wait()
+
+    if skipped:
+        linked = dup_written
+        for rep_id, dups in duplicates.items():
+            if not rendered_ok.get(rep_id):
                 continue
-            raise
+            for dup in dups:
+                for src, dst in zip(output_files(rep_id), output_files(dup)):
+                    if archive is None and src.exists():
+                        link_or_copy(src, dst)
+                        linked += 1
+                count += rendered_ok[rep_id]
+        print(f"  [去重] 生成 {linked} 个文件，少渲染 {len(skipped) * len(render_scales)} 次")
+
+    if content_store:
+        for nid in paths:
+            for path in output_files(nid):
+                content_store.add(path)
 
     return count
 
@@ -256,15 +518,67 @@ def main() -> bool:
     )
     parser.add_argument("--file-key", "-k", help="Figma 文件 key（可与 URL 二选一）")
     parser.add_argument("--scale", "-s", type=float, default=3, help="导出倍率，默认 3")
+    parser.add_argument(
+        "--scales",
+        help="多倍率输出，如 1,2,3：只按最高倍率渲染一次，本地缩放出其余倍率，写入 2.0x/、3.0x/ 子目录；指定后忽略 --scale",
+    )
+    parser.add_argument("--native-scales", action="store_true", help="配合 --scales：每个倍率都由 Figma 原生渲染（像素精确）")
     parser.add_argument("--output-dir", "-o", default="./output", help="输出根目录，默认 ./output")
-    parser.add_argument("--batch-size", "-b", type=int, default=5, help="每批请求节点数，400/500 时可减小，默认 5")
+    parser.add_argument("--batch-size", "-b", type=int, default=5, help="每批最多请求的节点数，默认 5")
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=DOWNLOAD_WORKERS,
+        help=f"同一批渲染结果的并发下载数（大图先开始），默认 {DOWNLOAD_WORKERS}",
+    )
+    parser.add_argument(
+        "--pixel-budget",
+        type=float,
+        default=DEFAULT_PIXEL_BUDGET_MP,
+        help=f"每次渲染请求的像素预算（百万像素，按包围盒面积 × 倍率² 估算），随渲染耗时自动调整，默认 {DEFAULT_PIXEL_BUDGET_MP}",
+    )
     parser.add_argument("--no-compress", action="store_true", help="跳过 oxipng 无损压缩")
+    parser.add_argument("--no-render-cache", action="store_true", help="不读写渲染 URL 缓存（~/.cache/figmad）")
     parser.add_argument("--format", "-f", default="png", choices=["png", "jpg"], help="导出格式，默认 png")
     parser.add_argument("--env-file", help="环境变量文件路径")
     parser.add_argument("--figma-token", "-t", help="Figma API Token（或 FIGMA_ACCESS_TOKEN / FIGMA_TOKEN）")
+    parser.add_argument(
+        "--output-archive",
+        metavar="OUT.zip|OUT.tar",
+        help="直接写入 zip/tar（.tar.gz）归档，成员路径与目录输出相同，不生成目录树",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="只打印导出计划（请求数、预计字节数与耗时），不渲染不下载")
+    parser.add_argument("--no-dedup", action="store_true", help="不合并相同组件实例的渲染，每个节点都单独渲染")
+    parser.add_argument(
+        "--content-store",
+        action="store_true",
+        help="相同内容只存一份（输出目录下 .objects/），页面/画板目录树用硬链接指向它",
+    )
+    parser.add_argument("--symlink", action="store_true", help="配合 --content-store，用相对符号链接代替硬链接")
+    add_selection_arguments(parser, default_types=",".join(DEFAULT_NODE_TYPES))
+    add_transcode_arguments(parser)
 
     args = parser.parse_args()
 
+    scales = None
+    if args.scales:
+        try:
+            scales = parse_scales(args.scales)
+        except ValueError as e:
+            print(f"❌ 错误: --scales 格式不正确: {e}", file=sys.stderr)
+            return False
+        if args.format not in RASTER_FORMATS:
+            print(f"❌ 错误: --scales 仅支持 {'/'.join(RASTER_FORMATS)} 格式", file=sys.stderr)
+            return False
+        if not args.native_scales and not pillow_available():
+            print("⚠️  未安装 Pillow，无法本地缩放，改为每个倍率原生渲染（pip install Pillow）")
+            args.native_scales = True
+
+    error = transcode_error(args, args.format)
+    if error:
+        print(f"❌ 错误: {error}", file=sys.stderr)
+        return False
+
     env_file = Path(args.env_file) if args.env_file else None
     token = (
         args.figma_token
@@ -282,6 +596,14 @@ def main() -> bool:
         print("❌ 错误: 请设置 FIGMA_ACCESS_TOKEN 或 FIGMA_TOKEN 环境变量，或使用 --figma-token", file=sys.stderr)
         return False
 
+    if args.output_archive:
+        if not archive_kind(Path(args.output_archive)):
+            print("❌ 错误: --output-archive 仅支持 .zip / .tar / .tar.gz", file=sys.stderr)
+            return False
+        if args.content_store:
+            print("❌ 错误: --output-archive 不能与 --content-store 同时使用", file=sys.stderr)
+            return False
+
     output_root = Path(args.output_dir)
     compress = not args.no_compress
 
@@ -289,16 +611,50 @@ def main() -> bool:
     file_data = get_file(token, file_key)
     document = file_data.get("document", {})
 
-    nodes = collect_nodes_top_level(document)
+    try:
+        nodes = collect_nodes_top_level(document, selection_from_args(args, list(DEFAULT_NODE_TYPES)))
+    except re.error as e:
+        print(f"❌ 错误: --page 正则无效: {e}", file=sys.stderr)
+        return False
     if not nodes:
-        print("⚠️  未找到可导出的顶级 Frame/Component")
+        print("⚠️  未找到可导出的顶级 Frame/Component（或没有节点匹配筛选条件）")
         return True
 
-    print(f"\n📥 导出 {len(nodes)} 个顶级画板 -> {output_root}（每批 {args.batch_size} 个节点）")
-    total = run_export(
-        token, file_key, nodes, output_root,
-        args.scale, compress, args.batch_size, args.format
-    )
+    target = args.output_archive or output_root
+    print(f"\n📥 导出 {len(nodes)} 个顶级画板 -> {target}（每批最多 {args.batch_size} 个节点 / {args.pixel_budget:g} MP）")
+    render_cache = RenderUrlCache(persist=not args.no_render_cache)
+    content_store = ContentStore(output_root / ".objects", symlink=args.symlink) if args.content_store else None
+    archive = ArchiveSink(Path(args.output_archive)) if args.output_archive and not args.dry_run else None
+    transcoder = transcoder_from_args(args, root=output_root) if not args.dry_run else None
+    finished = False
+    try:
+        total = run_export(
+            token, file_key, nodes, output_root,
+            args.scale, compress, args.batch_size, args.format,
+            version=file_data.get("version"), render_cache=render_cache,
+            scales=scales, native_scales=args.native_scales, dedupe=not args.no_dedup,
+            content_store=content_store,
+            pixel_budget=PixelBudget(int(args.pixel_budget * 1_000_000)),
+            history=TimingHistory(),
+            dry_run=args.dry_run,
+            archive=archive,
+            transcoder=transcoder,
+            download_workers=args.download_workers,
+        )
+        finished = True
+    finally:
+        if transcoder:
+            transcoder.close()
+        # 只有导出正常结束才替换归档，中断或出错时保留上一次的完整归档
+        if archive and finished:
+            archive.close()
+        elif archive:
+            archive.abort()
+    if args.dry_run:
+        return True
+    render_cache.save()
+    if content_store:
+        content_store.print_summary()
 
     print(f"\n✅ 完成，共下载 {total} 张图片。")
     return True
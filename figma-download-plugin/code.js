@@ -1,84 +1,70 @@
 /**
  * UGC 图片导出下载 - Figma 插件
  * 支持：输出路径、下载后关闭面板、可选压缩服务（POST 图片得压缩图，保存为 原名_compress.ext）
+ * 选中图层按有限并发导出，压缩与导出重叠进行；面板把所有结果打成一个 zip，只触发一次下载
+ * 勾选「直接写入项目」时改为 POST 到本地服务的 /save，由服务压缩后写进项目资源目录
  */
 const SUPPORTED_FORMATS = ['PNG', 'JPG'];
 const DEFAULT_SCALE = 3;
 const DEFAULT_FORMAT = 'PNG';
 /** 默认压缩服务地址，与同目录下 compress-service-url.txt 内容一致，首次打开会预填 */
 const DEFAULT_COMPRESS_SERVICE_URL = 'http://localhost:8765/compress';
+/** 同时进行的 exportAsync 数量 */
+const EXPORT_CONCURRENCY = 4;
+/** 同时进行的压缩服务请求数量（压缩与后续导出并行） */
+const COMPRESS_CONCURRENCY = 4;
+/** 写盘口令请求头，与 figma_compress_server.py 的 SAVE_TOKEN_HEADER 一致 */
+const SAVE_TOKEN_HEADER = 'X-Figma-Save-Token';
 
-const uiHtml = `<!DOCTYPE html>
-<html>
-<head>
-<meta charset="utf-8">
-<style>
-*{box-sizing:border-box}
-body{margin:0;padding:12px 16px;font-family:Inter,-apple-system,sans-serif;font-size:12px;color:#333}
-h3{margin:0 0 12px 0;font-size:14px;font-weight:600}
-.row{margin-bottom:12px}
-label{display:block;margin-bottom:4px;font-weight:500;color:#666}
-select,input{width:100%;padding:8px 10px;border:1px solid #e0e0e0;border-radius:6px;font-size:12px;background:#fff}
-select:focus,input:focus{outline:none;border-color:#0d99ff}
-button{width:100%;margin-top:8px;padding:10px 16px;font-size:13px;font-weight:500;color:#fff;background:#0d99ff;border:none;border-radius:6px;cursor:pointer}
-button:hover{background:#0b85e0}
-.hint{margin-top:6px;font-size:11px;color:#888;line-height:1.4}
-#status{margin-top:10px;padding:8px 10px;border-radius:6px;font-size:11px;min-height:20px}
-#status.error{background:#ffebee;color:#c62828}
-#status.success{background:#e8f5e9;color:#2e7d32}
-</style>
-</head>
-<body>
-<h3>UGC 图片导出</h3>
-<!-- 暂不需要：输出路径
-<div class="row"><label>输出路径（保存时的子目录，如 figma_export 或 assets/images）</label>
-<input type="text" id="outputPath" placeholder="留空则保存到浏览器默认下载目录" />
-</div>
--->
-<div class="row"><label>倍率</label>
-<select id="scale"><option value="1">1x</option><option value="2">2x</option><option value="3" selected>3x</option><option value="4">4x</option></select>
-</div>
-<div class="row"><label>格式</label>
-<select id="format"><option value="PNG" selected>PNG</option><option value="JPG">JPG</option></select>
-</div>
-<div class="row"><label>压缩服务 URL（可选，会记住）</label>
-<input type="text" id="compressScript" placeholder="http://localhost:8765/compress" />
-<p class="hint">本机先运行: python scripts/figma_compress_server.py。填一次即可，下次自动带出。</p>
-</div>
-<div class="row">
-<label style="display:flex;align-items:center;gap:8px;cursor:pointer"><input type="checkbox" id="onlyCompressed" /> 仅下载压缩图（不下载原图，适合多张 3x+TinyPNG 一步到位）</label>
-</div>
-<button id="btn">下载选中图层（多选即多张）</button>
-<div id="status"></div>
-<script>
-(function(){
-var outputPath=document.getElementById('outputPath'),scale=document.getElementById('scale'),format=document.getElementById('format'),compressScript=document.getElementById('compressScript'),btn=document.getElementById('btn'),status=document.getElementById('status');
-function setStatus(t,k){ status.textContent=t||''; status.className=k||''; }
-function downloadBlob(bytes,name,mime){
-  var blob=new Blob([bytes],{type:mime}), url=URL.createObjectURL(blob), a=document.createElement('a');
-  a.href=url;a.download=name;a.click();URL.revokeObjectURL(url);
+// 面板界面只有一份：manifest 的 "ui": "ui.html"，由 Figma 注入为 __html__
+figma.showUI(__html__, { width: 400, height: 520 });
+
+/**
+ * 并发上限：返回 run(task)，同时最多执行 limit 个 task，其余排队。
+ * 名额在完成时直接交给下一个排队者，不会被新来的调用插队超出上限。
+ */
+function createLimiter(limit) {
+  let active = 0;
+  const waiting = [];
+  return async function run(task) {
+    if (active >= limit) {
+      await new Promise((resolve) => waiting.push(resolve));
+    } else {
+      active++;
+    }
+    try {
+      return await task();
+    } finally {
+      const next = waiting.shift();
+      if (next) next();
+      else active--;
+    }
+  };
 }
-window.onmessage=function(ev){
-  var m=ev.data&&ev.data.pluginMessage; if(!m) return;
-  if(m.type==='init'){ if(m.compressServiceUrl!=null) compressScript.value=m.compressServiceUrl; return; }
-  if(m.type==='export'){
-    var raw=m.bytes, bytes=raw instanceof Uint8Array ? raw : new Uint8Array(raw||[]), name=m.name||'export.png', isPng=/\\.png$/i.test(name), mime=isPng?'image/png':'image/jpeg';
-    downloadBlob(bytes,name,mime);
-  }else if(m.type==='done'){ setStatus('已触发下载，请在弹出的窗口中选择保存位置；若未弹窗请到默认下载目录查看。用完后可手动关闭此面板。','success'); }
-  else if(m.type==='error'){ setStatus(m.message||'出错','error'); }
-};
-parent.postMessage({pluginMessage:{type:'getConfig'}},'*');
-btn.onclick=function(){
-  setStatus('');
-  var out=outputPath&&outputPath.value ? String(outputPath.value).trim() : '';
-  var url=compressScript&&compressScript.value ? String(compressScript.value).trim() : '';
-  var onlyComp=!!(document.getElementById('onlyCompressed')&&document.getElementById('onlyCompressed').checked);
-  parent.postMessage({pluginMessage:{type:'download',outputPath:out||undefined,compressServiceUrl:url||undefined,onlyCompressed:onlyComp,scale:parseInt(scale.value,10)||3,format:format.value}},'*');
-};
-})();
-</script></body></html>`;
 
-figma.showUI(uiHtml, { width: 400, height: 420 });
+/** 打包文件名：当前页面名 + 倍率 */
+function archiveName(scaleNum) {
+  const page = String(figma.currentPage.name || 'figma').replace(/[\\/:*?"<>|\s]+/g, '_').replace(/^_+|_+$/g, '');
+  return (page || 'figma') + '@' + scaleNum + 'x.zip';
+}
+
+/** 压缩服务地址 …/compress 对应的写盘地址 …/save */
+function saveUrlFrom(compressUrl) {
+  return compressUrl.replace(/\/compress\/?$/, '').replace(/\/+$/, '') + '/save';
+}
+
+/** 把图片交给本地服务压缩并写入项目资源目录，返回写入的相对路径 */
+async function saveViaService(bytes, saveUrl, outputPath, token) {
+  const url = saveUrl + '?compress=1&outputPath=' + encodeURIComponent(outputPath);
+  // 口令放在自定义请求头里（不放 URL），服务端据此拒绝其他网页的写入
+  const r = await fetch(url, { method: 'POST', headers: { [SAVE_TOKEN_HEADER]: token }, body: bytes });
+  if (!r.ok) {
+    const detail = await r.text().catch(() => '');
+    throw new Error('写盘服务返回 ' + r.status + (detail ? '：' + detail : ''));
+  }
+  const result = await r.json();
+  return result.path || outputPath;
+}
 
 async function compressViaService(bytes, serviceUrl) {
   const url = String(serviceUrl).trim();
@@ -92,12 +78,17 @@ async function compressViaService(bytes, serviceUrl) {
 figma.ui.onmessage = async (msg) => {
   if (msg.type === 'getConfig') {
     const url = await figma.clientStorage.getAsync('compressServiceUrl');
-    figma.ui.postMessage({ type: 'init', compressServiceUrl: url != null && url !== '' ? url : DEFAULT_COMPRESS_SERVICE_URL });
+    figma.ui.postMessage({
+      type: 'init',
+      compressServiceUrl: url != null && url !== '' ? url : DEFAULT_COMPRESS_SERVICE_URL,
+      saveToProject: !!(await figma.clientStorage.getAsync('saveToProject')),
+      saveToken: (await figma.clientStorage.getAsync('saveToken')) || '',
+    });
     return;
   }
 
   if (msg.type !== 'download') return;
-  const { scale = DEFAULT_SCALE, format = DEFAULT_FORMAT, outputPath, compressServiceUrl, onlyCompressed } = msg;
+  const { scale = DEFAULT_SCALE, format = DEFAULT_FORMAT, outputPath, compressServiceUrl, onlyCompressed, saveToProject, saveToken } = msg;
   const selection = figma.currentPage.selection.slice();
 
   if (selection.length === 0) {
@@ -118,46 +109,86 @@ figma.ui.onmessage = async (msg) => {
     await figma.clientStorage.setAsync('compressServiceUrl', compressUrl);
   }
   const onlyComp = !!onlyCompressed && !!compressUrl;
+  await figma.clientStorage.setAsync('saveToProject', !!saveToProject);
+  await figma.clientStorage.setAsync('saveToken', saveToken || '');
+  if (saveToProject && !compressUrl) {
+    figma.ui.postMessage({ type: 'error', message: '直接写入项目需要填写压缩服务 URL' });
+    return;
+  }
+  if (saveToProject && !saveToken) {
+    figma.ui.postMessage({ type: 'error', message: '直接写入项目需要填写写盘口令（压缩服务启动时打印）' });
+    return;
+  }
+  // 写入项目：每张图直接 POST 到本地服务的 /save（服务端压缩并写盘），不再发回面板下载
+  const saveUrl = saveToProject ? saveUrlFrom(compressUrl) : '';
 
-  try {
-    for (let i = 0; i < selection.length; i++) {
-      const node = selection[i];
+  const ext = exportFormat.toLowerCase() === 'jpg' ? 'jpg' : 'png';
+  const withPrefix = (name) => (outPrefix ? outPrefix + '/' + name : name);
+  const exportLimit = createLimiter(EXPORT_CONCURRENCY);
+  const compressLimit = createLimiter(COMPRESS_CONCURRENCY);
+  const errors = [];
+  let finished = 0;
+  let files = 0;
+  let saved = 0;
+
+  const postFile = (bytes, name) => {
+    files++;
+    figma.ui.postMessage({ type: 'export', bytes: bytes, name: name });
+  };
+
+  // 每个节点：导出占一个导出名额，导出完立即让出名额，再排队压缩，压缩与后续导出重叠进行
+  const exportNode = async (node) => {
+    try {
       if (!('exportAsync' in node)) {
-        figma.ui.postMessage({ type: 'error', message: '「' + node.name + '」不支持导出为图片' });
-        continue;
+        errors.push('「' + node.name + '」不支持导出为图片');
+        return;
+      }
+      let bytes;
+      try {
+        bytes = await exportLimit(() => node.exportAsync({
+          format: exportFormat,
+          constraint: { type: 'SCALE', value: scaleNum },
+        }));
+      } catch (e) {
+        errors.push('「' + node.name + '」导出失败: ' + (e && e.message ? e.message : String(e)));
+        return;
+      }
+      const baseName = node.id.replace(/:/g, '_') + '@' + scaleNum + 'x';
+
+      if (saveUrl) {
+        try {
+          await compressLimit(() => saveViaService(bytes, saveUrl, withPrefix(baseName + '.' + ext), saveToken));
+          saved++;
+        } catch (e) {
+          errors.push('「' + node.name + '」写入失败: ' + (e && e.message ? e.message : String(e)));
+        }
+        return;
       }
-      const bytes = await node.exportAsync({
-        format: exportFormat,
-        constraint: { type: 'SCALE', value: scaleNum },
-      });
-      const safeId = node.id.replace(/:/g, '_');
-      const ext = exportFormat.toLowerCase() === 'jpg' ? 'jpg' : 'png';
-      const baseName = safeId + '@' + scaleNum + 'x.' + ext;
-      const fullName = outPrefix ? outPrefix + '/' + baseName : baseName;
 
       if (!onlyComp) {
-        figma.ui.postMessage({ type: 'export', bytes: bytes, name: fullName });
+        postFile(bytes, withPrefix(baseName + '.' + ext));
       }
 
       if (compressUrl) {
         try {
-          const compressed = await compressViaService(bytes, compressUrl);
+          const compressed = await compressLimit(() => compressViaService(bytes, compressUrl));
           if (compressed && compressed.length > 0) {
-            const compressName = onlyComp
-              ? (outPrefix ? outPrefix + '/' + baseName : baseName)
-              : (outPrefix ? outPrefix + '/' + safeId + '@' + scaleNum + 'x_compress.' + ext : safeId + '@' + scaleNum + 'x_compress.' + ext);
-            figma.ui.postMessage({ type: 'export', bytes: compressed, name: compressName });
+            postFile(compressed, withPrefix(baseName + (onlyComp ? '' : '_compress') + '.' + ext));
           }
         } catch (e) {
-          if (onlyComp) {
-            figma.ui.postMessage({ type: 'error', message: '压缩失败: ' + (e && e.message ? e.message : String(e)) });
-          } else {
-            figma.ui.postMessage({ type: 'error', message: '压缩失败（已下原图）: ' + (e && e.message ? e.message : String(e)) });
-          }
+          errors.push((onlyComp ? '压缩失败: ' : '压缩失败（已下原图）: ') + (e && e.message ? e.message : String(e)));
         }
       }
+    } finally {
+      finished++;
+      figma.ui.postMessage({ type: 'progress', done: finished, total: selection.length });
     }
-    figma.ui.postMessage({ type: 'done' });
+  };
+
+  figma.ui.postMessage({ type: 'start', total: selection.length, archiveName: archiveName(scaleNum) });
+  try {
+    await Promise.all(selection.map(exportNode));
+    figma.ui.postMessage({ type: 'done', files: files, saved: saved, errors: errors });
   } catch (e) {
     figma.ui.postMessage({ type: 'error', message: '导出失败: ' + (e && e.message ? e.message : String(e)) });
   }
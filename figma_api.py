@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+Figma REST API 与渲染图下载（库层）
+figma_client.FigmaClient 与命令行 download_figma_image.py 共用：配置读取、URL 解析、
+带限速与重试的 API 请求、文件结构缓存、渲染 URL 获取、断点续传下载与 TinyPNG 压缩。
+
+本模块不依赖命令行脚本；会输出进度的函数都接受 log 参数（默认 print），
+FigmaClient 传入自己的 log，作为库使用时可以保持安静或接入 logging。
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from figma_compress import TinyPngKeyPool, compress_bytes
+from figma_http import TokenPool, api_limiter, http_session, retry_after_seconds, token_rejected
+from figma_render_cache import RenderUrlCache, RenderUrlExpired
+from figma_transfer import download_bytes, download_to_file
+
+# Figma REST API 默认地址（FIGMA_API_BASE 可指向本地替身服务，便于测试）
+DEFAULT_API_BASE = "https://api.figma.com/v1"
+
+# Figma API 请求重试配置
+FIGMA_API_RETRIES = 4
+FIGMA_API_TIMEOUT = 90
+FIGMA_API_RETRY_DELAY = 2
+
+# 多文件模式（--files / --project）同时处理的文件数
+FILE_WORKERS = 4
+
+# 文件结构 / 节点信息的内存缓存有效期（秒，FIGMAD_STRUCTURE_TTL），常驻进程（figmad daemon）中跨调用复用
+DEFAULT_STRUCTURE_CACHE_TTL = 60.0
+# 最多缓存的条目数（FIGMAD_STRUCTURE_CACHE_SIZE，按最近使用淘汰）：常驻进程不会把见过的每个文件的文档 JSON 都留在内存里
+DEFAULT_STRUCTURE_CACHE_SIZE = 16
+_STRUCTURE_CACHE = OrderedDict()
+_STRUCTURE_CACHE_LOCK = threading.Lock()
+_ENV_FILE_CACHE = {}
+
+
+def _env_number(name, default, cast):
+    try:
+        return cast(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+
+# 以下配置每次调用时读取环境变量：常驻进程按请求切换 os.environ，不能在导入时固定下来
+def api_base():
+    """Figma REST API 地址：FIGMA_API_BASE，未设置时为 api.figma.com"""
+    return (os.environ.get("FIGMA_API_BASE") or DEFAULT_API_BASE).rstrip("/")
+
+
+def structure_cache_ttl():
+    """文件结构缓存有效期（秒）：FIGMAD_STRUCTURE_TTL，0 表示不缓存"""
+    return _env_number("FIGMAD_STRUCTURE_TTL", DEFAULT_STRUCTURE_CACHE_TTL, float)
+
+
+def structure_cache_size():
+    """文件结构缓存最多保留的条目数：FIGMAD_STRUCTURE_CACHE_SIZE"""
+    return _env_number("FIGMAD_STRUCTURE_CACHE_SIZE", DEFAULT_STRUCTURE_CACHE_SIZE, int)
+
+
+def load_env_file(file_path):
+    """
+    从 .env 文件中加载环境变量
+    
+    支持格式：
+    - KEY=value
+    - KEY="value"
+    - KEY='value'
+    - # 注释行
+    - 空行
+    
+    返回: dict 包含加载的环境变量（按文件修改时间缓存，未改动时不重复读取）
+    """
+    env_vars = {}
+    if not file_path or not file_path.exists():
+        return env_vars
+    
+    try:
+        stat = file_path.stat()
+        cache_key = (str(file_path.resolve()), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        cache_key = None
+    if cache_key in _ENV_FILE_CACHE:
+        return dict(_ENV_FILE_CACHE[cache_key])
+    
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                # 跳过空行和注释
+                if not line or line.startswith('#'):
+                    continue
+                
+                # 解析 KEY=value
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    key = key.strip()
+                    value = value.strip()
+                    
+                    # 移除引号
+                    if (value.startswith('"') and value.endswith('"')) or \
+                       (value.startswith("'") and value.endswith("'")):
+                        value = value[1:-1]
+                    
+                    env_vars[key] = value
+    except Exception as e:
+        print(f"⚠️  读取环境变量文件失败 {file_path}: {e}")
+        return env_vars
+    
+    if cache_key:
+        _ENV_FILE_CACHE[cache_key] = dict(env_vars)
+    return env_vars
+
+
+def get_config_value(key, env_file=None, default=None):
+    """
+    按优先级获取配置值：
+    1. 指定的环境变量文件
+    2. 当前目录下的 .env 文件
+    3. 终端环境变量
+    
+    返回: 配置值或 None
+    """
+    # 优先级 1: 指定的环境变量文件
+    if env_file:
+        env_vars = load_env_file(Path(env_file))
+        if key in env_vars:
+            return env_vars[key]
+    
+    # 优先级 2: 当前目录下的 .env 文件
+    current_dir = Path.cwd()
+    env_path = current_dir / '.env'
+    if env_path.exists():
+        env_vars = load_env_file(env_path)
+        if key in env_vars:
+            return env_vars[key]
+    
+    # 优先级 3: 终端环境变量
+    return os.getenv(key, default)
+
+
+def resolve_figma_token(env_file=None):
+    """
+    获取 Figma 令牌：FIGMA_ACCESS_TOKENS（逗号/空白分隔的多个令牌）优先，其次 FIGMA_ACCESS_TOKEN
+    
+    返回: 多个令牌时为 TokenPool，单个时为字符串，未配置时为 None
+    """
+    tokens = get_config_value('FIGMA_ACCESS_TOKENS', env_file)
+    if tokens and tokens.strip():
+        pool = TokenPool.parse(tokens)
+        return pool if len(pool) > 1 else pool.tokens[0]
+    return get_config_value('FIGMA_ACCESS_TOKEN', env_file)
+
+
+def resolve_tinypng_key(env_file=None):
+    """
+    获取 TinyPNG key：TINYPNG_API_KEYS（逗号/空白分隔的多个 key）优先，其次 TINYPNG_API_KEY
+    
+    返回: 多个 key 时为 TinyPngKeyPool，单个时为字符串，未配置时为 None
+    """
+    keys = get_config_value('TINYPNG_API_KEYS', env_file)
+    if keys and keys.strip():
+        pool = TinyPngKeyPool.parse(keys)
+        return pool if len(pool) > 1 else pool.keys[0]
+    return get_config_value('TINYPNG_API_KEY', env_file)
+
+
+def parse_figma_url(url, log=print):
+    """
+    从 Figma URL 中解析出 file-key 和 node-id
+    
+    支持的 URL 格式：
+    - https://www.figma.com/design/{file_key}/文件名?node-id={node_id}
+    - https://www.figma.com/file/{file_key}/文件名?node-id={node_id}
+    - https://figma.com/design/{file_key}/文件名?node-id={node_id}
+    
+    返回: (file_key, node_id) 或 (None, None)，无 node-id 时返回 (file_key, None)
+    """
+    try:
+        # 解析 URL
+        parsed = urlparse(url)
+        
+        # 提取 file-key（从路径中）
+        path_parts = parsed.path.strip('/').split('/')
+        if len(path_parts) >= 2 and path_parts[0] in ['design', 'file']:
+            file_key = path_parts[1]
+        else:
+            return None, None
+        
+        # 提取 node-id（从查询参数中）
+        query_params = parse_qs(parsed.query)
+        node_id_param = query_params.get('node-id', [None])[0]
+        
+        if not node_id_param:
+            return file_key, None
+        
+        # 将 node-id 中的 - 替换为 :（Figma URL 使用 -，API 使用 :）
+        node_id = node_id_param.replace('-', ':')
+        
+        return file_key, node_id
+    except Exception as e:
+        log(f"⚠️  URL 解析失败: {e}")
+        return None, None
+
+
+def figma_api_get(url, access_token, params=None, timeout=FIGMA_API_TIMEOUT):
+    """
+    Figma REST API 的 GET 请求：先经过该令牌的共享限速器；收到 429 时按 Retry-After 让该令牌退避
+    
+    access_token 可以是单个令牌或 TokenPool：
+    - 每次请求选最快可用的令牌
+    - 429 时该令牌退避，有其他令牌立即可用就马上换令牌重发
+    - 令牌无效/过期的 403：移出令牌池，换下一个令牌重发
+    - 对该文件没有权限的 403：只记在 (文件, 令牌) 上，该文件换下一个令牌重发，令牌仍用于其他文件
+    
+    返回: requests.Response（非 2xx 时抛出 HTTPError，由调用方重试）
+    """
+    pool = access_token if isinstance(access_token, TokenPool) else None
+    scope = _file_key_of_api_url(url)
+    attempts = len(pool) if pool else 1
+    for attempt in range(attempts):
+        token = pool.pick(scope) if pool else access_token
+        limiter = api_limiter(token)
+        limiter.acquire()
+        headers = {
+            "X-Figma-Token": token,
+            "User-Agent": "figmad/1.0",
+        }
+        response = http_session().get(url, params=params, headers=headers, timeout=timeout)
+        more = attempt + 1 < attempts
+        if response.status_code == 429:
+            limiter.backoff(retry_after_seconds(response))
+            if pool and more and pool.available_now():
+                continue
+        elif response.status_code == 403 and pool:
+            if token_rejected(response):
+                if pool.drop(token) and more:
+                    continue
+            elif scope and pool.deny(token, scope) and more:
+                continue
+        response.raise_for_status()
+        return response
+
+
+def _file_key_of_api_url(url):
+    """/v1/files/KEY…、/v1/images/KEY… 中的文件 key（权限 403 按文件记录）"""
+    match = re.search(r"/(?:files|images)/([^/?#]+)", url)
+    return match.group(1) if match else None
+
+
+def _structure_cache_get(key):
+    with _STRUCTURE_CACHE_LOCK:
+        entry = _STRUCTURE_CACHE.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= structure_cache_ttl():
+            del _STRUCTURE_CACHE[key]
+            return None
+        _STRUCTURE_CACHE.move_to_end(key)
+        return entry[1]
+
+
+def _structure_cache_put(key, data):
+    """写入缓存：先清掉过期条目，再按最近使用淘汰到 structure_cache_size() 条以内"""
+    ttl, size = structure_cache_ttl(), structure_cache_size()
+    if ttl <= 0 or size <= 0:
+        return
+    now = time.monotonic()
+    with _STRUCTURE_CACHE_LOCK:
+        for stale in [k for k, (stored, _) in _STRUCTURE_CACHE.items() if now - stored >= ttl]:
+            del _STRUCTURE_CACHE[stale]
+        _STRUCTURE_CACHE[key] = (now, data)
+        _STRUCTURE_CACHE.move_to_end(key)
+        while len(_STRUCTURE_CACHE) > size:
+            _STRUCTURE_CACHE.popitem(last=False)
+
+
+def get_file_structure(file_key, access_token, fresh=False, log=print):
+    """
+    获取 Figma 文件的完整结构（带重试，应对 Response ended prematurely 等网络问题）
+    
+    结果在内存中缓存 FIGMAD_STRUCTURE_TTL 秒，常驻进程中重复调用不再请求；fresh=True 时跳过缓存重新获取
+    缓存键包含 API 地址：常驻进程中指向不同 FIGMA_API_BASE 的调用不会互相命中
+    """
+    base = api_base()
+    cache_key = ('file', base, file_key, access_token)
+    cached = None if fresh else _structure_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    url = f"{base}/files/{file_key}"
+    last_error = None
+    for attempt in range(1, FIGMA_API_RETRIES + 1):
+        try:
+            data = figma_api_get(url, access_token).json()
+            _structure_cache_put(cache_key, data)
+            return data
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            if attempt < FIGMA_API_RETRIES:
+                delay = FIGMA_API_RETRY_DELAY * attempt
+                log(f"   ⚠️  第 {attempt} 次尝试失败: {e}")
+                log(f"   🔄 {delay} 秒后重试 ({attempt + 1}/{FIGMA_API_RETRIES})...")
+                time.sleep(delay)
+            else:
+                break
+    log(f"❌ 获取文件结构失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
+    if hasattr(last_error, 'response') and last_error.response is not None:
+        log(f"   响应状态码: {last_error.response.status_code}")
+        if last_error.response.text:
+            log(f"   响应内容: {last_error.response.text[:500]}")
+    return None
+
+
+def get_file_version(file_key, access_token, log=print):
+    """
+    只查询文件当前版本号（depth=1，只返回页面列表，不拉取整棵文档树），供监视模式轮询
+    
+    返回: 版本号字符串；请求失败时返回 None（已打印原因，调用方下一轮再查）
+    """
+    url = f"{api_base()}/files/{file_key}"
+    try:
+        data = figma_api_get(url, access_token, params={'depth': 1}).json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"   ⚠️  查询文件版本失败: {e}")
+        return None
+    return data.get('version')
+
+
+def tinypng_compress_bytes(image_data, api_key, log=print):
+    """
+    压缩内存中的图片：api_key 可以是单个 key、逗号分隔的多个 key 或 TinyPngKeyPool，
+    按各 key 的剩余额度分配，额度全部用完后改用本地压缩（Pillow / oxipng）
+    
+    返回: 压缩后的字节；失败时返回 None（已打印原因，调用方使用原图）
+    """
+    try:
+        return compress_bytes(image_data, api_key, log)
+    except Exception as e:
+        log(f"   ⚠️  压缩失败: {e}，使用原始文件")
+        return None
+
+
+def optimize_image_with_tinypng(input_path, output_path, api_key, log=print):
+    """使用 TinyPNG API 优化图片，压缩文件大小但保持高质量"""
+    if not api_key:
+        log("   ⚠️  TinyPNG API key 未提供，跳过压缩")
+        # 如果 API key 不可用，直接复制文件
+        shutil.copy2(input_path, output_path)
+        return False
+    
+    with open(input_path, 'rb') as f:
+        image_data = f.read()
+    compressed = tinypng_compress_bytes(image_data, api_key, log)
+    if compressed is None:
+        # 如果压缩失败，使用原始文件
+        shutil.copy2(input_path, output_path)
+        return False
+    with open(output_path, 'wb') as f:
+        f.write(compressed)
+    return True
+
+
+def download_image(url, output_path, optimize=True, api_key=None, progress=None, log=print):
+    """
+    下载图片到指定路径，并可选地进行优化压缩
+
+    连接中断时用同一个 URL 从已写入的字节断点续传（不重新渲染，.tmp 保留到下次运行也能续传）；
+    CDN 返回 403（渲染地址已过期）时抛出 RenderUrlExpired，由调用方重新渲染。
+    下载字节数汇总到 progress（TransferProgress），不再逐块打印进度。
+    """
+    try:
+        log(f"📥 正在下载: {url}")
+        
+        # 临时文件路径
+        temp_path = output_path.with_suffix('.tmp')
+        
+        try:
+            downloaded = download_to_file(
+                url,
+                temp_path,
+                retries=FIGMA_API_RETRIES,
+                retry_delay=FIGMA_API_RETRY_DELAY,
+                on_progress=progress.on_bytes if progress else None,
+                log=log
+            )
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 403:
+                raise RenderUrlExpired(url) from e
+            raise
+        
+        log(f"✅ 下载完成: {downloaded / 1024:.1f} KB")
+        
+        # 优化图片（使用 TinyPNG API）
+        if optimize and api_key:
+            log("🔧 正在压缩图片（TinyPNG）...")
+            optimize_image_with_tinypng(temp_path, output_path, api_key, log)
+            # 删除临时文件
+            if temp_path.exists():
+                temp_path.unlink()
+        else:
+            # 直接移动文件
+                shutil.move(temp_path, output_path)
+        
+        final_size = os.path.getsize(output_path)
+        log(f"✅ 最终文件: {output_path.name} ({final_size / 1024:.1f} KB)")
+        return True
+    except RenderUrlExpired:
+        raise
+    except requests.exceptions.RequestException as e:
+        log(f"❌ 下载失败 {output_path}: {e}")
+        return False
+    except Exception as e:
+        log(f"❌ 处理失败 {output_path}: {e}")
+        return False
+
+
+def get_file_node_info(file_key, node_id, access_token, log=print):
+    """获取 Figma 文件的节点详细信息（与文件结构共用内存缓存）"""
+    base = api_base()
+    cache_key = ('nodes', base, file_key, node_id, access_token)
+    cached = _structure_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    url = f"{base}/files/{file_key}/nodes"
+    params = {
+        "ids": node_id
+    }
+    
+    try:
+        data = figma_api_get(url, access_token, params=params).json()
+        _structure_cache_put(cache_key, data)
+        return data
+    except requests.exceptions.RequestException as e:
+        log(f"❌ 获取节点信息失败: {e}")
+        if hasattr(e, 'response') and e.response is not None:
+            log(f"响应状态码: {e.response.status_code}")
+            log(f"响应内容: {e.response.text}")
+        return None
+
+
+def get_image_export_url(file_key, node_ids, scale=3, format="png", access_token=None, log=print):
+    """获取图片导出 URL（带重试）"""
+    url = f"{api_base()}/images/{file_key}"
+    params = {
+        "ids": ",".join(node_ids),
+        "format": format,
+        "scale": scale
+    }
+    last_error = None
+    for attempt in range(1, FIGMA_API_RETRIES + 1):
+        try:
+            return figma_api_get(url, access_token, params=params).json()
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            if attempt < FIGMA_API_RETRIES:
+                time.sleep(FIGMA_API_RETRY_DELAY * attempt)
+            else:
+                break
+    log(f"❌ 获取图片导出 URL 失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
+    if hasattr(last_error, 'response') and last_error.response is not None:
+        log(f"   响应状态码: {last_error.response.status_code}")
+        if last_error.response.text:
+            log(f"   响应内容: {last_error.response.text[:300]}")
+    return None
+
+
+def get_image_fill_urls(file_key, access_token, log=print):
+    """
+    一次请求获取文件内所有图片填充原图的下载地址（带重试）
+    
+    返回: {imageRef: url}，失败时返回 None
+    """
+    url = f"{api_base()}/files/{file_key}/images"
+    last_error = None
+    for attempt in range(1, FIGMA_API_RETRIES + 1):
+        try:
+            return figma_api_get(url, access_token).json().get('meta', {}).get('images', {}) or {}
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            if attempt < FIGMA_API_RETRIES:
+                time.sleep(FIGMA_API_RETRY_DELAY * attempt)
+            else:
+                break
+    log(f"❌ 获取图片填充地址失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
+    if hasattr(last_error, 'response') and last_error.response is not None:
+        log(f"   响应状态码: {last_error.response.status_code}")
+        if last_error.response.text:
+            log(f"   响应内容: {last_error.response.text[:300]}")
+    return None
+
+
+def get_project_files(project_id, access_token, log=print):
+    """
+    列出 Figma 项目中的所有文件（带重试）
+    
+    返回: {"name": 项目名, "files": [{"key", "name", ...}, ...]}，失败时返回 None
+    """
+    url = f"{api_base()}/projects/{project_id}/files"
+    last_error = None
+    for attempt in range(1, FIGMA_API_RETRIES + 1):
+        try:
+            return figma_api_get(url, access_token).json()
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            if attempt < FIGMA_API_RETRIES:
+                time.sleep(FIGMA_API_RETRY_DELAY * attempt)
+            else:
+                break
+    log(f"❌ 获取项目文件列表失败（已重试 {FIGMA_API_RETRIES} 次）: {last_error}")
+    if hasattr(last_error, 'response') and last_error.response is not None:
+        log(f"   响应状态码: {last_error.response.status_code}")
+    return None
+
+
+def resolve_render_urls(file_key, node_ids, scale, format, access_token, version=None, render_cache=None,
+                        on_render=None, log=print):
+    """
+    获取节点的渲染 URL：先查渲染 URL 缓存，只对缺失的节点调用 get_image_export_url
+    
+    on_render(实际渲染的节点 id 列表, 耗时秒) 在渲染请求成功后调用，用于调整像素预算
+    返回: {node_id: url}，渲染请求失败时返回 None
+    """
+    if render_cache is None:
+        render_cache = RenderUrlCache(persist=False)
+    urls, missing = render_cache.split_cached(file_key, node_ids, scale, format, version)
+    if urls:
+        log(f"♻️  复用 {len(urls)} 个未过期的渲染地址")
+    if not missing:
+        return urls
+    
+    started = time.monotonic()
+    image_urls = get_image_export_url(
+        file_key,
+        missing,
+        scale=scale,
+        format=format,
+        access_token=access_token,
+        log=log
+    )
+    if not image_urls or 'images' not in image_urls:
+        return None
+    if on_render:
+        on_render(missing, time.monotonic() - started)
+    
+    for node_id in missing:
+        image_url = image_urls['images'].get(node_id)
+        if image_url:
+            render_cache.put(file_key, node_id, scale, format, version, image_url)
+            urls[node_id] = image_url
+    return urls
+
+
+def download_rendered_image(file_key, node_id, image_url, output_path, access_token, scale=3, format='png',
+                            version=None, render_cache=None, optimize=True, api_key=None, progress=None, log=print):
+    """下载已渲染的节点图片；渲染地址过期（403）时作废缓存并重新渲染一次"""
+    if render_cache is None:
+        render_cache = RenderUrlCache(persist=False)
+    try:
+        return download_image(image_url, output_path, optimize=optimize, api_key=api_key, progress=progress, log=log)
+    except RenderUrlExpired:
+        log("   🔄 渲染地址已失效（403），重新渲染...")
+        render_cache.invalidate(file_key, node_id, scale, format, version)
+    
+    urls = resolve_render_urls(file_key, [node_id], scale, format, access_token, version, render_cache, log=log)
+    if not urls or not urls.get(node_id):
+        log(f"❌ 重新渲染失败: {node_id}")
+        return False
+    try:
+        return download_image(urls[node_id], output_path, optimize=optimize, api_key=api_key, progress=progress,
+                              log=log)
+    except RenderUrlExpired:
+        log(f"❌ 新的渲染地址仍被拒绝（403）: {node_id}")
+        return False
+
+
+def fetch_rendered_bytes(file_key, node_id, image_url, access_token, scale=3, format='png', version=None,
+                         render_cache=None, progress=None, log=print):
+    """
+    download_rendered_image 的内存版本（--output-archive 时使用，不落盘）
+    
+    返回: 图片字节；失败时返回 None
+    """
+    if render_cache is None:
+        render_cache = RenderUrlCache(persist=False)
+    for attempt in (1, 2):
+        try:
+            log(f"📥 正在下载: {image_url}")
+            return download_bytes(
+                image_url,
+                retries=FIGMA_API_RETRIES,
+                retry_delay=FIGMA_API_RETRY_DELAY,
+                on_progress=progress.on_bytes if progress else None,
+                log=log
+            )
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 403:
+                log(f"❌ 下载失败 {node_id}: {e}")
+                return None
+            if attempt == 2:
+                log(f"❌ 新的渲染地址仍被拒绝（403）: {node_id}")
+                return None
+            log("   🔄 渲染地址已失效（403），重新渲染...")
+            render_cache.invalidate(file_key, node_id, scale, format, version)
+            urls = resolve_render_urls(file_key, [node_id], scale, format, access_token, version, render_cache, log=log)
+            if not urls or not urls.get(node_id):
+                log(f"❌ 重新渲染失败: {node_id}")
+                return None
+            image_url = urls[node_id]
+        except requests.exceptions.RequestException as e:
+            log(f"❌ 下载失败 {node_id}: {e}")
+            return None
+        except OSError as e:
+            log(f"❌ 下载失败 {node_id}: {e}")
+            return None
+    return None
+
+
+def compress_in_place(path, api_key, log=print):
+    """对已写入的文件做 TinyPNG 压缩（额度用完时为本地压缩；先移到 .tmp，再压缩写回原路径）"""
+    temp_path = path.with_suffix('.tmp')
+    shutil.move(path, temp_path)
+    optimize_image_with_tinypng(temp_path, path, api_key, log)
+    temp_path.unlink(missing_ok=True)
+
+
+def generate_output_filename(node_id, scale=3, format='png', output_dir=None):
+    """根据 node-id 生成输出文件名（scale 为 None 时不带 @倍数，用于多倍率变体目录）"""
+    # 将 node_id 中的 : 替换为 _，作为文件名
+    safe_node_id = node_id.replace(':', '_')
+    filename = f"{safe_node_id}@{scale}x.{format}" if scale is not None else f"{safe_node_id}.{format}"
+    
+    if output_dir:
+        return Path(output_dir) / filename
+    else:
+        return Path(filename)
+
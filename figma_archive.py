@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+归档输出（--output-archive out.zip / out.tar / out.tar.gz）
+下载（及压缩）后的图片字节直接写进归档，成员路径与目录输出时的相对路径一致，
+不在磁盘上生成中间目录树。写入加锁，多个下载线程可共用同一个归档。
+归档先写到 <目标>.part，成功关闭时才原子改名；导出中断或失败时 abort() 删掉 .part，
+上一次的完整归档保持不动，也不会留下半个 zip 冒充完整产物。
+"""
+
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+# 已经是压缩格式的图片不再 deflate，省 CPU
+STORED_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif")
+
+
+def archive_kind(path: Path) -> str | None:
+    """按文件名判断归档类型：'zip'、'tar'、'tar.gz'，不支持时返回 None。"""
+    name = Path(path).name.lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith((".tar.gz", ".tgz")):
+        return "tar.gz"
+    if name.endswith(".tar"):
+        return "tar"
+    return None
+
+
+class ArchiveSink:
+    """
+    线程安全的归档写入器。
+
+        with ArchiveSink("out.zip") as archive:
+            archive.write("Page/Frame_1_2.png", data)
+
+    with 块内抛出异常时自动 abort()，正常结束时 close()。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.kind = archive_kind(self.path)
+        if self.kind is None:
+            raise ValueError(f"不支持的归档格式: {self.path.name}（支持 .zip / .tar / .tar.gz）")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._part = self.path.with_name(self.path.name + ".part")
+        self._lock = threading.Lock()
+        self._names: set[str] = set()
+        self.files = 0
+        self.bytes = 0
+        if self.kind == "zip":
+            self._zip = zipfile.ZipFile(self._part, "w", allowZip64=True)
+            self._tar = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(self._part, "w:gz" if self.kind == "tar.gz" else "w")
+
+    def write(self, name: str, data: bytes) -> bool:
+        """写入一个成员；同名成员已存在时跳过并返回 False（归档不能覆盖已写入的成员）。"""
+        name = name.replace(os.sep, "/").lstrip("/")
+        with self._lock:
+            if self._zip is None and self._tar is None:
+                return False
+            if name in self._names:
+                print(f"   ⚠️  归档中已有同名文件，跳过: {name}")
+                return False
+            self._names.add(name)
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = (
+                    zipfile.ZIP_STORED if name.lower().endswith(STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+                )
+                info.external_attr = 0o644 << 16
+                self._zip.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                info.mode = 0o644
+                self._tar.addfile(info, io.BytesIO(data))
+            self.files += 1
+            self.bytes += len(data)
+        return True
+
+    def _close_writer(self) -> bool:
+        """关闭底层写入器；已经关闭过时返回 False。"""
+        with self._lock:
+            writer = self._zip or self._tar
+            self._zip = self._tar = None
+        if writer is None:
+            return False
+        writer.close()
+        return True
+
+    def close(self) -> None:
+        """写完归档：关闭写入器并把 .part 原子改名为目标文件。"""
+        if not self._close_writer():
+            return
+        os.replace(self._part, self.path)
+        print(f"📦 已写入归档 {self.path}：{self.files} 个文件，{self.bytes / 1024 / 1024:.2f} MB")
+
+    def abort(self) -> None:
+        """放弃归档：关闭写入器并删除 .part，已有的目标文件不受影响。"""
+        try:
+            if not self._close_writer():
+                return
+        except (OSError, tarfile.TarError, zipfile.BadZipFile):
+            pass
+        try:
+            self._part.unlink()
+        except FileNotFoundError:
+            pass
+        print(f"⚠️  导出未完成，放弃归档 {self.path}（保留原有文件）")
+
+    def __enter__(self) -> "ArchiveSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if exc[0] is not None:
+            self.abort()
+        else:
+            self.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+按像素预算组批
+/v1/images 的耗时和失败率取决于一次要渲染多少像素，而不是多少个节点：
+两张 10000px 高的画板按 4x 渲染会超时或 500，五十个小图标却毫无压力。
+每个节点的像素数按 absoluteBoundingBox 面积 × 倍率² 估算，凑满预算就发一次请求；
+超出预算的大节点一开始就单独请求。预算根据实际渲染耗时自动调整。
+"""
+
+from collections import deque
+
+# 每次渲染请求的默认像素预算（百万像素）
+DEFAULT_PIXEL_BUDGET_MP = 50
+# 预算自动调整的范围与目标耗时
+MIN_PIXEL_BUDGET = 4_000_000
+MAX_PIXEL_BUDGET = 400_000_000
+TARGET_RENDER_SEC = 30.0
+# 没有包围盒的节点按 1024×1024（1x）估算
+UNKNOWN_NODE_PIXELS = 1024 * 1024
+# 一个节点随批次失败重试的次数上限，超过后改为单独请求（单独请求失败即放弃）
+MAX_BATCH_RETRIES = 3
+
+
+def estimate_pixels(bbox: dict | None, scale: float) -> int:
+    """渲染像素数估算：包围盒面积 × 倍率²。"""
+    if bbox and bbox.get("width") and bbox.get("height"):
+        area = float(bbox["width"]) * float(bbox["height"])
+    else:
+        area = UNKNOWN_NODE_PIXELS
+    return max(1, int(area * scale * scale))
+
+
+class PixelBudget:
+    """
+    每次渲染请求的像素预算，按观测到的渲染耗时调整：
+    - 耗时超过目标：按 目标/耗时 的比例缩小
+    - 接近满额的请求耗时不到目标一半：放大 1.5 倍
+    - 请求失败（超时/500）：减半，已到下限时不再缩小
+    """
+
+    def __init__(self, pixels: int | None = None, target_sec: float = TARGET_RENDER_SEC):
+        self.pixels = int(pixels or DEFAULT_PIXEL_BUDGET_MP * 1_000_000)
+        self.target_sec = target_sec
+        # 手动设得比下限还小时，以手动值为下限
+        self.min_pixels = min(MIN_PIXEL_BUDGET, self.pixels)
+
+    def _clamp(self, value: float) -> None:
+        self.pixels = int(min(MAX_PIXEL_BUDGET, max(self.min_pixels, value)))
+
+    def observe(self, pixels: int, seconds: float) -> None:
+        if pixels <= 0 or seconds <= 0:
+            return
+        if seconds > self.target_sec:
+            self._clamp(min(self.pixels, pixels) * self.target_sec / seconds)
+        elif seconds < self.target_sec / 2 and pixels >= self.pixels / 2:
+            self._clamp(self.pixels * 1.5)
+
+    def on_failure(self, pixels: int) -> bool:
+        """请求失败时缩小预算，返回预算是否确实变小（已到下限时为 False）。"""
+        before = self.pixels
+        self._clamp(min(self.pixels, pixels) / 2)
+        return self.pixels < before
+
+
+class BatchPlanner:
+    """
+    按预算逐批取出节点 id。每次 next_batch() 都使用当前预算，所以调整立即生效。
+
+        planner = BatchPlanner(ids, pixels, budget, max_nodes=50)
+        while planner:
+            batch = planner.next_batch()
+            start = time.monotonic()
+            ...请求 /v1/images...
+            budget.observe(planner.cost(batch), time.monotonic() - start)
+            # 失败时：planner.retry(batch, shrunk=budget.on_failure(planner.cost(batch)))
+    """
+
+    def __init__(self, node_ids: list[str], pixels: dict[str, int], budget: PixelBudget, max_nodes: int = 50):
+        self.pixels = pixels
+        self.budget = budget
+        self.max_nodes = max(1, max_nodes)
+        oversized = [nid for nid in node_ids if pixels.get(nid, 0) > budget.pixels]
+        self.oversized = len(oversized)
+        rest = [nid for nid in node_ids if pixels.get(nid, 0) <= budget.pixels]
+        self._queue = deque(oversized + rest)
+        self.requests = 0
+        # 每个节点随批次失败的次数；_solo 中的节点之后只单独请求
+        self.failures: dict[str, int] = {}
+        self._solo: set[str] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self._queue)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def cost(self, batch: list[str]) -> int:
+        return sum(self.pixels.get(nid, 0) for nid in batch)
+
+    def next_batch(self) -> list[str]:
+        batch = [self._queue.popleft()]
+        total = self.pixels.get(batch[0], 0)
+        while (self._queue and len(batch) < self.max_nodes
+               and batch[0] not in self._solo and self._queue[0] not in self._solo):
+            nxt = self.pixels.get(self._queue[0], 0)
+            if total + nxt > self.budget.pixels:
+                break
+            batch.append(self._queue.popleft())
+            total += nxt
+        self.requests += 1
+        return batch
+
+    def retry(self, batch: list[str], shrunk: bool = True) -> None:
+        """
+        把失败的批次放回队首，下次按（已缩小的）预算重新拆分。
+
+        预算已无法再缩小（shrunk=False），或节点随批次失败已达 MAX_BATCH_RETRIES 次时，
+        这些节点改为逐个单独请求：始终失败的小节点不会被反复打包进同一批次，
+        单独请求仍失败时由调用方记为失败并跳过。
+        """
+        for nid in batch:
+            self.failures[nid] = self.failures.get(nid, 0) + 1
+            if not shrunk or self.failures[nid] >= MAX_BATCH_RETRIES:
+                self._solo.add(nid)
+        self._queue.extendleft(reversed(batch))
+
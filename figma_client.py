@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+可导入的 Python API
+构建工具可以直接在进程内调用，不必启动子进程再解析命令行输出：
+
+    from figma_client import FigmaClient, NodeRef
+
+    client = FigmaClient.from_env()
+    refs = [NodeRef.from_url(url) for url in urls]
+    for result in client.export(refs, output_dir="assets", scale=2):
+        if result.ok:
+            print(result.path, result.size, result.render_sec, result.download_sec)
+        else:
+            print(result.ref.node_id, result.error)
+
+- export() 是生成器，每张图片完成时立即产出一个 ExportResult（路径、字节数、耗时、状态）
+- 节点没有指定输出路径、也没有 output_dir 时不落盘，图片字节放在 ExportResult.data 里
+- 内部沿用命令行的全部流程：按像素预算组批渲染、大任务优先、渲染 URL 缓存、
+  断点续传下载、多倍率本地缩放、TinyPNG 压缩
+- 配置或接口错误抛出 FigmaError；单张图片失败不抛异常，体现在结果的 status/error 上
+- 默认不打印任何进度；传入 log=print（或 logging.getLogger(...).info）即可看到与命令行相同的输出
+
+接口请求与下载在 figma_api 中，命令行 download_figma_image.py 的 main() 只是这里的一层参数解析与输出。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import figma_api as api
+from figma_batching import DEFAULT_PIXEL_BUDGET_MP, BatchPlanner, PixelBudget, estimate_pixels
+from figma_http import TokenPool
+from figma_render_cache import RenderUrlCache
+from figma_scales import RASTER_FORMATS, VariantDeriver, master_path, variant_path
+from figma_schedule import TimingHistory, largest_first, node_costs, plan_export
+from figma_selection import NodeIndex
+
+# 同一批渲染结果的默认并发下载数：批内按代价从大到小提交，最大的图最先开始下载，小图在其余线程里同时完成
+DOWNLOAD_WORKERS = 4
+# Figma /v1/images 单次最多 50 个节点
+MAX_NODES_PER_RENDER = 50
+
+
+def _quiet(*args, **kwargs) -> None:
+    """默认的 log：作为库使用时不输出。"""
+
+
+class FigmaError(RuntimeError):
+    """配置缺失或 Figma 接口请求失败。"""
+
+
+@dataclass
+class NodeRef:
+    """
+    要导出的节点。
+
+    output: 输出路径（多倍率时为不带倍率的基础路径，变体按 2.0x/ 3.0x/ 目录生成）；
+            为 None 时按 export() 的 output_dir 以 node-id 命名，两者都没有则只返回字节
+    bbox:   absoluteBoundingBox，用于估算渲染像素；缺失时 export() 会向接口查询
+    """
+    file_key: str
+    node_id: str
+    name: str = ""
+    page: str = ""
+    output: Path | None = None
+    bbox: dict | None = None
+
+    @classmethod
+    def from_url(cls, url: str, output: Path | str | None = None) -> "NodeRef":
+        file_key, node_id = api.parse_figma_url(url, log=_quiet)
+        if not file_key or not node_id:
+            raise ValueError(f"无法从 URL 中解析 file-key / node-id: {url}")
+        return cls(file_key, node_id, output=Path(output) if output else None)
+
+
+@dataclass
+class ExportResult:
+    """
+    单个节点、单个倍率的导出结果。
+
+    status: "ok" 或 "failed"（失败原因见 error）
+    path:   写入的文件；不落盘时为 None，字节在 data 中
+    size:   输出字节数（压缩后）
+    """
+    ref: NodeRef
+    scale: float
+    status: str
+    path: Path | None = None
+    data: bytes | None = None
+    size: int = 0
+    render_sec: float = 0.0
+    download_sec: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+class FigmaClient:
+    """
+    封装令牌与配置的 Figma 导出客户端。
+
+    token:        Figma Access Token，或多个令牌组成的 figma_http.TokenPool
+    tinypng_key:  TinyPNG API key，None 时不压缩
+    render_cache: 渲染 URL 缓存，默认使用进程内共享的持久化缓存
+    history:      节点耗时记录（大任务优先调度用），默认持久化到缓存目录
+    download_workers: 同一批渲染结果的并发下载数
+    file_workers: 多个文件时同时推进的文件数（所有文件的 API 请求共用 figma_http.api_limiter 限速）
+    log:          进度与告警输出，默认不输出；命令行传入 print
+    """
+
+    def __init__(self, token: str | TokenPool, tinypng_key: str | None = None, render_cache: RenderUrlCache | None = None,
+                 pixel_budget_mp: float = DEFAULT_PIXEL_BUDGET_MP, history: TimingHistory | None = None,
+                 download_workers: int = DOWNLOAD_WORKERS, file_workers: int = api.FILE_WORKERS, log=None):
+        if not token:
+            raise FigmaError("需要提供 Figma Access Token")
+        self.token = token
+        self.tinypng_key = tinypng_key
+        self.render_cache = render_cache if render_cache is not None else RenderUrlCache.shared()
+        self.pixel_budget = int(pixel_budget_mp * 1_000_000)
+        self.history = history if history is not None else TimingHistory()
+        self.download_workers = max(1, download_workers)
+        self.file_workers = max(1, file_workers)
+        self.log = log or _quiet
+        self._versions: dict[str, tuple[float, str | None]] = {}
+
+    @classmethod
+    def from_env(cls, env_file: Path | str | None = None, **kwargs) -> "FigmaClient":
+        """
+        按命令行相同的优先级读取配置：env_file > 当前目录 .env > 环境变量。
+        令牌与 TinyPNG key 的解析与命令行一致：FIGMA_ACCESS_TOKENS / TINYPNG_API_KEYS 优先，多个时组成池。
+        """
+        env_file = Path(env_file) if env_file else None
+        return cls(
+            api.resolve_figma_token(env_file),
+            api.resolve_tinypng_key(env_file),
+            **kwargs,
+        )
+
+    # ------------------------------------------------------------------
+    # 文件与节点
+    # ------------------------------------------------------------------
+
+    def file(self, file_key: str, fresh: bool = False) -> dict:
+        """获取文件结构（进程内缓存 FIGMAD_STRUCTURE_TTL 秒，fresh=True 时重新获取）。"""
+        data = api.get_file_structure(file_key, self.token, fresh=fresh, log=self.log)
+        if not data:
+            raise FigmaError(f"获取文件结构失败: {file_key}")
+        if not data.get('document'):
+            raise FigmaError(f"文件结构中没有 document 节点: {file_key}")
+        self._versions[file_key] = (time.monotonic(), data.get('version'))
+        return data
+
+    def files(self, file_keys: Iterable[str]) -> tuple[dict[str, dict], dict[str, FigmaError]]:
+        """并发获取多个文件的结构，返回 ({file_key: 文件结构}, {file_key: 错误})。"""
+        file_keys = list(dict.fromkeys(file_keys))
+        structures, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.file_workers, len(file_keys)))) as pool:
+            futures = {pool.submit(self.file, key): key for key in file_keys}
+            for future in as_completed(futures):
+                try:
+                    structures[futures[future]] = future.result()
+                except FigmaError as e:
+                    errors[futures[future]] = e
+        return structures, errors
+
+    def version(self, file_key: str) -> str | None:
+        """只查询文件当前版本号（depth=1 的轻量请求，不经过缓存）；失败时返回 None。"""
+        return api.get_file_version(file_key, self.token, log=self.log)
+
+    def project_files(self, project_id: str) -> list[dict]:
+        """项目中的文件列表 [{"key", "name", ...}]。"""
+        data = api.get_project_files(project_id, self.token, log=self.log)
+        if data is None:
+            raise FigmaError(f"获取项目文件列表失败: {project_id}")
+        return list(data.get('files') or [])
+
+    def _version(self, file_key: str) -> str | None:
+        """最近一次获取到的文件版本（渲染 URL 缓存的键之一）。"""
+        entry = self._versions.get(file_key)
+        return entry[1] if entry else None
+
+    def _version_known(self, file_key: str) -> bool:
+        """版本号与文件结构缓存同样只在 FIGMAD_STRUCTURE_TTL 内有效，长期存活的客户端也能看到新版本。"""
+        entry = self._versions.get(file_key)
+        return bool(entry) and time.monotonic() - entry[0] < api.structure_cache_ttl()
+
+    def select(self, file_key: str, **selection) -> list[NodeRef]:
+        """按 NodeIndex.select 的条件（page_pattern/names/types/max_depth/...）挑选节点。"""
+        index = NodeIndex(self.file(file_key)['document'])
+        return [
+            NodeRef(file_key, entry['id'], entry['name'], entry['page'], bbox=entry['bbox'])
+            for entry in index.select(**selection)
+        ]
+
+    def _prepare(self, file_key: str, refs: list[NodeRef]) -> dict[str, str]:
+        """
+        补全版本号与包围盒：文件版本未知或有节点缺少包围盒时，一次 /nodes 请求查询全部节点。
+        返回 {node_id: 错误信息}，列出接口中不存在的节点。
+        """
+        lacking = list(dict.fromkeys(ref.node_id for ref in refs if ref.bbox is None))
+        if self._version_known(file_key) and not lacking:
+            return {}
+        ids = lacking or [refs[0].node_id]
+        info = api.get_file_node_info(file_key, ",".join(ids), self.token, log=self.log)
+        if not info:
+            raise FigmaError(f"获取节点信息失败: {file_key}")
+        if not self._version_known(file_key):
+            self._versions[file_key] = (time.monotonic(), info.get('version'))
+        nodes = info.get('nodes') or {}
+        missing = {}
+        for ref in refs:
+            if ref.bbox is not None:
+                continue
+            node = (nodes.get(ref.node_id) or {}).get('document')
+            if node is None:
+                missing[ref.node_id] = f"节点不存在或无权访问: {ref.node_id}"
+                continue
+            ref.bbox = node.get('absoluteBoundingBox') or {}
+            ref.name = ref.name or node.get('name', "")
+        return missing
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+
+    def plan(self, refs: Iterable[NodeRef], scale: float = 3, format: str = "png",
+             scales: list[float] | None = None, native_scales: bool = False) -> dict:
+        """
+        不渲染、不下载，只估算导出计划（--dry-run）。
+        返回 {倍率: figma_schedule.plan_export 结果}，可交给 figma_schedule.print_plan 打印。
+        """
+        refs = list(refs)
+        render_scales = _render_scales(scale, scales, native_scales)
+        plans = {}
+        for file_key, group in _by_file(refs).items():
+            missing = self._prepare(file_key, group)
+            ids = list(dict.fromkeys(ref.node_id for ref in group if ref.node_id not in missing))
+            bboxes = {ref.node_id: ref.bbox for ref in group}
+            for render_scale in render_scales:
+                pixels = {nid: estimate_pixels(bboxes[nid], render_scale) for nid in ids}
+                costs = node_costs(self.history, file_key, ids, pixels, render_scale, format)
+                cached, _ = self.render_cache.split_cached(file_key, ids, render_scale, format,
+                                                           self._version(file_key))
+                plan = plan_export(ids, pixels, costs, self.pixel_budget, MAX_NODES_PER_RENDER, cached=set(cached))
+                if render_scale in plans:
+                    merged = plans[render_scale]
+                    for key in ("render_calls", "nodes", "cached", "known", "bytes", "render_sec", "download_sec"):
+                        merged[key] += plan[key]
+                    merged["largest"] = (merged["largest"] + plan["largest"])[:5]
+                else:
+                    plans[render_scale] = plan
+        return plans
+
+    def export(self, refs: Iterable[NodeRef], output_dir: Path | str | None = None, scale: float = 3,
+               format: str = "png", scales: list[float] | None = None, native_scales: bool = False,
+               compress: bool = True, progress=None) -> Iterator[ExportResult]:
+        """
+        导出节点，每完成一张图片产出一个 ExportResult。
+
+        scales:        多倍率（如 [1, 2, 3]）；默认只按最高倍率渲染一次，其余倍率本地缩放
+        native_scales: 多倍率时每个倍率都由 Figma 原生渲染
+        compress:      有 tinypng_key 时是否压缩（只对 png / jpg；矢量格式不上传 TinyPNG）
+        progress:      figma_progress.TransferProgress，可选
+        """
+        refs = list(refs)
+        render_scales = _render_scales(scale, scales, native_scales)
+        derive_locally = bool(scales) and not native_scales
+        api_key = self.tinypng_key if compress and format in RASTER_FORMATS else None
+        if progress:
+            progress.add_items(len(refs) * len(render_scales))
+
+        with VariantDeriver() if derive_locally else nullcontext() as deriver:
+            jobs = []
+            for file_key, group in _by_file(refs).items():
+                missing = self._prepare(file_key, group)
+                for ref in group:
+                    if ref.node_id in missing:
+                        for render_scale in render_scales:
+                            if progress:
+                                progress.item_done(False)
+                            yield ExportResult(ref, render_scale, "failed", error=missing[ref.node_id])
+                group = [ref for ref in group if ref.node_id not in missing]
+                jobs.append(partial(self._export_file, file_key, group, output_dir, scale, format, scales,
+                                    render_scales, derive_locally, api_key, deriver, progress))
+            yield from self._run_files(jobs)
+
+    def _run_files(self, jobs):
+        """
+        逐个或并发推进各文件的导出生成器，结果按完成顺序产出。
+        并发时每个文件在自己的线程里渲染、下载，API 请求由共享限速器统一节流。
+        """
+        if self.file_workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                yield from job()
+            return
+        results = queue.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def drain(job):
+            try:
+                for result in job():
+                    results.put(result)
+                    if stop.is_set():
+                        return
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(done)
+
+        with ThreadPoolExecutor(max_workers=min(self.file_workers, len(jobs))) as pool:
+            for job in jobs:
+                pool.submit(drain, job)
+            remaining = len(jobs)
+            try:
+                while remaining:
+                    item = results.get()
+                    if item is done:
+                        remaining -= 1
+                    elif isinstance(item, BaseException):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stop.set()
+
+    def _export_file(self, file_key, refs, output_dir, scale, format, scales, render_scales, derive_locally,
+                     api_key, deriver, progress):
+        version = self._version(file_key)
+        # 本文件已提交本地缩放、尚未产出的节点；每批下载后产出已完成的，文件结束时等待其余的
+        pending = []
+        by_node: dict[str, list[NodeRef]] = {}
+        for ref in refs:
+            by_node.setdefault(ref.node_id, []).append(ref)
+        top_scale = max(render_scales)
+        pixels = {nid: estimate_pixels(group[0].bbox, top_scale) for nid, group in by_node.items()}
+        budget = PixelBudget(self.pixel_budget)
+        costs = node_costs(self.history, file_key, list(by_node), pixels, top_scale, format)
+        planner = BatchPlanner(largest_first(list(by_node), costs), pixels, budget, max_nodes=MAX_NODES_PER_RENDER)
+        if planner.oversized:
+            self.log(f"📏 {planner.oversized} 个节点超过 {budget.pixels / 1e6:g} MP 预算，单独请求渲染")
+        render_times: dict[tuple, float] = {}
+
+        def record_render(ids, seconds, render_scale, ratio):
+            cost = planner.cost(ids)
+            budget.observe(int(cost * ratio), seconds)
+            for nid in ids:
+                share = seconds * pixels[nid] / cost
+                render_times[(nid, render_scale)] = share
+                self.history.record(file_key, nid, render_scale, format, int(pixels[nid] * ratio), render_sec=share)
+
+        pool_context = ThreadPoolExecutor(max_workers=self.download_workers) if self.download_workers > 1 \
+            else nullcontext()
+        with pool_context as pool:
+            while planner:
+                node_ids = planner.next_batch()
+                for render_scale in render_scales:
+                    ratio = (render_scale / top_scale) ** 2
+                    image_urls = api.resolve_render_urls(
+                        file_key, node_ids, render_scale, format, self.token, version, self.render_cache,
+                        on_render=lambda ids, sec: record_render(ids, sec, render_scale, ratio), log=self.log
+                    )
+                    if image_urls is None and len(node_ids) > 1 and render_scale == render_scales[0]:
+                        shrunk = budget.on_failure(planner.cost(node_ids))
+                        if shrunk:
+                            self.log(f"⚠️  批次渲染失败，像素预算降至 {budget.pixels / 1e6:g} MP，拆分后重试")
+                        else:
+                            self.log(f"⚠️  批次渲染失败，像素预算已到下限 {budget.pixels / 1e6:g} MP，改为逐个节点重试")
+                        planner.retry(node_ids, shrunk=shrunk)
+                        break
+
+                    tasks = []
+                    for nid in node_ids:
+                        image_url = (image_urls or {}).get(nid)
+                        for ref in by_node[nid]:
+                            if not image_url:
+                                if progress:
+                                    progress.item_done(False)
+                                error = "获取导出 URL 失败" if image_urls is None else "无导出 URL"
+                                yield ExportResult(ref, render_scale, "failed", error=error)
+                                continue
+                            base = _base_path(ref, output_dir, scale, format, scales)
+                            tasks.append((ref, base, (file_key, ref, image_url, render_scale, format, version,
+                                                      base, scales, derive_locally, api_key, progress)))
+
+                    for ref, base, (result, master) in self._run_downloads(pool, tasks):
+                        result.render_sec = render_times.get((ref.node_id, render_scale), 0.0)
+                        if progress:
+                            progress.item_done(result.ok)
+                        if result.ok:
+                            self.history.record(file_key, ref.node_id, render_scale, format,
+                                                int(pixels[ref.node_id] * ratio),
+                                                download_sec=result.download_sec, size=result.size)
+                        if result.ok and derive_locally:
+                            job = (deriver.submit_bytes(result.data, render_scale, scales, format) if base is None
+                                   else deriver.submit(master, render_scale, base, scales, format))
+                            pending.append((job, ref, master, base, result.render_sec, result.download_sec))
+                        else:
+                            yield result
+                        yield from self._drain_variants(pending, scales, format, api_key, wait=False)
+                    self.render_cache.save()
+                    self.history.save()
+            yield from self._drain_variants(pending, scales, format, api_key, wait=True)
+
+    def _run_downloads(self, pool, tasks):
+        """按完成顺序产出 (ref, base, _download 的返回值)；没有线程池时逐个下载。"""
+        if pool is None:
+            for ref, base, args in tasks:
+                yield ref, base, self._download(*args)
+            return
+        futures = {pool.submit(self._download, *args): (ref, base) for ref, base, args in tasks}
+        for future in as_completed(futures):
+            yield (*futures[future], future.result())
+
+    def _download(self, file_key, ref, image_url, render_scale, format, version, base, scales, derive_locally,
+                  api_key, progress):
+        """下载一个节点的一个倍率，返回 (ExportResult, 本地缩放用的原图路径)。"""
+        started = time.monotonic()
+        if base is None:
+            data = api.fetch_rendered_bytes(file_key, ref.node_id, image_url, self.token, render_scale, format,
+                                            version, self.render_cache, progress, log=self.log)
+            if data is None:
+                return ExportResult(ref, render_scale, "failed", error="下载失败"), None
+            download_sec = time.monotonic() - started
+            if api_key and not derive_locally:
+                data = api.tinypng_compress_bytes(data, api_key, self.log) or data
+            return ExportResult(ref, render_scale, "ok", data=data, size=len(data), download_sec=download_sec), None
+
+        if derive_locally:
+            output_path = master_path(base)
+        elif scales:
+            output_path = variant_path(base, render_scale)
+        else:
+            output_path = base
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        ok = api.download_rendered_image(
+            file_key, ref.node_id, image_url, output_path, self.token, scale=render_scale, format=format,
+            version=version, render_cache=self.render_cache, optimize=bool(api_key) and not derive_locally,
+            api_key=api_key, progress=progress, log=self.log
+        )
+        download_sec = time.monotonic() - started
+        if not ok or not output_path.exists():
+            return ExportResult(ref, render_scale, "failed", error="下载失败", download_sec=download_sec), None
+        result = ExportResult(ref, render_scale, "ok", path=output_path, size=output_path.stat().st_size,
+                              download_sec=download_sec)
+        return result, output_path
+
+    def _drain_variants(self, pending, scales, format, api_key, wait):
+        """产出 pending 中缩放已完成的节点（wait=True 时按完成顺序等待全部完成），并从 pending 中移除。"""
+        if wait:
+            by_future = {item[0]: item for item in pending}
+            pending.clear()
+            for future in as_completed(by_future):
+                yield from self._finish_variants(*by_future[future], scales, format, api_key)
+            return
+        finished = [item for item in pending if item[0].done()]
+        for item in finished:
+            pending.remove(item)
+            yield from self._finish_variants(*item, scales, format, api_key)
+
+    def _finish_variants(self, future, ref, master, base, render_sec, download_sec, scales, format, api_key):
+        """等待一个节点的多倍率缩放完成，按需压缩，产出每个倍率的结果。"""
+        try:
+            variants = future.result()
+        except Exception as e:
+            for variant_scale in scales:
+                yield ExportResult(ref, variant_scale, "failed", error=f"生成多倍率变体失败: {e}")
+            return
+        finally:
+            if master is not None:
+                master.unlink(missing_ok=True)
+        if base is None:
+            for variant_scale, blob in variants.items():
+                if api_key:
+                    blob = api.tinypng_compress_bytes(blob, api_key, self.log) or blob
+                yield ExportResult(ref, variant_scale, "ok", data=blob, size=len(blob),
+                                   render_sec=render_sec, download_sec=download_sec)
+            return
+        for variant_scale, variant in zip(scales, variants):
+            path = Path(variant)
+            if api_key:
+                api.compress_in_place(path, api_key, self.log)
+            yield ExportResult(ref, variant_scale, "ok", path=path, size=path.stat().st_size,
+                               render_sec=render_sec, download_sec=download_sec)
+
+
+def _render_scales(scale, scales, native_scales) -> list[float]:
+    if scales:
+        return list(scales) if native_scales else [max(scales)]
+    return [scale]
+
+
+def _by_file(refs: list[NodeRef]) -> dict[str, list[NodeRef]]:
+    groups: dict[str, list[NodeRef]] = {}
+    for ref in refs:
+        groups.setdefault(ref.file_key, []).append(ref)
+    return groups
+
+
+def _base_path(ref: NodeRef, output_dir, scale, format, scales) -> Path | None:
+    """节点的输出路径（多倍率时为基础路径）；无处可写时返回 None（只返回字节）。"""
+    if ref.output:
+        return Path(ref.output)
+    if output_dir is None:
+        return None
+    return api.generate_output_filename(ref.node_id, None if scales else scale, format, output_dir)
+
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+TinyPNG key 池与本地压缩回退
+TinyPNG 免费 key 每月 500 次（付费 key 不限）；额度用完后每张图仍要白跑一次请求，最后原图落盘。
+TinyPngKeyPool 记录每个 key 响应头里的 Compression-Count（本月已用次数），优先使用用量最少的 key；
+客户端默认不设上限，key 只在 TinyPNG 返回 429 时才标记为用完，之后不再请求；
+用量与用完标记按月持久化到缓存目录，下次运行也不会再去试已经用完的 key。
+所有 key 都用完后自动改用本地压缩：Pillow 调色板量化 + pyoxipng 无损优化。
+
+    compress_bytes(data, "key1,key2")   # 压缩后的字节；失败或无法压缩时返回 None
+"""
+
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from figma_http import http_session, mask_token
+from figma_render_cache import default_cache_dir
+
+TINYPNG_API_URL = "https://api.tinify.com/shrink"
+TINYPNG_TIMEOUT = 30
+# 可选：在客户端按 Compression-Count 限制每个 key 每月的压缩次数（默认 0 表示不限，以 TinyPNG 的 429 为准）
+MONTHLY_LIMIT_ENV = "TINYPNG_MONTHLY_LIMIT"
+DEFAULT_MONTHLY_LIMIT = 0
+USAGE_FILE = "tinypng_usage.json"
+
+# 本地压缩参数
+LOCAL_PNG_COLORS = 256
+LOCAL_JPEG_QUALITY = 85
+OXIPNG_LEVEL = 4
+
+
+def _env_monthly_limit() -> int:
+    try:
+        return int(os.environ.get(MONTHLY_LIMIT_ENV) or DEFAULT_MONTHLY_LIMIT)
+    except ValueError:
+        return DEFAULT_MONTHLY_LIMIT
+
+
+def _current_month() -> str:
+    return time.strftime("%Y-%m", time.gmtime())
+
+
+def _key_id(key: str) -> str:
+    """持久化时只记录 key 的哈希，不把 key 明文写进缓存目录。"""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _compression_count(response) -> int | None:
+    try:
+        return int(response.headers.get("Compression-Count", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+class TinyPngKeyPool:
+    """
+    多个 TinyPNG key 按剩余额度分配（线程安全）。
+
+    - 每次选 剩余额度 − 进行中请求数 最多的 key（不限额时选用量最少的）；已用完的 key 直接跳过，不发请求
+    - 响应头 Compression-Count 更新该 key 的本月用量；返回 429（额度用完）的 key 标记为用完
+    - 设置了 monthly_limit（TINYPNG_MONTHLY_LIMIT）时，用量达到上限的 key 也视为用完
+    - 返回 401 的 key 移出本次运行
+    - 用量按自然月（UTC）记录在 <缓存目录>/tinypng_usage.json，月份变化时清零
+    """
+
+    def __init__(self, keys, monthly_limit: int | None = None, path: Path | None = None, persist: bool = True):
+        self.keys = list(dict.fromkeys(k.strip() for k in keys if k and k.strip()))
+        if not self.keys:
+            raise ValueError("TinyPNG key 池为空")
+        self._key = tuple(self.keys)
+        self.monthly_limit = _env_monthly_limit() if monthly_limit is None else max(0, monthly_limit)
+        self.path = Path(path) if path else default_cache_dir() / USAGE_FILE
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._month = _current_month()
+        self._counts: dict[str, int] = {}
+        self._exhausted: set[str] = set()
+        self._inflight: dict[str, int] = {}
+        self.invalid: list[str] = []
+        self.fallback_announced = False
+        if persist:
+            self._load()
+
+    @classmethod
+    def parse(cls, text: str) -> "TinyPngKeyPool":
+        """逗号、空白或换行分隔的 key 列表。"""
+        return cls(text.replace(",", " ").split())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TinyPngKeyPool) and other._key == self._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        return f"TinyPngKeyPool({', '.join(mask_token(k) for k in self._key)})"
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("month") != self._month:
+            return
+        usage = data.get("keys") or {}
+        for key in self.keys:
+            entry = usage.get(_key_id(key))
+            if not isinstance(entry, dict):
+                continue
+            if isinstance(entry.get("count"), int):
+                self._counts[key] = entry["count"]
+            if entry.get("exhausted"):
+                self._exhausted.add(key)
+
+    def _save(self) -> None:
+        """与已有记录合并后原子写回（其他 key 池的记录保留）；失败只打印警告。"""
+        if not self.persist:
+            return
+        with self._lock:
+            usage = {
+                _key_id(k): {"count": self._counts.get(k, 0), "exhausted": k in self._exhausted}
+                for k in self._key if k in self._counts or k in self._exhausted
+            }
+            month = self._month
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        merged = (data.get("keys") or {}) if data.get("month") == month else {}
+        merged.update(usage)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps({"month": month, "keys": merged}), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️  TinyPNG 用量记录写入失败 {self.path}: {e}")
+
+    def _roll_month(self) -> None:
+        month = _current_month()
+        if month != self._month:
+            self._month = month
+            self._counts.clear()
+            self._exhausted.clear()
+
+    def headroom(self, key: str) -> float:
+        """key 本月剩余次数（不限额时为 inf）。"""
+        with self._lock:
+            return self._headroom(key)
+
+    def _headroom(self, key: str) -> float:
+        if key in self._exhausted:
+            return 0
+        if self.monthly_limit <= 0:
+            return math.inf
+        return max(0, self.monthly_limit - self._counts.get(key, 0))
+
+    @property
+    def exhausted(self) -> bool:
+        """所有 key 都已用完或无效。"""
+        with self._lock:
+            self._roll_month()
+            return not any(self._headroom(k) > 0 for k in self.keys)
+
+    def acquire(self) -> str | None:
+        """取一个还有额度的 key（计入进行中请求数）；都用完时返回 None。"""
+        with self._lock:
+            self._roll_month()
+            best, best_rank = None, None
+            for key in self.keys:
+                inflight = self._inflight.get(key, 0)
+                free = self._headroom(key) - inflight
+                if free <= 0:
+                    continue
+                rank = (-free, self._counts.get(key, 0) + inflight)
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = key, rank
+            if best is not None:
+                self._inflight[best] = self._inflight.get(best, 0) + 1
+            return best
+
+    def release(self, key: str, count: int | None = None, exhausted: bool = False, invalid: bool = False) -> None:
+        """请求结束：更新用量；exhausted 标记额度用完，invalid 把 key 移出本次运行。"""
+        with self._lock:
+            self._inflight[key] = max(0, self._inflight.get(key, 0) - 1)
+            if count is not None:
+                self._counts[key] = max(count, self._counts.get(key, 0))
+            if exhausted or (self.monthly_limit > 0 and self._counts.get(key, 0) >= self.monthly_limit):
+                self._exhausted.add(key)
+            if invalid and key in self.keys:
+                self.keys.remove(key)
+                self.invalid.append(key)
+            changed = count is not None or exhausted
+        if changed:
+            self._save()
+
+    def remaining(self) -> float:
+        """所有 key 的剩余次数之和。"""
+        with self._lock:
+            return sum(self._headroom(k) for k in self.keys)
+
+    def compress(self, data: bytes, log=print) -> bytes | None:
+        """
+        用 TinyPNG 压缩；额度用完的 key 自动换下一个。
+
+        返回: 压缩后的字节；请求失败或所有 key 都用完时返回 None（已打印原因）
+        """
+        while True:
+            key = self.acquire()
+            if key is None:
+                return None
+            log("   🔄 正在使用 TinyPNG API 压缩...")
+            try:
+                response = http_session().post(TINYPNG_API_URL, auth=("api", key), data=data, timeout=TINYPNG_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                self.release(key)
+                log(f"   ⚠️  TinyPNG API 请求失败: {e}")
+                return None
+            count = _compression_count(response)
+
+            if response.status_code == 429:
+                self.release(key, count, exhausted=True)
+                log(f"   ⚠️  TinyPNG key {mask_token(key)} 本月额度已用完，换用其他 key")
+                continue
+            if response.status_code == 401:
+                self.release(key, invalid=True)
+                log(f"   ⚠️  TinyPNG key {mask_token(key)} 无效（401），已移出 key 池")
+                continue
+            self.release(key, count)
+            if response.status_code != 201:
+                try:
+                    error_msg = response.json().get("error", response.text)
+                except ValueError:
+                    error_msg = response.text
+                log(f"   ❌ TinyPNG API 错误: {error_msg}")
+                return None
+
+            try:
+                # 获取压缩后的图片 URL 并下载
+                compressed_url = response.json()["output"]["url"]
+                compressed_response = http_session().get(compressed_url, timeout=TINYPNG_TIMEOUT)
+                compressed_response.raise_for_status()
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                log(f"   ⚠️  TinyPNG 结果下载失败: {e}")
+                return None
+            compressed = compressed_response.content
+            _log_sizes(log, "TinyPNG 压缩", len(data), len(compressed))
+            if count is not None:
+                remaining = self.remaining()
+                left = "不限" if math.isinf(remaining) else f"剩余 {remaining:.0f} 次"
+                log(f"   📊 TinyPNG key {mask_token(key)} 本月已用 {count} 次（key 池{left}）")
+            return compressed
+
+
+def _log_sizes(log, label: str, original_size: int, compressed_size: int) -> None:
+    if compressed_size < original_size:
+        compression_ratio = (1 - compressed_size / original_size) * 100
+        log(f"   ✨ {label}: {original_size / 1024:.1f} KB → {compressed_size / 1024:.1f} KB (减少 {compression_ratio:.1f}%)")
+    else:
+        log(f"   ℹ️  大小: {compressed_size / 1024:.1f} KB (已优化)")
+
+
+_pools: dict[tuple, TinyPngKeyPool] = {}
+_pools_lock = threading.Lock()
+
+
+def key_pool(keys) -> TinyPngKeyPool:
+    """
+    keys 对应的共享 key 池：可以是 TinyPngKeyPool、单个 key 或逗号分隔的多个 key。
+    同一组 key 在进程内（含常驻进程的多次调用）共用一份用量状态。
+    """
+    if isinstance(keys, TinyPngKeyPool):
+        return keys
+    names = tuple(dict.fromkeys(str(keys).replace(",", " ").split()))
+    with _pools_lock:
+        pool = _pools.get(names)
+        if pool is None:
+            pool = _pools[names] = TinyPngKeyPool(names)
+        return pool
+
+
+def local_compressors() -> list[str]:
+    """可用的本地压缩器名称。"""
+    names = []
+    try:
+        import PIL.Image  # noqa: F401
+        names.append("Pillow")
+    except ImportError:
+        pass
+    try:
+        import oxipng  # noqa: F401
+        names.append("oxipng")
+    except ImportError:
+        pass
+    return names
+
+
+def _quantize_png(data: bytes) -> bytes | None:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        if img.mode == "P":
+            return None  # 已经是调色板图
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        quantized = img.quantize(colors=LOCAL_PNG_COLORS, method=Image.Quantize.FASTOCTREE)
+        out = io.BytesIO()
+        quantized.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def _recompress_jpeg(data: bytes) -> bytes | None:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=LOCAL_JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def _oxipng(data: bytes) -> bytes | None:
+    try:
+        import oxipng
+    except ImportError:
+        return None
+    return oxipng.optimize_from_memory(data, level=OXIPNG_LEVEL)
+
+
+def local_compress(data: bytes, log=print) -> bytes | None:
+    """
+    本地压缩（TinyPNG 不可用时的回退）：PNG 先用 Pillow 量化为 256 色调色板，再用 oxipng 无损优化；
+    JPEG 用 Pillow 以质量 85 重新编码。
+
+    返回: 比原图小的结果；不支持的格式、未安装压缩库或没有变小时返回 None
+    """
+    candidates = []
+    try:
+        if data.startswith(b"\x89PNG"):
+            quantized = _quantize_png(data)
+            for candidate in (quantized, _oxipng(quantized or data)):
+                if candidate:
+                    candidates.append(candidate)
+        elif data.startswith(b"\xff\xd8"):
+            candidate = _recompress_jpeg(data)
+            if candidate:
+                candidates.append(candidate)
+    except Exception as e:
+        log(f"   ⚠️  本地压缩失败: {e}，使用原始文件")
+        return None
+    best = min(candidates, key=len, default=None)
+    if best is None or len(best) >= len(data):
+        return None
+    _log_sizes(log, "本地压缩", len(data), len(best))
+    return best
+
+
+def compress_bytes(data: bytes, keys, log=print) -> bytes | None:
+    """
+    压缩一张图：优先 TinyPNG key 池，所有 key 的额度都用完后改用本地压缩。
+
+    返回: 压缩后的字节；失败或无法压缩时返回 None（调用方使用原图）
+    """
+    pool = key_pool(keys)
+    compressed = pool.compress(data, log)
+    if compressed is not None or not pool.exhausted:
+        return compressed
+    if not pool.fallback_announced:
+        pool.fallback_announced = True
+        tools = local_compressors()
+        if tools:
+            log(f"⚠️  所有 TinyPNG key 的本月额度已用完（或无效），改用本地压缩（{' + '.join(tools)}）")
+        else:
+            log("⚠️  所有 TinyPNG key 的本月额度已用完（或无效），且未安装 Pillow / pyoxipng，跳过压缩")
+    return local_compress(data, log)
@@ -3,24 +3,47 @@
 本地压缩服务：接收 POST 的图片二进制，用 TinyPNG 压缩后返回。
 供 Figma 插件「压缩服务 URL」调用：在插件里填 http://localhost:8765/compress 即可。
 依赖：pip install flask requests
-环境变量：TINYPNG_API_KEY（或当前目录 .env 中的 TINYPNG_API_KEY）
+环境变量：TINYPNG_API_KEYS（逗号分隔的多个 key）或 TINYPNG_API_KEY（也可写在 .env 中）
+与 figmad 共用 key 池（figma_compress.py）：按剩余额度分配，全部用完后改用本地压缩。
+
+POST /save?outputPath=相对路径[&compress=1]：把图片（可选压缩后）直接写入项目资源目录，
+不再经过浏览器下载再手动拷贝。资源目录取自 --asset-root 或 FIGMA_ASSET_ROOT；
+路径不能越出资源目录，写入先落到同目录的临时文件再原子替换，并发写同一路径不会出现半个文件。
+每个写入请求都必须在 X-Figma-Save-Token 头中带上写盘口令：取自 FIGMA_SAVE_TOKEN，未设置时每次启动随机生成并打印。
+自定义请求头会触发 CORS 预检，浏览器里的任意网页（包括 Origin 为 null 的沙箱 iframe）拿不到口令，
+不能借 127.0.0.1 往项目里写文件。
 """
+import argparse
+import hmac
 import os
+import secrets
 import sys
+import tempfile
+from pathlib import Path, PurePosixPath
 
 try:
-    from flask import Flask, request, Response
+    from flask import Flask, request, Response, jsonify
     import requests
 except ImportError:
     print("请安装依赖: pip install flask requests")
     sys.exit(1)
 
-TINYPNG_SHRINK = "https://api.tinify.com/shrink"
+from figma_compress import compress_bytes, key_pool, local_compress
+
 app = Flask(__name__)
 
+# /save 允许写入的扩展名（只接收图片，不能借此往项目里写脚本或配置）
+SAVE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif", ".svg", ".pdf"}
+# 压缩只对这些格式有意义；其余格式原样写入
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+# Figma 插件发出的请求 Origin 为 "null"；只对它回 CORS 头，插件才能读取 /save 的结果
+PLUGIN_ORIGIN = "null"
+# 写盘口令所在的请求头：自定义头让浏览器必须先发预检
+SAVE_TOKEN_HEADER = "X-Figma-Save-Token"
 
-def _load_key():
-    key = os.environ.get("TINYPNG_API_KEY")
+
+def _load_env_value(name):
+    key = os.environ.get(name)
     if key:
         return key
     try:
@@ -29,7 +52,7 @@ def _load_key():
         if p.exists():
             for line in p.read_text(encoding="utf-8").splitlines():
                 line = line.strip()
-                if line.startswith("TINYPNG_API_KEY=") and "=" in line:
+                if line.startswith(name + "=") and "=" in line:
                     v = line.split("=", 1)[1].strip().strip("'\"").strip()
                     if v:
                         return v
@@ -38,39 +61,166 @@ def _load_key():
     return None
 
 
+def _load_key():
+    return _load_env_value("TINYPNG_API_KEYS") or _load_env_value("TINYPNG_API_KEY")
+
+
 @app.route("/compress", methods=["POST"])
 def compress():
     api_key = _load_key()
     if not api_key:
-        return Response("TINYPNG_API_KEY 未设置", status=500)
+        return Response("TINYPNG_API_KEY / TINYPNG_API_KEYS 未设置", status=500)
     data = request.get_data()
     if not data:
         return Response("body 为空", status=400)
+    pool = key_pool(api_key)
+    out = compress_bytes(data, pool)
+    if out is None:
+        if not pool.exhausted:
+            return Response("TinyPNG 压缩失败", status=502)
+        out = data  # 本地压缩也无法变小：原样返回
+    return Response(out, mimetype=request.content_type or "image/png")
+
+
+def _asset_root():
+    root = app.config.get("ASSET_ROOT") or _load_env_value("FIGMA_ASSET_ROOT")
+    return Path(root).expanduser().resolve() if root else None
+
+
+def resolve_output_path(root, output_path):
+    """
+    把插件传来的相对路径解析到资源目录下；不合法时抛出 ValueError。
+
+    拒绝绝对路径、盘符、..、隐藏目录/文件（如 .git）与非图片扩展名；
+    解析符号链接后仍须位于资源目录内。
+    """
+    text = (output_path or "").strip().replace("\\", "/")
+    if not text:
+        raise ValueError("outputPath 为空")
+    rel = PurePosixPath(text)
+    if rel.is_absolute() or ":" in text:
+        raise ValueError(f"outputPath 必须是相对路径: {output_path}")
+    if any(part in ("", ".", "..") or part.startswith(".") for part in rel.parts):
+        raise ValueError(f"outputPath 不能包含 .. 或隐藏目录: {output_path}")
+    if rel.suffix.lower() not in SAVE_EXTENSIONS:
+        raise ValueError(f"不支持的扩展名 {rel.suffix or '（无）'}，仅允许 {' / '.join(sorted(SAVE_EXTENSIONS))}")
+    target = (root / Path(*rel.parts)).resolve()
+    if target == root or root not in target.parents:
+        raise ValueError(f"outputPath 越出资源目录: {output_path}")
+    return target
+
+
+def atomic_write(target, data):
+    """先写同目录下的唯一临时文件并落盘，再 os.replace：读者只会看到完整的旧文件或新文件。"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _compress_for_save(data, suffix):
+    """/save 的可选压缩：PNG/JPG 走 key 池（未配置 key 时本地压缩），SVG 精简；失败时返回原字节。"""
+    if suffix == ".svg":
+        from figma_svg import optimize_svg_bytes
+        return optimize_svg_bytes(data)
+    if suffix not in RASTER_EXTENSIONS:
+        return data
+    api_key = _load_key()
+    out = compress_bytes(data, key_pool(api_key)) if api_key else local_compress(data)
+    return out or data
+
+
+def save_token():
+    """写盘口令：FIGMA_SAVE_TOKEN，未设置时生成一个随机口令，本次进程内不变。"""
+    token = app.config.get("SAVE_TOKEN")
+    if not token:
+        token = _load_env_value("FIGMA_SAVE_TOKEN") or secrets.token_urlsafe(18)
+        app.config["SAVE_TOKEN"] = token
+    return token
+
+
+def _save_forbidden():
+    """/save 的口令校验：返回拒绝原因，允许时返回 None。"""
+    sent = request.headers.get(SAVE_TOKEN_HEADER, "")
+    if not sent or not hmac.compare_digest(sent.encode(), save_token().encode()):
+        return f"缺少或错误的写盘口令（{SAVE_TOKEN_HEADER}，见服务启动输出或 FIGMA_SAVE_TOKEN）"
+    return None
+
+
+def _allow_plugin(response):
+    """只对 Figma 插件（Origin: null）放行跨域读取；本机工具不带 Origin，不需要 CORS 头。"""
+    if request.headers.get("Origin") == PLUGIN_ORIGIN:
+        response.headers["Access-Control-Allow-Origin"] = PLUGIN_ORIGIN
+        response.headers["Vary"] = "Origin"
+    return response
+
+
+@app.route("/save", methods=["POST", "OPTIONS"])
+def save():
+    if request.method == "OPTIONS":
+        # 预检：允许插件带口令头 POST；真正的校验在 POST 时进行
+        response = _allow_plugin(Response(status=204))
+        response.headers["Access-Control-Allow-Methods"] = "POST"
+        response.headers["Access-Control-Allow-Headers"] = f"{SAVE_TOKEN_HEADER}, Content-Type"
+        return response
+    forbidden = _save_forbidden()
+    if forbidden:
+        return Response(forbidden, status=403)
+    root = _asset_root()
+    if root is None:
+        return Response("未配置资源目录：启动时传 --asset-root 或设置 FIGMA_ASSET_ROOT", status=500)
+    data = request.get_data()
+    if not data:
+        return Response("body 为空", status=400)
+    output_path = request.args.get("outputPath") or request.headers.get("X-Output-Path")
+    try:
+        target = resolve_output_path(root, output_path)
+    except ValueError as e:
+        return Response(str(e), status=400)
+    compress = request.args.get("compress", "").lower() in ("1", "true", "yes")
+    out = _compress_for_save(data, target.suffix.lower()) if compress else data
     try:
-        r = requests.post(
-            TINYPNG_SHRINK,
-            auth=("api", api_key),
-            data=data,
-            timeout=30,
-        )
-        if r.status_code != 201:
-            return Response(r.text or "TinyPNG 错误", status=r.status_code)
-        out_url = r.json().get("output", {}).get("url")
-        if not out_url:
-            return Response("TinyPNG 未返回 output.url", status=502)
-        r2 = requests.get(out_url, timeout=30)
-        r2.raise_for_status()
-        return Response(r2.content, mimetype=request.content_type or "image/png")
-    except requests.RequestException as e:
-        return Response(str(e), status=502)
+        atomic_write(target, out)
+    except OSError as e:
+        return Response(f"写入失败: {e}", status=500)
+    rel = target.relative_to(root).as_posix()
+    print(f"💾 {rel}: {len(data)} → {len(out)} 字节" if compress else f"💾 {rel}: {len(out)} 字节")
+    return _allow_plugin(jsonify(path=rel, size=len(out), original_size=len(data), compressed=len(out) < len(data)))
 
 
 @app.route("/")
 def index():
-    return "POST /compress with image bytes to get compressed image. TINYPNG_API_KEY required."
+    return (
+        "POST /compress with image bytes to get compressed image. TINYPNG_API_KEY (or TINYPNG_API_KEYS) required.\n"
+        f"POST /save?outputPath=REL/PATH.png[&compress=1] with image bytes and the {SAVE_TOKEN_HEADER} header "
+        "to write it under the asset root."
+    )
 
 
 if __name__ == "__main__":
-    print("压缩服务: http://127.0.0.1:8765/compress")
-    print("在 Figma 插件「压缩服务 URL」中填写: http://localhost:8765/compress")
-    app.run(host="127.0.0.1", port=8765)
+    parser = argparse.ArgumentParser(description="Figma 插件用的本地压缩 / 写盘服务")
+    parser.add_argument("--asset-root", help="/save 写入的项目资源目录（默认读取 FIGMA_ASSET_ROOT）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口（默认 8765，只监听本机）")
+    args = parser.parse_args()
+    if args.asset_root:
+        app.config["ASSET_ROOT"] = args.asset_root
+    print(f"压缩服务: http://127.0.0.1:{args.port}/compress")
+    print(f"在 Figma 插件「压缩服务 URL」中填写: http://localhost:{args.port}/compress")
+    root = _asset_root()
+    if root:
+        print(f"写盘服务: http://127.0.0.1:{args.port}/save?outputPath=相对路径 → {root}")
+        source = "FIGMA_SAVE_TOKEN" if _load_env_value("FIGMA_SAVE_TOKEN") else "本次启动随机生成"
+        print(f"写盘口令（{source}，填入插件「写盘口令」或作为 {SAVE_TOKEN_HEADER} 请求头）: {save_token()}")
+    else:
+        print("写盘服务 /save 未启用（传 --asset-root 或设置 FIGMA_ASSET_ROOT）")
+    app.run(host="127.0.0.1", port=args.port, threaded=True)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+figmad 常驻进程（figmad daemon）
+每次运行 figmad 都要重新启动解释器、导入 requests/Pillow、重新握手 TLS、重新加载缓存。
+常驻进程把这些都留在内存里：共享的 HTTP 连接池、渲染 URL 缓存、文件结构缓存、
+.env 解析结果；figmad 检测到常驻进程在运行时只把参数转发过去，输出原样回传。
+
+    figmad daemon start     # 后台启动
+    figmad daemon status    # 查看状态
+    figmad daemon stop      # 停止
+    figmad <参数...>         # 常驻进程在运行时自动转发，否则直接运行
+
+协议：Unix socket 上每行一个 JSON。
+    请求 {"argv": [...], "cwd": "...", "env": {...}, "tty": bool} 或 {"cmd": "status" | "stop"}
+    响应 {"out": "..."} / {"err": "..."} 若干行，最后 {"exit": 退出码}
+请求逐个处理（输出重定向与工作目录是进程级状态），单次导出内部仍按原来的方式并发。
+
+客户端部分只依赖标准库，转发时不需要导入任何下载代码。
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+SOCKET_ENV = "FIGMAD_SOCKET"
+# 连不上常驻进程时客户端返回的退出码（EX_TEMPFAIL），figmad 据此回退为直接运行
+EXIT_NO_DAEMON = 75
+# 转发给常驻进程的环境变量前缀（令牌、缓存目录等配置）
+FORWARD_ENV_PREFIXES = ("FIGMA", "TINYPNG")
+START_TIMEOUT_SEC = 10
+
+
+def socket_path() -> Path:
+    """socket 位置：FIGMAD_SOCKET，或 $XDG_RUNTIME_DIR/figmad.sock，或 ~/.cache/figmad/figmad.sock。"""
+    custom = os.environ.get(SOCKET_ENV)
+    if custom:
+        return Path(custom).expanduser()
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and Path(runtime).is_dir():
+        return Path(runtime) / "figmad.sock"
+    return Path.home() / ".cache" / "figmad" / "figmad.sock"
+
+
+def _connect(path: Path | None = None, timeout: float | None = None) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock: socket.socket, message: dict) -> None:
+    sock.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _call(message: dict, timeout: float = 5) -> dict | None:
+    """发送一条控制命令并返回最终响应；连不上时返回 None。"""
+    sock = _connect(timeout=timeout)
+    if sock is None:
+        return None
+    with sock, sock.makefile("r", encoding="utf-8") as reader:
+        _send(sock, message)
+        for line in reader:
+            reply = json.loads(line)
+            if "exit" in reply:
+                return reply
+    return None
+
+
+# ---------------------------------------------------------------------------
+# 客户端
+# ---------------------------------------------------------------------------
+
+def forward(argv: list[str]) -> int:
+    """把一次 figmad 调用转发给常驻进程，输出写到本地 stdout/stderr，返回退出码。"""
+    sock = _connect()
+    if sock is None:
+        return EXIT_NO_DAEMON
+    env = {k: v for k, v in os.environ.items() if k.startswith(FORWARD_ENV_PREFIXES)}
+    request = {"argv": argv, "cwd": os.getcwd(), "env": env, "tty": sys.stdout.isatty()}
+    try:
+        with sock, sock.makefile("r", encoding="utf-8") as reader:
+            _send(sock, request)
+            for line in reader:
+                reply = json.loads(line)
+                if "out" in reply:
+                    sys.stdout.write(reply["out"])
+                    sys.stdout.flush()
+                elif "err" in reply:
+                    sys.stderr.write(reply["err"])
+                    sys.stderr.flush()
+                elif "exit" in reply:
+                    return int(reply["exit"])
+    except KeyboardInterrupt:
+        return 130
+    print("❌ 常驻进程连接中断", file=sys.stderr)
+    return 1
+
+
+def start() -> int:
+    """后台启动常驻进程，等待 socket 就绪。"""
+    if _call({"cmd": "status"}):
+        print(f"✅ figmad 常驻进程已在运行（{socket_path()}）")
+        return 0
+    import subprocess
+
+    log_path = socket_path().with_suffix(".log")
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "ab") as log:
+        proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "serve"],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            print(f"❌ 常驻进程启动失败，详见 {log_path}", file=sys.stderr)
+            return 1
+        if _call({"cmd": "status"}, timeout=1):
+            print(f"✅ figmad 常驻进程已启动（pid {proc.pid}，{socket_path()}）")
+            return 0
+        time.sleep(0.1)
+    print(f"❌ 等待常驻进程就绪超时，详见 {log_path}", file=sys.stderr)
+    return 1
+
+
+def stop() -> int:
+    if _call({"cmd": "stop"}) is None:
+        print("ℹ️  figmad 常驻进程未运行")
+        return 0
+    print("🛑 figmad 常驻进程已停止")
+    return 0
+
+
+def status() -> int:
+    reply = _call({"cmd": "status"})
+    if reply is None:
+        print("ℹ️  figmad 常驻进程未运行")
+        return 1
+    info = reply.get("status", {})
+    print(
+        f"✅ figmad 常驻进程运行中：pid {info.get('pid')}，已运行 {info.get('uptime_sec', 0):.0f} 秒，"
+        f"处理请求 {info.get('requests', 0)} 次，缓存文件结构 {info.get('structures', 0)} 份"
+        f"（{socket_path()}）"
+    )
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 服务端
+# ---------------------------------------------------------------------------
+
+class _SocketStream:
+    """把 print 输出按 JSON 帧写回客户端（线程安全）；客户端断开后写入抛出 BrokenPipeError 以中止本次运行。"""
+
+    def __init__(self, sock: socket.socket, key: str, lock: threading.Lock, tty: bool):
+        self._sock = sock
+        self._key = key
+        self._lock = lock
+        self._tty = tty
+        self.closed = False
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        with self._lock:
+            if self.closed:
+                raise BrokenPipeError("client disconnected")
+            try:
+                _send(self._sock, {self._key: text})
+            except OSError:
+                self.closed = True
+                raise BrokenPipeError("client disconnected")
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return self._tty
+
+    @property
+    def encoding(self) -> str:
+        return "utf-8"
+
+
+class _Daemon:
+    def __init__(self, path: Path):
+        self.path = path
+        self.started = time.monotonic()
+        self.requests = 0
+        self.running = True
+        # 预先导入：后续每次请求都省掉 requests/Pillow 等模块的导入时间
+        import download_figma_image
+        import figma_api
+        self.app = download_figma_image
+        self.api = figma_api
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "uptime_sec": time.monotonic() - self.started,
+            "requests": self.requests,
+            "structures": len(self.api._STRUCTURE_CACHE),
+        }
+
+    def run(self, sock: socket.socket, request: dict) -> int:
+        """在本进程内执行一次 download_figma_image.main()，输出转发给客户端。"""
+        lock = threading.Lock()
+        tty = bool(request.get("tty"))
+        out = _SocketStream(sock, "out", lock, tty)
+        err = _SocketStream(sock, "err", lock, tty)
+        env = request.get("env") or {}
+        saved_env = {k: v for k, v in os.environ.items() if k.startswith(FORWARD_ENV_PREFIXES)}
+        saved = (sys.stdout, sys.stderr, sys.argv, os.getcwd())
+        code = 0
+        try:
+            # 以客户端的配置为准：先清掉本进程自带的同类变量
+            for k in saved_env:
+                del os.environ[k]
+            os.environ.update(env)
+            os.chdir(request.get("cwd") or saved[3])
+            sys.stdout, sys.stderr = out, err
+            sys.argv = ["figmad"] + list(request.get("argv") or [])
+            code = 0 if self.app.main() else 1
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if isinstance(e.code, str):
+                try:
+                    err.write(e.code + "\n")
+                except BrokenPipeError:
+                    pass
+        except BrokenPipeError:
+            code = 130
+        except Exception as e:
+            code = 1
+            try:
+                err.write(f"❌ 常驻进程内部错误: {e}\n")
+            except BrokenPipeError:
+                pass
+        finally:
+            sys.stdout, sys.stderr, sys.argv = saved[:3]
+            os.chdir(saved[3])
+            for k in env:
+                os.environ.pop(k, None)
+            os.environ.update(saved_env)
+            self.requests += 1
+        return code
+
+    def handle(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("r", encoding="utf-8") as reader:
+            line = reader.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+            except ValueError:
+                _send(conn, {"err": "❌ 无效请求\n"})
+                _send(conn, {"exit": 2})
+                return
+            try:
+                cmd = request.get("cmd")
+                if cmd == "status":
+                    _send(conn, {"exit": 0, "status": self.status()})
+                elif cmd == "stop":
+                    self.running = False
+                    _send(conn, {"exit": 0})
+                else:
+                    code = self.run(conn, request)
+                    _send(conn, {"exit": code})
+            except OSError:
+                pass  # 客户端已断开
+            except Exception as e:
+                # 单个请求出错时回复客户端并继续服务，不让一次请求拖垮常驻进程
+                print(f"[figmad] 请求处理失败: {e!r}", flush=True)
+                try:
+                    _send(conn, {"err": f"❌ 常驻进程内部错误: {e}\n"})
+                    _send(conn, {"exit": 1})
+                except OSError:
+                    pass
+
+    def serve(self) -> None:
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(str(self.path))
+        os.chmod(self.path, 0o600)
+        listener.listen(16)
+        print(f"[figmad] 常驻进程已启动 pid={os.getpid()} socket={self.path}", flush=True)
+        try:
+            while self.running:
+                conn, _ = listener.accept()
+                try:
+                    self.handle(conn)
+                except Exception as e:
+                    print(f"[figmad] 连接处理失败: {e!r}", flush=True)
+        finally:
+            listener.close()
+            self.path.unlink(missing_ok=True)
+            print(f"[figmad] 常驻进程已退出，共处理 {self.requests} 次请求", flush=True)
+
+
+def serve() -> int:
+    """前台运行常驻进程（figmad daemon start 会在后台调用它）。"""
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        probe = _connect(path, timeout=1)
+        if probe is not None:
+            probe.close()
+            print(f"❌ 已有常驻进程在监听 {path}", file=sys.stderr)
+            return 1
+        path.unlink()  # 上次异常退出留下的 socket 文件
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    try:
+        _Daemon(path).serve()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    if not args:
+        print("用法: figma_daemon.py start|stop|status|serve|forward <figmad 参数...>", file=sys.stderr)
+        return 2
+    cmd, rest = args[0], args[1:]
+    if cmd == "forward":
+        return forward(rest)
+    commands = {"start": start, "stop": stop, "status": status, "serve": serve}
+    if cmd not in commands:
+        print(f"❌ 未知命令: {cmd}（可用: start / stop / status / serve）", file=sys.stderr)
+        return 2
+    return commands[cmd]()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
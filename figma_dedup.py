@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+渲染与输出去重
+- 同一主组件、没有任何覆盖、尺寸相同的实例，渲染结果必然一致：
+  每组只渲染一个代表节点，其余节点的输出用硬链接（跨设备或不支持时复制）生成。
+- ContentStore：按内容哈希存储输出，相同字节只落盘一份，可读目录树用链接指向它。
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+# 实例自身会影响渲染结果的属性（覆盖列表之外的保险）
+_INSTANCE_PROPS = ("rotation", "opacity", "visible", "blendMode", "isMask")
+
+
+def render_key(node: dict | None) -> tuple | None:
+    """
+    可证明渲染结果相同的分组键；不能证明时返回 None（该节点单独渲染）。
+
+    只对 INSTANCE 生效，要求：有 componentId、overrides 明确为空列表、尺寸已知。
+    """
+    if not node or node.get("type") != "INSTANCE" or not node.get("componentId"):
+        return None
+    if node.get("overrides") != []:
+        return None  # 有覆盖，或接口未返回覆盖信息，都无法证明
+    bbox = node.get("absoluteBoundingBox") or {}
+    if bbox.get("width") is None or bbox.get("height") is None:
+        return None
+    props = tuple(repr(node.get(k)) for k in _INSTANCE_PROPS)
+    return (node["componentId"], round(bbox["width"], 2), round(bbox["height"], 2), props)
+
+
+def group_identical(keys: dict[str, tuple | None]) -> dict[str, list[str]]:
+    """
+    按渲染键分组。keys 为 {节点 id: render_key}，按文档顺序排列。
+
+    返回 {代表 id: [其余 id, ...]}，只包含有重复的组；代表取每组第一个节点。
+    """
+    first: dict[tuple, str] = {}
+    groups: dict[str, list[str]] = {}
+    for node_id, key in keys.items():
+        if key is None:
+            continue
+        rep = first.setdefault(key, node_id)
+        if rep != node_id:
+            groups.setdefault(rep, []).append(node_id)
+    return groups
+
+
+def link_or_copy(src: Path, dst: Path) -> str:
+    """用硬链接生成 dst（已存在则替换），失败时复制。返回 'link' 或 'copy'。"""
+    src, dst = Path(src), Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        if dst.exists() and os.path.samefile(src, dst):
+            return "link"
+        dst.unlink()
+    try:
+        os.link(src, dst)
+        return "link"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+class ContentStore:
+    """
+    内容寻址的输出存储：每份不同的图片只在 objects/<前两位>/<sha256>.<扩展名> 存一份，
+    可读的 页面/画板.png 目录树用硬链接（或相对符号链接）指向它。
+
+        store = ContentStore(output_dir / ".objects")
+        store.release(planned_paths)   # 导出前：断开旧链接，避免原地写入改坏共享对象
+        ...导出...
+        for path in written_paths:
+            store.add(path)
+        store.print_summary()
+    """
+
+    def __init__(self, root: Path, symlink: bool = False):
+        self.root = Path(root)
+        self.symlink = symlink
+        self._lock = threading.Lock()
+        self.files = 0
+        self.new_objects = 0
+        self.bytes_total = 0
+        self.bytes_written = 0
+        self._sizes: dict[str, int] = {}  # 本次涉及的不同内容 → 字节数
+
+    def object_path(self, digest: str, suffix: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def release(self, paths) -> None:
+        """把指向存储对象的输出文件先删掉，后续写入会生成新文件而不是改写对象。"""
+        for path in paths:
+            path = Path(path)
+            try:
+                if path.is_symlink() or (path.exists() and path.stat().st_nlink > 1):
+                    path.unlink()
+            except OSError:
+                pass
+
+    def add(self, path: Path) -> bool:
+        """
+        把 path 收入存储并替换为指向对象的链接。返回 True 表示这是新内容。
+        """
+        path = Path(path)
+        if path.is_symlink() or not path.is_file():
+            return False
+        digest = _file_sha256(path)
+        obj = self.object_path(digest, path.suffix.lower())
+        size = path.stat().st_size
+        with self._lock:
+            is_new = not obj.exists()
+            if is_new:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                tmp = obj.with_name(obj.name + f".{os.getpid()}.tmp")
+                tmp.unlink(missing_ok=True)
+                try:
+                    os.link(path, tmp)  # 新内容直接把现有文件挂进存储，不再写一遍
+                except OSError:
+                    shutil.copy2(path, tmp)
+                os.replace(tmp, obj)
+                self.new_objects += 1
+                self.bytes_written += size
+            self.files += 1
+            self.bytes_total += size
+            self._sizes[digest] = size
+        if not self.symlink and os.path.samefile(path, obj):
+            return is_new
+        tmp_link = path.with_name(path.name + ".link.tmp")
+        tmp_link.unlink(missing_ok=True)
+        if self.symlink:
+            os.symlink(os.path.relpath(obj, path.parent), tmp_link)
+        else:
+            try:
+                os.link(obj, tmp_link)
+            except OSError:
+                return is_new  # 不能硬链接（跨设备等）时保留原文件
+        os.replace(tmp_link, path)
+        return is_new
+
+    def print_summary(self, log=print) -> None:
+        saved = self.bytes_total - sum(self._sizes.values())
+        log(
+            f"🗃️  内容存储: {self.files} 个文件 → {len(self._sizes)} 份不同内容"
+            f"（新增 {self.new_objects} 个对象，共 {self.bytes_written / 1024 / 1024:.2f} MB；"
+            f"重复内容节省 {saved / 1024 / 1024:.2f} MB）→ {self.root}"
+        )
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
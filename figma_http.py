@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 会话与 Figma API 限速
+所有请求复用同一个 requests.Session：同一主机的 TCP/TLS 连接保持复用（keep-alive），
+在常驻进程（figmad daemon）中跨多次调用一直保持温热。
+Figma REST API 请求统一经过 api_limiter(令牌)：Figma 按令牌计算配额，
+每个令牌一份速率与 429 退避状态，所有文件、所有线程共用。
+多个令牌（FIGMA_ACCESS_TOKENS）组成 TokenPool，请求分摊到各令牌上。
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机保留的连接数（并发下载线程共用）
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 32
+
+_lock = threading.Lock()
+_session: requests.Session | None = None
+
+
+def http_session() -> requests.Session:
+    """进程内共享的 Session（首次调用时创建）。"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+# 每个令牌每分钟的 Figma API 请求数上限（0 为不限，只在收到 429 时退避）
+API_RATE_ENV = "FIGMA_API_RATE"
+API_BURST = 5
+# 429 没有 Retry-After 时的默认退避秒数
+DEFAULT_RETRY_AFTER_SEC = 10.0
+
+
+class RateLimiter:
+    """
+    Figma API 的共享限速器（线程安全）。
+
+    - per_minute > 0 时按令牌桶放行，最多允许 burst 个请求突发
+    - 任一请求收到 429 时调用 backoff()：所有线程都等到冷却结束再发请求，
+      而不是各自重试、继续撞限额
+    """
+
+    def __init__(self, per_minute: float = 0, burst: int = API_BURST):
+        self._lock = threading.Lock()
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self.per_minute = 0.0
+        self.throttled = 0
+        self.configure(per_minute)
+
+    def configure(self, per_minute: float) -> None:
+        with self._lock:
+            self.per_minute = max(0.0, float(per_minute or 0))
+
+    def acquire(self) -> None:
+        """阻塞到可以发出下一个请求。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.per_minute <= 0:
+                        return
+                    rate = self.per_minute / 60.0
+                    self._tokens = min(self.burst, self._tokens + (now - self._last) * rate)
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / rate
+            time.sleep(wait)
+
+    def wait_time(self) -> float:
+        """不阻塞地估算距离下一次可以发请求还要等几秒。"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.per_minute <= 0:
+                return wait
+            rate = self.per_minute / 60.0
+            tokens = min(self.burst, self._tokens + (now - self._last) * rate)
+            return max(wait, 0.0 if tokens >= 1 else (1 - tokens) / rate)
+
+    def backoff(self, seconds: float) -> None:
+        """收到 429：暂停所有请求 seconds 秒。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.throttled += 1
+
+
+def retry_after_seconds(response, default: float = DEFAULT_RETRY_AFTER_SEC) -> float:
+    """解析 Retry-After 响应头（秒数），缺失或无法解析时返回 default。"""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except (TypeError, ValueError):
+        return default
+
+
+_limiters: dict[str, RateLimiter] = {}
+# 本次调用通过 --api-rate 指定的速率；None 表示取 FIGMA_API_RATE
+_api_rate: float | None = None
+
+
+def _env_api_rate() -> float:
+    try:
+        return float(os.environ.get(API_RATE_ENV) or 0)
+    except ValueError:
+        return 0.0
+
+
+def current_api_rate() -> float:
+    """当前生效的每令牌速率：set_api_rate() 指定的值，否则实时读取 FIGMA_API_RATE。"""
+    return _api_rate if _api_rate is not None else _env_api_rate()
+
+
+def api_limiter(token: str) -> RateLimiter:
+    """
+    令牌对应的共享限速器（429 退避状态跨调用保留）。
+    速率每次取用时按 current_api_rate() 重新确定，常驻进程中转发来的新 FIGMA_API_RATE 立即生效。
+    """
+    rate = current_api_rate()
+    with _lock:
+        limiter = _limiters.get(token)
+        if limiter is None:
+            limiter = _limiters[token] = RateLimiter(rate)
+    if limiter.per_minute != max(0.0, rate):
+        limiter.configure(rate)
+    return limiter
+
+
+def set_api_rate(per_minute: float | None) -> None:
+    """
+    设置本次调用每个令牌的请求速率（已有和以后创建的限速器都生效）。
+    per_minute 为 None 时恢复为 FIGMA_API_RATE / 不限：常驻进程中每次调用都要设置，
+    上一次调用的 --api-rate 不会沿用到没有指定它的调用。
+    """
+    global _api_rate
+    with _lock:
+        _api_rate = per_minute
+        limiters = list(_limiters.values())
+    rate = current_api_rate()
+    for limiter in limiters:
+        limiter.configure(rate)
+
+
+class NoUsableToken(requests.exceptions.RequestException):
+    """令牌池中的令牌都已失效（403 Invalid token / Token expired）被移除。"""
+
+
+# 403 响应中表示令牌本身无效/过期的关键字；其余 403（对某个文件没有权限）只影响该文件
+TOKEN_REJECTED_MARKERS = ("invalid token", "token expired", "expired token", "token has expired", "revoked")
+
+
+def token_rejected(response) -> bool:
+    """403 是否因为令牌本身无效或过期（而不是没有该文件的访问权限）。"""
+    try:
+        body = response.json()
+        message = " ".join(str(body.get(k) or "") for k in ("err", "message", "error")) if isinstance(body, dict) \
+            else str(body)
+    except ValueError:
+        message = response.text or ""
+    message = message.lower()
+    return any(marker in message for marker in TOKEN_REJECTED_MARKERS)
+
+
+def mask_token(token: str) -> str:
+    return f"…{token[-4:]}" if len(token) > 4 else "…"
+
+
+class TokenPool:
+    """
+    多个 Figma 令牌轮流使用（FIGMA_ACCESS_TOKENS）。
+
+    - 每次请求选等待时间最短的令牌（相同时轮转），各令牌的限速与 429 退避互不影响
+    - 令牌无效/过期（403 Invalid token / Token expired）时移出令牌池，后续请求不再使用
+    - 对某个文件没有权限的 403 只记在 (文件, 令牌) 上：该文件换其他令牌，其他文件照常使用这个令牌
+    - 可直接代替单个令牌传给 figma_api_get 及各 get_* 函数
+    """
+
+    def __init__(self, tokens):
+        self.tokens = list(dict.fromkeys(t.strip() for t in tokens if t and t.strip()))
+        if not self.tokens:
+            raise ValueError("令牌池为空")
+        self._key = tuple(self.tokens)
+        self._lock = threading.Lock()
+        self._next = 0
+        self.dropped: list[str] = []
+        # 文件 key → 对该文件返回过权限 403 的令牌
+        self.denied: dict[str, set[str]] = {}
+
+    @classmethod
+    def parse(cls, text: str) -> "TokenPool":
+        """逗号、空白或换行分隔的令牌列表。"""
+        return cls(text.replace(",", " ").split())
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TokenPool) and other._key == self._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        return f"TokenPool({', '.join(mask_token(t) for t in self._key)})"
+
+    def pick(self, scope: str | None = None) -> str:
+        """选等待最短的令牌；scope（文件 key）非空时跳过对该文件返回过权限 403 的令牌（都被拒时不跳过）。"""
+        with self._lock:
+            if not self.tokens:
+                raise NoUsableToken("令牌池中的令牌都已失效（403），没有可用的令牌")
+            start = self._next % len(self.tokens)
+            order = self.tokens[start:] + self.tokens[:start]
+            self._next += 1
+            denied = self.denied.get(scope, set()) if scope else set()
+        order = [token for token in order if token not in denied] or order
+        return min(order, key=lambda token: api_limiter(token).wait_time())
+
+    def available_now(self) -> bool:
+        with self._lock:
+            tokens = list(self.tokens)
+        return any(api_limiter(token).wait_time() == 0 for token in tokens)
+
+    def drop(self, token: str) -> bool:
+        """移除无效/过期的令牌；返回池中是否还有令牌。"""
+        with self._lock:
+            if token in self.tokens:
+                self.tokens.remove(token)
+                self.dropped.append(token)
+                print(f"⚠️  令牌 {mask_token(token)} 无效或已过期（403），已移出令牌池（剩余 {len(self.tokens)} 个）")
+            return bool(self.tokens)
+
+    def deny(self, token: str, scope: str) -> bool:
+        """记录令牌对 scope（文件 key）没有访问权限；返回该文件是否还有没试过的令牌。"""
+        with self._lock:
+            denied = self.denied.setdefault(scope, set())
+            if token not in denied:
+                denied.add(token)
+                print(f"⚠️  令牌 {mask_token(token)} 无权访问文件 {scope}（403），该文件改用其他令牌")
+            return any(t not in denied for t in self.tokens)
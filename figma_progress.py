@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+下载进度汇总显示
+所有下载共用一个计数器：每个分块只做一次加法，由后台线程按固定频率重绘一行
+「张数 / 张每秒 / MB 每秒 / 剩余时间」。
+- 终端（TTY）：每 0.25 秒原地刷新一行；期间其他 print 会先清掉进度行，不会串行
+- 非终端（CI 日志、重定向到文件）：每 10 秒输出一行普通摘要
+"""
+
+import sys
+import threading
+import time
+
+TTY_REFRESH_SEC = 0.25
+PLAIN_REFRESH_SEC = 10.0
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class _StatusAwareStream:
+    """包装 stdout：有进度行时先清掉再写入，写完由下一次刷新重绘。"""
+
+    def __init__(self, progress: "TransferProgress", stream):
+        self._progress = progress
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        with self._progress._lock:
+            self._progress._clear_line()
+            if text:
+                self._progress._at_line_start = text.endswith("\n")
+            return self._stream.write(text)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class TransferProgress:
+    """
+    并发下载的汇总进度（线程安全）。
+
+    用法：
+        with TransferProgress(total_items=len(nodes)) as progress:
+            download_to_file(url, path, on_progress=progress.on_bytes)
+            progress.item_done(ok=True)
+    """
+
+    def __init__(self, total_items: int = 0, stream=None, interval: float | None = None, label: str = "下载"):
+        self.stream = stream or sys.stdout
+        self.is_tty = bool(getattr(self.stream, "isatty", lambda: False)())
+        self.interval = interval or (TTY_REFRESH_SEC if self.is_tty else PLAIN_REFRESH_SEC)
+        self.label = label
+        self.total_items = total_items
+        self.done_items = 0
+        self.failed_items = 0
+        self.bytes_done = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = time.monotonic()
+        self._drawn = False
+        self._at_line_start = True
+        self._saved_stdout = None
+
+    # ---- 计数（下载线程调用，只做加法） ----
+    def add_items(self, n: int) -> None:
+        with self._lock:
+            self.total_items += n
+
+    def on_bytes(self, delta: int, _done: int = 0, _total: int = 0) -> None:
+        """可直接作为 figma_transfer 的 on_progress 回调。"""
+        with self._lock:
+            self.bytes_done += delta
+
+    def item_done(self, ok: bool = True) -> None:
+        with self._lock:
+            self.done_items += 1
+            if not ok:
+                self.failed_items += 1
+
+    # ---- 显示 ----
+    def status_line(self) -> str:
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self._started)
+            done, total = self.done_items, self.total_items
+            ips = done / elapsed
+            mbps = self.bytes_done / elapsed / 1024 / 1024
+            parts = [f"{self.label} {done}/{total} 张" if total else f"{self.label} {done} 张"]
+            if self.failed_items:
+                parts.append(f"失败 {self.failed_items}")
+            parts.append(f"{ips:.1f} 张/s")
+            parts.append(f"{mbps:.2f} MB/s")
+            if total and done and done < total:
+                parts.append(f"剩余约 {_format_duration((total - done) / ips)}")
+            return " | ".join(parts)
+
+    def _clear_line(self) -> None:
+        if self._drawn:
+            self.stream.write("\r\x1b[K")
+            self._drawn = False
+
+    def _redraw(self) -> None:
+        with self._lock:
+            if self.is_tty:
+                if not self._at_line_start:
+                    return  # 有人正在输出半行内容，不插入进度
+                self._clear_line()
+                self.stream.write(f"   ⏳ {self.status_line()}")
+                self._drawn = True
+            else:
+                self.stream.write(f"[进度] {self.status_line()}\n")
+            self.stream.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._redraw()
+
+    def start(self) -> "TransferProgress":
+        self._started = time.monotonic()
+        if self.is_tty and sys.stdout is self.stream:
+            self._saved_stdout = sys.stdout
+            sys.stdout = _StatusAwareStream(self, self.stream)
+        self._thread = threading.Thread(target=self._run, name="figmad-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._clear_line()
+            if self._saved_stdout is not None:
+                sys.stdout = self._saved_stdout
+                self._saved_stdout = None
+            elapsed = time.monotonic() - self._started
+            self.stream.write(
+                f"📊 {self.status_line()} | 用时 {_format_duration(elapsed)}"
+                f" | 共 {self.bytes_done / 1024 / 1024:.2f} MB\n"
+            )
+            self.stream.flush()
+
+    def __enter__(self) -> "TransferProgress":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
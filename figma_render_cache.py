@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Figma 渲染 URL 缓存
+/v1/images 返回的 S3 地址在一段时间内有效（官方约 30 天），渲染又是最慢的一步。
+按 (file_key, node_id, scale, format, version) 记录已渲染的地址及过期时间：
+下载重试、重复运行时直接复用，只有过期或 CDN 返回 403 时才重新请求渲染。
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# 缓存有效期：官方 30 天，保守取 14 天
+RENDER_URL_TTL_SEC = 14 * 24 * 3600
+CACHE_DIR_ENV = "FIGMAD_CACHE_DIR"
+
+
+def default_cache_dir() -> Path:
+    """缓存根目录：FIGMAD_CACHE_DIR 或 ~/.cache/figmad。"""
+    custom = os.environ.get(CACHE_DIR_ENV)
+    if custom:
+        return Path(custom).expanduser()
+    return Path.home() / ".cache" / "figmad"
+
+
+class RenderUrlExpired(Exception):
+    """CDN 拒绝了缓存的渲染地址（403），需要重新渲染。"""
+
+
+class RenderUrlCache:
+    """
+    渲染 URL 存储（线程安全）。
+
+    - version 为 None 时只在本次运行内存中复用（无法判断设计稿是否已改动），不落盘
+    - 其余条目持久化到 JSON 文件，加载时丢弃已过期的记录
+    """
+
+    _shared: dict[Path, "RenderUrlCache"] = {}
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "RenderUrlCache":
+        """进程内共享的持久化缓存（按缓存文件路径区分），常驻进程中跨调用不必重复加载。"""
+        path = default_cache_dir() / "render_urls.json"
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    def __init__(self, path: Path | None = None, ttl: float = RENDER_URL_TTL_SEC, persist: bool = True):
+        self.path = Path(path) if path else default_cache_dir() / "render_urls.json"
+        self.ttl = ttl
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._volatile: dict[str, dict] = {}
+        self._dirty = False
+        if persist:
+            self._load()
+
+    @staticmethod
+    def make_key(file_key: str, node_id: str, scale, fmt: str, version) -> str:
+        return "|".join([file_key, node_id, f"{float(scale):g}", fmt.lower(), str(version or "")])
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in (data.get("entries") or {}).items():
+            if isinstance(entry, dict) and entry.get("url") and entry.get("expires", 0) > now:
+                self._entries[key] = entry
+
+    def get(self, file_key: str, node_id: str, scale, fmt: str, version) -> str | None:
+        key = self.make_key(file_key, node_id, scale, fmt, version)
+        with self._lock:
+            store = self._entries if version else self._volatile
+            entry = store.get(key)
+            if not entry:
+                return None
+            if entry["expires"] <= time.time():
+                store.pop(key, None)
+                self._dirty = True
+                return None
+            return entry["url"]
+
+    def put(self, file_key: str, node_id: str, scale, fmt: str, version, url: str) -> None:
+        if not url:
+            return
+        key = self.make_key(file_key, node_id, scale, fmt, version)
+        entry = {"url": url, "expires": time.time() + self.ttl}
+        with self._lock:
+            if version:
+                self._entries[key] = entry
+                self._dirty = True
+            else:
+                self._volatile[key] = entry
+
+    def invalidate(self, file_key: str, node_id: str, scale, fmt: str, version) -> None:
+        key = self.make_key(file_key, node_id, scale, fmt, version)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+            self._volatile.pop(key, None)
+
+    def split_cached(self, file_key: str, node_ids: list[str], scale, fmt: str, version) -> tuple[dict, list[str]]:
+        """把节点拆成 (已缓存 {node_id: url}, 仍需渲染 [node_id])。"""
+        cached, missing = {}, []
+        for nid in node_ids:
+            url = self.get(file_key, nid, scale, fmt, version)
+            if url:
+                cached[nid] = url
+            else:
+                missing.append(nid)
+        return cached, missing
+
+    def save(self) -> None:
+        """原子写回缓存文件；失败只打印警告，不影响下载结果。"""
+        if not self.persist:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"entries": dict(self._entries)}
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️  渲染 URL 缓存写入失败 {self.path}: {e}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+多倍率变体（Flutter 资源目录结构）
+每个节点只按最高倍率渲染、下载一次，其余倍率在本地用 Lanczos 高质量缩小，
+缩放在进程池中并行进行。输出结构与 generate_level_icons.py 一致：
+  xxx.png          1x
+  2.0x/xxx.png     2x
+  3.0x/xxx.png     3x
+依赖 Pillow（可选）：未安装时调用方应退回逐倍率原生渲染。
+"""
+
+import io
+import os
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+# 本地缩放只适用于位图格式
+RASTER_FORMATS = ("png", "jpg")
+
+
+def parse_scales(text: str) -> list[float]:
+    """解析 '1,2,3' 为升序去重的倍率列表；非法输入抛出 ValueError。"""
+    scales = set()
+    for part in str(text).split(","):
+        part = part.strip().lower().rstrip("x")
+        if not part:
+            continue
+        value = float(part)
+        if not 0.01 <= value <= 4:
+            raise ValueError(f"倍率超出范围 (0.01–4): {part}")
+        scales.add(value)
+    if not scales:
+        raise ValueError("至少需要一个倍率")
+    return sorted(scales)
+
+
+def scale_dir_name(scale: float) -> str | None:
+    """Flutter 变体子目录名：1x 放根目录（None），其余为 '2.0x'、'1.5x'。"""
+    if float(scale) == 1:
+        return None
+    return f"{float(scale):.1f}x"
+
+
+def variant_path(base_path: Path, scale: float) -> Path:
+    """base_path 对应倍率的输出路径：同目录下的 '{倍率}x/' 子目录中，文件名不变。"""
+    base_path = Path(base_path)
+    subdir = scale_dir_name(scale)
+    return base_path.parent / subdir / base_path.name if subdir else base_path
+
+
+def master_path(base_path: Path) -> Path:
+    """最高倍率原图的暂存路径（缩放完成后删除）。"""
+    base_path = Path(base_path)
+    return base_path.with_name(base_path.name + ".master")
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL.Image  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def derive_variants(master: str, master_scale: float, base_path: str, scales: list[float], fmt: str) -> list[str]:
+    """
+    由最高倍率原图生成各倍率文件（在工作进程中执行）。
+
+    最高倍率直接复制原图字节；其余倍率按 倍率/最高倍率 用 Lanczos 缩小。
+    返回写入的文件路径列表。
+    """
+    from PIL import Image
+
+    written = []
+    with Image.open(master) as im:
+        im.load()
+        for scale in scales:
+            out = variant_path(Path(base_path), scale)
+            out.parent.mkdir(parents=True, exist_ok=True)
+            if scale == master_scale:
+                shutil.copyfile(master, out)
+            else:
+                factor = scale / master_scale
+                size = (max(1, round(im.width * factor)), max(1, round(im.height * factor)))
+                resized = im.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                if fmt == "jpg":
+                    resized.convert("RGB").save(out, "JPEG", quality=95, subsampling=0)
+                else:
+                    resized.save(out, "PNG")
+            written.append(str(out))
+    return written
+
+
+def derive_variant_bytes(master: bytes, master_scale: float, scales: list[float], fmt: str) -> dict[float, bytes]:
+    """
+    derive_variants 的内存版本（写入归档时使用，不落盘）：返回 {倍率: 图片字节}。
+    """
+    from PIL import Image
+
+    result = {}
+    with Image.open(io.BytesIO(master)) as im:
+        im.load()
+        for scale in scales:
+            if scale == master_scale:
+                result[scale] = master
+                continue
+            factor = scale / master_scale
+            size = (max(1, round(im.width * factor)), max(1, round(im.height * factor)))
+            resized = im.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            buf = io.BytesIO()
+            if fmt == "jpg":
+                resized.convert("RGB").save(buf, "JPEG", quality=95, subsampling=0)
+            else:
+                resized.save(buf, "PNG")
+            result[scale] = buf.getvalue()
+    return result
+
+
+class VariantDeriver:
+    """
+    进程池缩放器：下载线程每拿到一张最高倍率原图就 submit，缩放与后续下载并行。
+
+        with VariantDeriver() as deriver:
+            future = deriver.submit(master, 3, base_path, [1, 2, 3], "png")
+            paths = future.result()
+    """
+
+    def __init__(self, jobs: int | None = None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self._pool = None
+
+    def submit(self, master: Path, master_scale: float, base_path: Path, scales: list[float], fmt: str) -> Future:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._pool.submit(derive_variants, str(master), master_scale, str(base_path), scales, fmt)
+
+    def submit_bytes(self, master: bytes, master_scale: float, scales: list[float], fmt: str) -> Future:
+        """内存版本：Future 的结果为 {倍率: 图片字节}。"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._pool.submit(derive_variant_bytes, master, master_scale, scales, fmt)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) -> "VariantDeriver":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+导出调度：最大的任务先做
+按文档顺序导出时，几张巨型画板排在最后，整次运行就拖在这一两个请求上。
+每个节点的代价 = 渲染耗时 + 下载耗时：有上次运行的实测记录就用记录，
+没有就按 包围盒面积 × 倍率² 和历史平均速率估算；按代价从大到小派发。
+--dry-run 只打印计划：渲染请求数、预计下载字节数、预计耗时。
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from figma_batching import BatchPlanner, PixelBudget
+from figma_progress import _format_duration
+from figma_render_cache import default_cache_dir
+
+# 没有历史记录时的估算速率
+DEFAULT_RENDER_SEC_PER_MP = 0.4
+DEFAULT_DOWNLOAD_BYTES_PER_SEC = 5 * 1024 * 1024
+DEFAULT_BYTES_PER_PIXEL = {"png": 1.0, "jpg": 0.25, "svg": 0.05, "pdf": 0.1}
+# 每次渲染请求的固定开销（秒）
+RENDER_CALL_OVERHEAD_SEC = 1.5
+
+
+class TimingHistory:
+    """
+    节点的历史渲染/下载耗时与大小（线程安全），持久化到缓存目录的 timings.json。
+
+    nodes[key] = {"render_sec", "download_sec", "bytes"}
+    totals     = 各项累计，用于推算没有记录的节点
+    """
+
+    def __init__(self, path: Path | None = None, persist: bool = True):
+        self.path = Path(path) if path else default_cache_dir() / "timings.json"
+        self.persist = persist
+        self._lock = threading.Lock()
+        self._nodes: dict[str, dict] = {}
+        self._totals = {"render_sec": 0.0, "render_px": 0, "download_sec": 0.0, "bytes": 0, "bytes_px": 0}
+        self._dirty = False
+        if persist:
+            self._load()
+
+    @staticmethod
+    def make_key(file_key: str, node_id: str, scale, fmt: str) -> str:
+        return "|".join([file_key, node_id, f"{float(scale):g}", fmt.lower()])
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._nodes = {k: v for k, v in (data.get("nodes") or {}).items() if isinstance(v, dict)}
+        for k, v in (data.get("totals") or {}).items():
+            if k in self._totals and isinstance(v, (int, float)):
+                self._totals[k] = v
+
+    def record(self, file_key: str, node_id: str, scale, fmt: str, pixels: int = 0,
+               render_sec: float | None = None, download_sec: float | None = None, size: int | None = None) -> None:
+        key = self.make_key(file_key, node_id, scale, fmt)
+        with self._lock:
+            entry = self._nodes.setdefault(key, {})
+            if render_sec is not None:
+                entry["render_sec"] = round(render_sec, 3)
+                if pixels:
+                    self._totals["render_sec"] += render_sec
+                    self._totals["render_px"] += pixels
+            if download_sec is not None and size:
+                entry["download_sec"] = round(download_sec, 3)
+                self._totals["download_sec"] += download_sec
+            if size:
+                entry["bytes"] = size
+                self._totals["bytes"] += size
+                if pixels:
+                    self._totals["bytes_px"] += pixels
+            self._dirty = True
+
+    def _rates(self, fmt: str) -> tuple[float, float, float]:
+        t = self._totals
+        sec_per_mp = t["render_sec"] / (t["render_px"] / 1e6) if t["render_px"] else DEFAULT_RENDER_SEC_PER_MP
+        bytes_per_px = t["bytes"] / t["bytes_px"] if t["bytes_px"] else DEFAULT_BYTES_PER_PIXEL.get(fmt, 1.0)
+        bytes_per_sec = t["bytes"] / t["download_sec"] if t["download_sec"] > 0 else DEFAULT_DOWNLOAD_BYTES_PER_SEC
+        return sec_per_mp, bytes_per_px, bytes_per_sec
+
+    def estimate(self, file_key: str, node_id: str, scale, fmt: str, pixels: int) -> dict:
+        """返回 {"render_sec", "download_sec", "bytes", "known"}，known 表示有该节点的实测记录。"""
+        with self._lock:
+            entry = self._nodes.get(self.make_key(file_key, node_id, scale, fmt), {})
+            sec_per_mp, bytes_per_px, bytes_per_sec = self._rates(fmt)
+        size = entry.get("bytes") or int(pixels * bytes_per_px)
+        return {
+            "render_sec": entry.get("render_sec", pixels / 1e6 * sec_per_mp),
+            "download_sec": entry.get("download_sec", size / bytes_per_sec),
+            "bytes": size,
+            "known": bool(entry),
+        }
+
+    def save(self) -> None:
+        """原子写回；失败只打印警告。"""
+        if not self.persist:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {"nodes": dict(self._nodes), "totals": dict(self._totals)}
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️  耗时记录写入失败 {self.path}: {e}")
+
+
+def node_costs(history: TimingHistory, file_key: str, node_ids: list[str], pixels: dict[str, int],
+               scale, fmt: str) -> dict[str, dict]:
+    """每个节点的估算 {render_sec, download_sec, bytes, known, cost}，cost = 渲染 + 下载秒数。"""
+    costs = {}
+    for nid in node_ids:
+        est = history.estimate(file_key, nid, scale, fmt, pixels.get(nid, 0))
+        est["cost"] = est["render_sec"] + est["download_sec"]
+        costs[nid] = est
+    return costs
+
+
+def largest_first(node_ids: list[str], costs: dict[str, dict]) -> list[str]:
+    """按估算代价从大到小排序（代价相同保持原顺序）。"""
+    return sorted(node_ids, key=lambda nid: -costs[nid]["cost"])
+
+
+def plan_export(node_ids: list[str], pixels: dict[str, int], costs: dict[str, dict], budget_pixels: int,
+                max_nodes: int, cached: set[str] | None = None, request_delay: float = 0.0) -> dict:
+    """
+    模拟一次导出（单个倍率）：按与实际运行相同的规则组批，不发任何请求。
+
+    返回 {"render_calls", "nodes", "cached", "known", "bytes", "render_sec", "download_sec", "largest"}。
+    """
+    cached = cached or set()
+    planner = BatchPlanner(largest_first(node_ids, costs), pixels, PixelBudget(budget_pixels), max_nodes)
+    calls = 0
+    render_sec = 0.0
+    while planner:
+        batch = planner.next_batch()
+        missing = [nid for nid in batch if nid not in cached]
+        if missing:
+            calls += 1
+            render_sec += sum(costs[nid]["render_sec"] for nid in missing) + RENDER_CALL_OVERHEAD_SEC + request_delay
+    return {
+        "render_calls": calls,
+        "nodes": len(node_ids),
+        "cached": sum(1 for nid in node_ids if nid in cached),
+        "known": sum(1 for nid in node_ids if costs[nid]["known"]),
+        "bytes": sum(costs[nid]["bytes"] for nid in node_ids),
+        "render_sec": render_sec,
+        "download_sec": sum(costs[nid]["download_sec"] for nid in node_ids),
+        "largest": largest_first(node_ids, costs)[:5],
+    }
+
+
+def print_plan(plans: dict, names: dict[str, str], extra_calls: int = 1, log=print) -> None:
+    """打印 --dry-run 计划。plans 为 {倍率: plan_export 结果}；extra_calls 为获取文件结构等固定请求数。"""
+    total_calls = extra_calls + sum(p["render_calls"] for p in plans.values())
+    total_bytes = sum(p["bytes"] for p in plans.values())
+    total_sec = sum(p["render_sec"] + p["download_sec"] for p in plans.values())
+    log("🧪 试运行（--dry-run），不会渲染或下载任何内容")
+    for scale, p in plans.items():
+        log(
+            f"   {float(scale):g}x: {p['nodes']} 个节点，渲染请求 {p['render_calls']} 次"
+            f"（已缓存 {p['cached']} 个，有历史耗时 {p['known']} 个），"
+            f"约 {p['bytes'] / 1024 / 1024:.1f} MB"
+        )
+        if p["largest"]:
+            log("      最先处理: " + "、".join(f"{names.get(nid, nid)} ({nid})" for nid in p["largest"]))
+    log(f"📋 预计 API 请求 {total_calls} 次 | 下载约 {total_bytes / 1024 / 1024:.1f} MB | 耗时约 {_format_duration(total_sec)}")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+空间模式节点选择
+对 /v1/files 返回的文档树建立内存索引（迭代遍历，不递归，深层文件也不会爆栈）：
+id → 父节点、所在页面、类型、名称、层级、包围盒。
+按页面正则、名称通配、节点类型、层级、仅组件、排除列表筛选，只把命中的节点交给 /v1/images 渲染。
+"""
+
+import fnmatch
+import re
+
+COMPONENT_TYPES = ("COMPONENT", "COMPONENT_SET")
+
+
+class NodeIndex:
+    """
+    文档树索引。
+
+    entries[id] = {
+        "id", "name", "type", "parent", "page", "page_id",
+        "depth",   # 页面直接子节点为 1
+        "bbox",    # absoluteBoundingBox，可能为 None
+        "node",    # 原始节点 dict
+    }
+    order: 文档顺序的 id 列表（页面本身不在其中）
+    """
+
+    def __init__(self, document: dict):
+        self.entries: dict[str, dict] = {}
+        self.children: dict[str, list[str]] = {}
+        self.pages: list[dict] = []
+        self.order: list[str] = []
+        self._build(document or {})
+
+    def _build(self, document: dict) -> None:
+        for page in document.get("children", []):
+            if page.get("type") != "CANVAS" or not page.get("id"):
+                continue
+            self.pages.append(page)
+            page_name = page.get("name") or "Page"
+            # 逆序入栈，出栈顺序即文档顺序
+            stack = [(child, page["id"], 1) for child in reversed(page.get("children", []))]
+            self.children[page["id"]] = [c.get("id") for c in page.get("children", []) if c.get("id")]
+            while stack:
+                node, parent_id, depth = stack.pop()
+                nid = node.get("id")
+                if not nid:
+                    continue
+                kids = node.get("children", [])
+                self.entries[nid] = {
+                    "id": nid,
+                    "name": node.get("name", "unnamed"),
+                    "type": node.get("type", ""),
+                    "parent": parent_id,
+                    "page": page_name,
+                    "page_id": page["id"],
+                    "depth": depth,
+                    "bbox": node.get("absoluteBoundingBox"),
+                    "node": node,
+                }
+                self.order.append(nid)
+                self.children[nid] = [c.get("id") for c in kids if c.get("id")]
+                for child in reversed(kids):
+                    stack.append((child, nid, depth + 1))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, node_id: str) -> dict | None:
+        return self.entries.get(node_id)
+
+    def ancestors(self, node_id: str) -> list[dict]:
+        """从顶级节点到父节点的链（不含页面与自身）。"""
+        chain = []
+        entry = self.entries.get(node_id)
+        while entry and entry["parent"] in self.entries:
+            entry = self.entries[entry["parent"]]
+            chain.append(entry)
+        return list(reversed(chain))
+
+    def name_path(self, node_id: str) -> str:
+        """顶级节点到该节点的名称路径，如 'Frame/Card/Icon'。"""
+        names = [e["name"] for e in self.ancestors(node_id)]
+        names.append(self.entries[node_id]["name"])
+        return "/".join(names)
+
+    def descendants(self, node_id: str) -> list[dict]:
+        """该节点之下的所有节点（文档顺序，不含自身）。"""
+        result = []
+        stack = list(reversed(self.children.get(node_id, [])))
+        while stack:
+            nid = stack.pop()
+            entry = self.entries.get(nid)
+            if not entry:
+                continue
+            result.append(entry)
+            stack.extend(reversed(self.children.get(nid, [])))
+        return result
+
+    def image_fills(self, node_id: str) -> list[tuple[str, str]]:
+        """该节点及其子树中所有图片填充，返回 [(持有填充的节点 id, imageRef), ...]（文档顺序、去重）。"""
+        found = {}
+        for entry in [self.entries[node_id]] + self.descendants(node_id):
+            node = entry["node"]
+            for paint in (node.get("fills") or []) + (node.get("background") or []):
+                if isinstance(paint, dict) and paint.get("type") == "IMAGE" and paint.get("imageRef"):
+                    found[(entry["id"], paint["imageRef"])] = None
+        return list(found)
+
+    def select(
+        self,
+        page_pattern: str | None = None,
+        names: list[str] | None = None,
+        types: list[str] | None = None,
+        max_depth: int = 1,
+        components_only: bool = False,
+        exclude: list[str] | None = None,
+    ) -> list[dict]:
+        """
+        按条件筛选节点，返回文档顺序的条目列表。
+
+        - page_pattern: 页面名正则（re.search）
+        - names: 节点名通配（fnmatch，任一命中即可）
+        - types: 节点类型，如 ["FRAME", "COMPONENT"]
+        - max_depth: 最大层级，1 = 每页顶级节点（默认，与原行为一致）
+        - components_only: 只要 COMPONENT / COMPONENT_SET
+        - exclude: 排除的名称通配或节点 id；命中的节点连同其子树一起排除
+        """
+        page_re = re.compile(page_pattern) if page_pattern else None
+        type_set = {t.upper() for t in types} if types else None
+        excluded_ids = set()
+        result = []
+        for nid in self.order:
+            entry = self.entries[nid]
+            if entry["parent"] in excluded_ids:
+                excluded_ids.add(nid)
+                continue
+            if exclude and (nid in exclude or any(fnmatch.fnmatchcase(entry["name"], p) for p in exclude)):
+                excluded_ids.add(nid)
+                continue
+            if entry["depth"] > max_depth:
+                continue
+            if page_re and not page_re.search(entry["page"]):
+                continue
+            if type_set and entry["type"] not in type_set:
+                continue
+            if components_only and entry["type"] not in COMPONENT_TYPES:
+                continue
+            if names and not any(fnmatch.fnmatchcase(entry["name"], p) for p in names):
+                continue
+            result.append(entry)
+        return result
+
+
+def _split_list(values: list[str] | None) -> list[str] | None:
+    """把可重复、可逗号分隔的参数展开成列表。"""
+    if not values:
+        return None
+    items = [v.strip() for value in values for v in value.split(",")]
+    return [v for v in items if v] or None
+
+
+def add_selection_arguments(parser, default_types: str | None = None) -> None:
+    """给 argparse 添加节点筛选参数（两个下载脚本共用）。"""
+    group = parser.add_argument_group("空间模式节点筛选")
+    group.add_argument("--page", metavar="REGEX", help="只导出页面名匹配该正则的页面")
+    group.add_argument("--name", action="append", metavar="GLOB", help="只导出名称匹配通配符的节点，可重复或逗号分隔")
+    group.add_argument(
+        "--types",
+        action="append",
+        metavar="TYPE",
+        help=f"只导出这些节点类型，如 FRAME,COMPONENT,INSTANCE（默认：{default_types or '全部'}）",
+    )
+    group.add_argument("--depth", type=int, default=1, help="最大层级，1 = 每页顶级节点（默认 1）")
+    group.add_argument("--components-only", action="store_true", help="只导出组件（COMPONENT / COMPONENT_SET）")
+    group.add_argument("--exclude", action="append", metavar="GLOB_OR_ID", help="排除名称匹配或指定 id 的节点（含其子树），可重复")
+
+
+def selection_from_args(args, default_types: list[str] | None = None) -> dict:
+    """argparse 结果 → NodeIndex.select 的关键字参数。"""
+    return {
+        "page_pattern": args.page,
+        "names": _split_list(args.name),
+        "types": _split_list(args.types) or default_types,
+        "max_depth": max(1, args.depth),
+        "components_only": args.components_only,
+        "exclude": _split_list(args.exclude),
+    }
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+SVG 后处理（--format svg 时默认开启，--no-svg-optimize 关闭）
+Figma 导出的 SVG 原样保存时带着多余的 id、未使用的 <defs>、全精度坐标和重复的内联路径；
+这里在进程池中逐个文件精简（与后续下载并行），每个文件打印处理前后大小，结束时汇总：
+
+- 几何属性（d / points / x / y / transform ...）按 --svg-precision 位小数取整，路径数据去掉多余分隔符
+- 删除未被引用的 id 与 <defs> 中未使用的定义，合并内容相同的定义并改写 url(#id) / href 引用
+- 同一文件中重复出现的长路径移入 <defs>，原位置改为 <use>
+- 去掉注释、XML 声明与空白文本
+
+SVG 是矢量格式，不会再上传 TinyPNG。只依赖标准库；解析失败或结果反而更大时保留原文件。
+"""
+
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from figma_transcode import ProcessPoolStage
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XLINK_HREF = f"{{{XLINK_NS}}}href"
+DEFAULT_PRECISION = 3
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+# 按精度取整的几何属性（根元素的 width / height / viewBox 决定画布尺寸，保持原样）
+GEOMETRY_ATTRS = frozenset({
+    "d", "points", "x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry", "fx", "fy",
+    "width", "height", "stroke-width", "stdDeviation", "dx", "dy",
+})
+# 变换矩阵里的缩放/旋转分量按有效数字取整：scale(0.00390625) 这类小系数按固定小数位会丢精度，
+# 放大到大坐标的内容上就会明显变形（平移分量仍至少保留 precision 位小数）
+TRANSFORM_ATTRS = frozenset({"transform", "gradientTransform", "patternTransform"})
+TRANSFORM_SIGNIFICANT_DIGITS = 6
+# 文本内容中的空白有意义，不做处理
+TEXT_TAGS = frozenset({"text", "tspan", "textPath", "style", "script"})
+# 重复路径至少这么长才值得换成 <use>
+MIN_SHARED_PATH = 64
+
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_PATH_SEPARATORS = re.compile(r"[\s,]*")
+# 每个路径命令一组参数的个数；同一命令后可以连续跟多组参数
+_PATH_PARAMS = {"m": 2, "l": 2, "t": 2, "h": 1, "v": 1, "c": 6, "s": 4, "q": 4, "a": 7, "z": 0}
+# 弧线命令的第 4、5 个参数是单个字符的标志位（0 / 1），可以与后面的数字紧挨着写：a1 1 0 011 1
+_ARC_FLAG_SLOTS = (3, 4)
+_URL_REF = re.compile(r"url\(\s*['\"]?#([^'\")\s]+)['\"]?\s*\)")
+
+
+def _local(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _format_number(value: float, precision: int, short: bool = False) -> str:
+    text = f"{round(value, precision):.{precision}f}".rstrip("0").rstrip(".") if precision > 0 else f"{round(value):d}"
+    if text in ("-0", ""):
+        text = "0"
+    if short:
+        # 0.5 → .5，-0.5 → -.5
+        if text.startswith("0.") and len(text) > 2:
+            text = text[1:]
+        elif text.startswith("-0.") and len(text) > 3:
+            text = "-" + text[2:]
+    return text
+
+
+def _format_significant(value: float, digits: int, precision: int) -> str:
+    """保留 digits 位有效数字（且至少 precision 位小数），不使用科学计数法。"""
+    if value == 0:
+        return "0"
+    integer_digits = math.floor(math.log10(abs(value))) + 1
+    decimals = max(precision, digits - integer_digits)
+    return _format_number(value, decimals)
+
+
+def round_numbers(value: str, precision: int) -> str:
+    """把属性值中的每个数字按 precision 位小数取整（保留原有分隔符与单位）。"""
+    return _NUMBER.sub(lambda m: _format_number(float(m.group()), precision), value)
+
+
+def round_transform(value: str, precision: int) -> str:
+    """变换列表中的每个数字按 TRANSFORM_SIGNIFICANT_DIGITS 位有效数字取整。"""
+    return _NUMBER.sub(
+        lambda m: _format_significant(float(m.group()), TRANSFORM_SIGNIFICANT_DIGITS, precision), value)
+
+
+def _path_tokens(d: str) -> list[tuple[str, bool]]:
+    """
+    按命令逐个参数切分路径数据，返回 [(命令字母或参数, 是否为弧线标志位)]。
+    弧线标志位只占一个字符，不能当普通数字匹配（否则 011 会被读成一个数）；格式不正确时抛出 ValueError。
+    """
+    tokens = []
+    command, index, pos = "", 0, 0
+    while True:
+        pos = _PATH_SEPARATORS.match(d, pos).end()
+        if pos >= len(d):
+            return tokens
+        char = d[pos]
+        if char.lower() in _PATH_PARAMS:
+            command, index = char.lower(), 0
+            tokens.append((char, False))
+            pos += 1
+            continue
+        count = _PATH_PARAMS.get(command, 0)
+        if not count:
+            raise ValueError(f"路径数据格式不正确: {d[pos:pos + 20]!r}")
+        if command == "a" and index % count in _ARC_FLAG_SLOTS:
+            if char not in "01":
+                raise ValueError(f"弧线标志位只能是 0 或 1: {d[pos:pos + 20]!r}")
+            tokens.append((char, True))
+            pos += 1
+        else:
+            match = _NUMBER.match(d, pos)
+            if not match:
+                raise ValueError(f"路径数据格式不正确: {d[pos:pos + 20]!r}")
+            tokens.append((match.group(), False))
+            pos = match.end()
+        index += 1
+
+
+def compact_path(d: str, precision: int) -> str:
+    """
+    取整路径数据并去掉多余分隔符：命令字母后不留空格，负号与 .5 这类数字前不需要分隔。
+    弧线标志位原样保留；路径数据无法解析时原样返回。
+    """
+    try:
+        tokens = _path_tokens(d)
+    except ValueError:
+        return d
+    out = []
+    prev = ""
+    for token, flag in tokens:
+        if token.isalpha():
+            out.append(token)
+            prev = token
+            continue
+        number = token if flag else _format_number(float(token), precision, short=True)
+        if prev and not prev.isalpha() and not number.startswith("-") and not (
+                number.startswith(".") and ("." in prev or "e" in prev or "E" in prev)):
+            out.append(" ")
+        out.append(number)
+        prev = number
+    return "".join(out)
+
+
+def _iter_refs(root):
+    """产出 (元素, 属性名, 被引用的 id)。"""
+    for elem in root.iter():
+        for name, value in elem.attrib.items():
+            if name in ("href", XLINK_HREF):
+                if value.startswith("#"):
+                    yield elem, name, value[1:]
+            else:
+                for match in _URL_REF.finditer(value):
+                    yield elem, name, match.group(1)
+
+
+def _referenced_ids(root) -> set[str]:
+    ids = {ref for _, _, ref in _iter_refs(root)}
+    for elem in root.iter():
+        if _local(elem.tag) in ("style", "script") and elem.text:
+            # <style> 里的 #id 选择器也算引用
+            ids.update(re.findall(r"#([A-Za-z_][\w.-]*)", elem.text))
+    return ids
+
+
+def _rewrite_refs(root, mapping: dict[str, str]) -> None:
+    for elem in root.iter():
+        for name, value in list(elem.attrib.items()):
+            if name in ("href", XLINK_HREF):
+                if value.startswith("#") and value[1:] in mapping:
+                    elem.set(name, "#" + mapping[value[1:]])
+            elif "url(" in value:
+                elem.set(name, _URL_REF.sub(
+                    lambda m: f"url(#{mapping.get(m.group(1), m.group(1))})", value))
+
+
+def _defs(root) -> list:
+    return [elem for elem in root.iter() if _local(elem.tag) == "defs"]
+
+
+def _canonical(elem) -> tuple:
+    """元素内容的比较键（忽略 id 与空白）。"""
+    attrs = tuple(sorted((k, v) for k, v in elem.attrib.items() if k != "id"))
+    text = (elem.text or "").strip()
+    return elem.tag, attrs, text, tuple(_canonical(child) for child in elem)
+
+
+def _round_attributes(root, precision: int) -> None:
+    for elem in root.iter():
+        if elem is root:
+            continue
+        for name, value in list(elem.attrib.items()):
+            if name == "d":
+                elem.set(name, compact_path(value, precision))
+            elif name == "points":
+                elem.set(name, " ".join(_format_number(float(n), precision) for n in _NUMBER.findall(value)))
+            elif name in GEOMETRY_ATTRS:
+                elem.set(name, round_numbers(value, precision))
+            elif name in TRANSFORM_ATTRS:
+                elem.set(name, round_transform(value, precision))
+
+
+def _dedupe_defs(root) -> bool:
+    """合并 <defs> 中内容相同的定义，返回是否有改动。"""
+    mapping = {}
+    for defs in _defs(root):
+        seen = {}
+        for child in list(defs):
+            child_id = child.get("id")
+            if not child_id:
+                continue
+            key = _canonical(child)
+            if key in seen:
+                mapping[child_id] = seen[key]
+                defs.remove(child)
+            else:
+                seen[key] = child_id
+    if mapping:
+        _rewrite_refs(root, mapping)
+    return bool(mapping)
+
+
+def _drop_unused(root) -> bool:
+    """删除未被引用的定义与 id，返回是否有改动。"""
+    used = _referenced_ids(root)
+    changed = False
+    for defs in _defs(root):
+        for child in list(defs):
+            if child.get("id") not in used and _local(child.tag) not in ("style", "script"):
+                defs.remove(child)
+                changed = True
+    for elem in root.iter():
+        if "id" in elem.attrib and elem.get("id") not in used:
+            del elem.attrib["id"]
+            changed = True
+    return changed
+
+
+def _drop_empty_defs(root) -> None:
+    for parent in root.iter():
+        for child in list(parent):
+            if _local(child.tag) == "defs" and len(child) == 0:
+                parent.remove(child)
+
+
+def _share_paths(root) -> None:
+    """把重复出现的长路径移入 <defs>，原位置改为 <use xlink:href>（其余属性留在 <use> 上继承）。"""
+    in_defs = {id(elem) for defs in _defs(root) for elem in defs.iter()}
+    groups: dict[str, list] = {}
+    for parent in root.iter():
+        for index, child in enumerate(parent):
+            if _local(child.tag) == "path" and id(child) not in in_defs and len(child.get("d", "")) >= MIN_SHARED_PATH:
+                groups.setdefault(child.get("d"), []).append((parent, index, child))
+    taken = {elem.get("id") for elem in root.iter() if elem.get("id")}
+    counter = 0
+    for d, uses in groups.items():
+        # 每处 <use> 约多 30 字节，定义本身约 20 字节：省下的路径数据要多于这些开销
+        if len(uses) < 2 or (len(uses) - 1) * len(d) <= len(uses) * 30 + 20:
+            continue
+        while f"p{counter}" in taken:
+            counter += 1
+        path_id = f"p{counter}"
+        taken.add(path_id)
+        defs = _defs(root)
+        if not defs:
+            # 追加在末尾（与 Figma 的输出一致），不影响已记录的子元素下标
+            defs = [ET.SubElement(root, f"{{{SVG_NS}}}defs")]
+        ET.SubElement(defs[0], f"{{{SVG_NS}}}path", {"id": path_id, "d": d})
+        for parent, index, child in uses:
+            attrs = {k: v for k, v in child.attrib.items() if k != "d"}
+            attrs[XLINK_HREF] = f"#{path_id}"
+            use = ET.Element(f"{{{SVG_NS}}}use", attrs)
+            use.tail = child.tail
+            parent[index] = use
+
+
+def _strip_whitespace(elem) -> None:
+    if _local(elem.tag) in TEXT_TAGS:
+        return
+    if elem.text is not None and not elem.text.strip():
+        elem.text = None
+    for child in elem:
+        if child.tail is not None and not child.tail.strip():
+            child.tail = None
+        _strip_whitespace(child)
+
+
+def minify_svg(text: str, precision: int = DEFAULT_PRECISION) -> str:
+    """精简一份 SVG 文本；无法解析时原样返回。"""
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError:
+        return text
+    if _local(root.tag) != "svg":
+        return text
+    _strip_whitespace(root)
+    _round_attributes(root, precision)
+    # 合并与删除会互相产生新的机会（合并后被引用的定义变少，删除后父定义可能变得相同），重复到稳定
+    while _dedupe_defs(root) | _drop_unused(root):
+        pass
+    _share_paths(root)
+    _drop_empty_defs(root)
+    return ET.tostring(root, encoding="unicode")
+
+
+def optimize_svg_bytes(data: bytes, precision: int = DEFAULT_PRECISION) -> bytes:
+    """精简 SVG 字节（在工作进程中执行）；结果不比原来小时返回原字节。"""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data
+    out = minify_svg(text, precision).encode("utf-8")
+    return out if len(out) < len(data) else data
+
+
+def optimize_svg_file(src: str, precision: int = DEFAULT_PRECISION) -> tuple[str, int, int]:
+    """原地精简一个 SVG 文件（在工作进程中执行），返回 (路径, 原大小, 精简后大小)。"""
+    path = Path(src)
+    data = path.read_bytes()
+    out = optimize_svg_bytes(data, precision)
+    if out is not data:
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(out)
+        os.replace(tmp, path)
+    return str(path), len(data), len(out)
+
+
+class SvgOptimizer(ProcessPoolStage):
+    """
+    进程池 SVG 精简：原地改写文件，输出路径不变。
+
+        with SvgOptimizer(precision=3) as optimizer:
+            optimizer.submit(path)
+    """
+
+    icon = "🧹"
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, jobs: int | None = None, root: Path | None = None,
+                 log=print):
+        super().__init__(jobs, root, log)
+        self.precision = max(0, int(precision))
+
+    def _file_task(self, path: Path) -> tuple:
+        return optimize_svg_file, str(path), self.precision
+
+    def _bytes_task(self, data: bytes) -> tuple:
+        return optimize_svg_bytes, data, self.precision
+
+    def _summary_title(self) -> str:
+        return f"SVG 精简（{self.precision} 位小数）"
+
+
+def add_svg_arguments(parser) -> None:
+    """给 argparse 添加 SVG 后处理参数。"""
+    group = parser.add_argument_group("SVG 后处理")
+    group.add_argument(
+        "--no-svg-optimize",
+        action="store_true",
+        help="--format svg 时保留 Figma 原始输出，不做精简",
+    )
+    group.add_argument(
+        "--svg-precision",
+        type=int,
+        default=DEFAULT_PRECISION,
+        help=f"SVG 坐标保留的小数位数（默认 {DEFAULT_PRECISION}）",
+    )
+
+
+def svg_optimizer_from_args(args, root: Path | None = None) -> SvgOptimizer | None:
+    """argparse 结果 → SvgOptimizer；不是 SVG 导出或指定了 --no-svg-optimize 时返回 None。"""
+    if args.format != "svg" or args.no_svg_optimize:
+        return None
+    return SvgOptimizer(precision=args.svg_precision, root=root)
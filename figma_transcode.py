@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+WebP / AVIF 转码（--transcode webp|avif）
+Figma 只能渲染 PNG/JPG/SVG/PDF；同样的 @3x 资源，WebP 通常只有 PNG 的 1/3–1/5。
+下载线程每写完一张图就交给进程池转码，转码与后续下载并行；
+每个文件打印转码前后大小，结束时汇总节省的字节数。
+依赖 Pillow（WebP 内置；AVIF 需要 Pillow ≥ 11.2 或 pillow-avif-plugin）。
+"""
+
+import abc
+import io
+import os
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+TRANSCODE_FORMATS = ("webp", "avif")
+DEFAULT_QUALITY = 80
+# WebP 编码速度/体积权衡：6 最慢但体积最小（在进程池中执行，不拖慢下载）
+WEBP_METHOD = 6
+AVIF_SPEED = 6
+
+
+def codec_available(fmt: str) -> bool:
+    """本地 Pillow 是否能编码 fmt（webp / avif）。"""
+    try:
+        from PIL import features
+    except ImportError:
+        return False
+    if fmt == "avif":
+        try:
+            import pillow_avif  # noqa: F401  旧版 Pillow 通过插件支持 AVIF
+            return True
+        except ImportError:
+            pass
+    try:
+        return bool(features.check(fmt))
+    except ValueError:
+        return False
+
+
+def transcoded_path(path: Path, fmt: str) -> Path:
+    """转码后的输出路径：同目录同名，扩展名换成 .webp / .avif。"""
+    return Path(path).with_suffix(f".{fmt}")
+
+
+def transcode_bytes(data: bytes, fmt: str, quality: int = DEFAULT_QUALITY, lossless: bool = False) -> bytes:
+    """把 PNG/JPG 字节转码为 WebP/AVIF（在工作进程中执行）。"""
+    if fmt == "avif":
+        try:
+            import pillow_avif  # noqa: F401
+        except ImportError:
+            pass
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("P", "PA") else "RGB")
+        out = io.BytesIO()
+        if fmt == "webp":
+            img.save(out, "WEBP", lossless=lossless, quality=100 if lossless else quality, method=WEBP_METHOD)
+        elif fmt == "avif":
+            # AVIF 没有真正的无损模式，lossless 时使用最高质量
+            img.save(out, "AVIF", quality=100 if lossless else quality, speed=AVIF_SPEED)
+        else:
+            raise ValueError(f"不支持的转码格式: {fmt}")
+    return out.getvalue()
+
+
+def transcode_file(src: str, fmt: str, quality: int, lossless: bool, keep_original: bool) -> tuple[str, int, int]:
+    """转码一个文件（在工作进程中执行），返回 (输出路径, 原大小, 转码后大小)。"""
+    src_path = Path(src)
+    data = src_path.read_bytes()
+    out = transcode_bytes(data, fmt, quality, lossless)
+    dst = transcoded_path(src_path, fmt)
+    tmp = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(out)
+    os.replace(tmp, dst)
+    if not keep_original and dst != src_path:
+        src_path.unlink(missing_ok=True)
+    return str(dst), len(data), len(out)
+
+
+def _ignore_sigint() -> None:
+    """工作进程忽略 Ctrl+C，由主进程统一收尾（否则空闲的工作进程会各自打印 KeyboardInterrupt）。"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _format_size(size: int) -> str:
+    return f"{size / 1024 / 1024:.2f} MB" if size >= 1024 * 1024 else f"{size / 1024:.1f} KB"
+
+
+class ProcessPoolStage(abc.ABC):
+    """
+    下载后的进程池处理阶段（转码、SVG 优化共用）：下载线程每拿到一张图就 submit，处理与后续下载并行。
+
+        with stage:
+            stage.submit(path)                 # 写好的文件，处理结果写到 stage.target(path)
+            stage.submit_bytes(data, on_done)  # 内存中的图片（归档模式）：on_done(处理后的字节)
+            stage.wait()                       # 等待已提交的任务完成
+        # 退出时打印汇总
+
+    子类必须实现 _file_task()、_bytes_task() 与 _summary_title()（缺少时实例化即报错），
+    输出路径改变时覆盖 target()。
+    """
+
+    icon = "🔁"
+
+    def __init__(self, jobs: int | None = None, root: Path | None = None, log=print):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.root = Path(root) if root else None
+        self.log = log
+        self._pool = None
+        self._cond = threading.Condition()
+        self._pending = 0
+        self.files = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def target(self, path: Path) -> Path:
+        """处理后的输出路径。"""
+        return Path(path)
+
+    @abc.abstractmethod
+    def _file_task(self, path: Path) -> tuple:
+        """(工作进程函数, 参数...)，函数返回 (输出路径, 原大小, 处理后大小)。"""
+
+    @abc.abstractmethod
+    def _bytes_task(self, data: bytes) -> tuple:
+        """(工作进程函数, 参数...)，函数返回处理后的字节。"""
+
+    @abc.abstractmethod
+    def _summary_title(self) -> str:
+        """汇总与失败信息中的阶段名称。"""
+
+    def _label(self, path: Path) -> str:
+        path = Path(path)
+        if self.root is not None:
+            try:
+                return path.relative_to(self.root).as_posix()
+            except ValueError:
+                pass
+        return path.name
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_ignore_sigint)
+        return self._pool
+
+    def _submit(self, fn, *args, on_result: Callable, label: str) -> Future:
+        with self._cond:
+            self._pending += 1
+        future = self._executor().submit(fn, *args)
+
+        def done(f: Future) -> None:
+            try:
+                on_result(f.result())
+            except Exception as e:
+                with self._cond:
+                    self.failed += 1
+                self.log(f"   ❌ {self._summary_title()}失败 {label}: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+        future.add_done_callback(done)
+        return future
+
+    def _record(self, label: str, before: int, after: int) -> None:
+        with self._cond:
+            self.files += 1
+            self.bytes_before += before
+            self.bytes_after += after
+        saved = (1 - after / before) * 100 if before else 0.0
+        target = self.target(Path(label)).suffix
+        arrow = f" → {target}" if target != Path(label).suffix else ""
+        self.log(f"   {self.icon} {label}{arrow}: {_format_size(before)} → {_format_size(after)}（{-saved:+.1f}%）")
+
+    def submit(self, path: Path) -> Future:
+        """处理已写入的文件（失败时保留原文件）。"""
+        label = self._label(path)
+
+        def on_result(result: tuple[str, int, int]) -> None:
+            self._record(label, result[1], result[2])
+
+        return self._submit(*self._file_task(path), on_result=on_result, label=label)
+
+    def submit_bytes(self, data: bytes, on_done: Callable[[bytes], None], label: str = "") -> Future:
+        """处理内存中的图片，完成后在回调线程中调用 on_done(处理后的字节)。"""
+        def on_result(out: bytes) -> None:
+            self._record(label, len(data), len(out))
+            on_done(out)
+
+        return self._submit(*self._bytes_task(data), on_result=on_result, label=label)
+
+    def wait(self) -> None:
+        """等待已提交的任务全部完成（含完成回调）。"""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+
+    def print_summary(self) -> None:
+        """打印并清零本轮汇总（没有处理任何文件时不打印）。"""
+        with self._cond:
+            files, failed, before, after = self.files, self.failed, self.bytes_before, self.bytes_after
+            self.files = self.failed = self.bytes_before = self.bytes_after = 0
+        if not files and not failed:
+            return
+        saved = before - after
+        ratio = saved / before * 100 if before else 0.0
+        failed_desc = f"，失败 {failed} 个" if failed else ""
+        change = f"节省 {_format_size(saved)}（{ratio:.1f}%）" if saved >= 0 else f"增大 {_format_size(-saved)}（{-ratio:.1f}%）"
+        self.log(
+            f"{self.icon} {self._summary_title()}：{files} 个文件{failed_desc}，"
+            f"{_format_size(before)} → {_format_size(after)}，{change}"
+        )
+
+    def close(self) -> None:
+        self.wait()
+        self.print_summary()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) -> "ProcessPoolStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Transcoder(ProcessPoolStage):
+    """
+    进程池转码器：输出同名 .webp / .avif，默认转码成功后删除原图。
+
+        with Transcoder("webp", quality=80) as transcoder:
+            transcoder.submit(path)
+    """
+
+    def __init__(self, fmt: str, quality: int = DEFAULT_QUALITY, lossless: bool = False, keep_original: bool = False,
+                 jobs: int | None = None, root: Path | None = None, log=print):
+        if fmt not in TRANSCODE_FORMATS:
+            raise ValueError(f"不支持的转码格式: {fmt}（支持 {' / '.join(TRANSCODE_FORMATS)}）")
+        super().__init__(jobs, root, log)
+        self.fmt = fmt
+        self.quality = max(1, min(100, int(quality)))
+        self.lossless = lossless
+        self.keep_original = keep_original
+
+    def target(self, path: Path) -> Path:
+        return transcoded_path(path, self.fmt)
+
+    def _file_task(self, path: Path) -> tuple:
+        return transcode_file, str(path), self.fmt, self.quality, self.lossless, self.keep_original
+
+    def _bytes_task(self, data: bytes) -> tuple:
+        return transcode_bytes, data, self.fmt, self.quality, self.lossless
+
+    def _summary_title(self) -> str:
+        mode = "无损" if self.lossless else f"质量 {self.quality}"
+        return f"转码 {self.fmt.upper()}（{mode}）"
+
+
+def add_transcode_arguments(parser) -> None:
+    """给 argparse 添加转码参数（两个下载脚本共用）。"""
+    group = parser.add_argument_group("WebP / AVIF 转码")
+    group.add_argument(
+        "--transcode",
+        choices=TRANSCODE_FORMATS,
+        help="下载后在进程池中把 PNG/JPG 转码为 WebP 或 AVIF（与下载并行），并汇总节省的字节数",
+    )
+    group.add_argument(
+        "--transcode-quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f"有损转码质量 1–100（默认 {DEFAULT_QUALITY}）",
+    )
+    group.add_argument("--transcode-lossless", action="store_true", help="无损转码（WebP 无损；AVIF 使用最高质量）")
+    group.add_argument("--keep-original", action="store_true", help="转码后保留原 PNG/JPG 文件")
+
+
+def transcode_error(args, fmt: str) -> str | None:
+    """校验转码参数，返回错误信息；没有问题时返回 None。"""
+    if not args.transcode:
+        return None
+    if fmt not in ("png", "jpg"):
+        return f"--transcode 只适用于 png / jpg 导出（当前格式: {fmt}）"
+    if not codec_available(args.transcode):
+        if args.transcode == "avif":
+            return "本地 Pillow 不支持 AVIF 编码（需要 Pillow ≥ 11.2，或 pip install pillow-avif-plugin）"
+        return "本地 Pillow 不支持 WebP 编码（pip install Pillow）"
+    return None
+
+
+def transcoder_from_args(args, root: Path | None = None) -> Transcoder | None:
+    """argparse 结果 → Transcoder；未指定 --transcode 时返回 None。"""
+    if not args.transcode:
+        return None
+    return Transcoder(args.transcode, quality=args.transcode_quality, lossless=args.transcode_lossless,
+                      keep_original=args.keep_original, root=root)
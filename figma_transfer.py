@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+CDN 断点续传下载
+中断后用 Range 请求从已写入的字节继续，不再从 0 开始；
+用 Content-Range 总长度与 ETag（If-Range）校验续传的是同一份内容，不一致时从头下载。
+下载到文件时，续传信息写在 <临时文件>.json 中，下次运行也能接着下。
+"""
+
+import json
+import time
+from pathlib import Path
+
+import requests
+
+from figma_http import http_session
+
+# 分块大小随文件大小自适应：小图 64 KB，大图最多 1 MB
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+# 可续传的网络错误（HTTP 状态错误不在此列，由调用方处理，例如 403 需要重新渲染）
+RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    OSError,
+)
+
+
+class IncompleteDownload(OSError):
+    """响应体比 Content-Length 短。"""
+
+
+class RangeMismatch(IncompleteDownload):
+    """续传的数据与本地已有部分对不上，需要从头下载。"""
+
+
+def adaptive_chunk_size(total: int) -> int:
+    """按总大小取分块：约 1/32 的文件大小，限制在 [64 KB, 1 MB]。"""
+    if total <= 0:
+        return MIN_CHUNK_SIZE * 4
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, total // 32))
+
+
+def _parse_content_range(value: str | None) -> tuple[int, int] | None:
+    """解析 'bytes start-end/total'，返回 (start, total)；总长度未知时 total 为 0。"""
+    if not value or not value.startswith("bytes "):
+        return None
+    try:
+        span, total = value[6:].split("/", 1)
+        start = int(span.split("-", 1)[0])
+        return start, (0 if total == "*" else int(total))
+    except ValueError:
+        return None
+
+
+class _FileSink:
+    """写入临时文件，续传信息持久化到旁边的 .json。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.meta_path = self.path.with_name(self.path.name + ".json")
+        self._fh = None
+
+    def load_state(self) -> tuple[int, dict]:
+        if not self.path.exists():
+            return 0, {}
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0, {}  # 没有校验信息的残留文件不能续传
+        return self.path.stat().st_size, meta
+
+    def save_state(self, meta: dict) -> None:
+        self.meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    def open(self, append: bool) -> None:
+        self._fh = open(self.path, "ab" if append else "wb")
+
+    def write(self, data: bytes) -> None:
+        self._fh.write(data)
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+    def finish(self) -> None:
+        self.meta_path.unlink(missing_ok=True)
+
+
+class _MemorySink:
+    """写入内存，仅在同一次调用的重试间续传。"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def load_state(self) -> tuple[int, dict]:
+        return 0, {}
+
+    def save_state(self, meta: dict) -> None:
+        pass
+
+    def open(self, append: bool) -> None:
+        if not append:
+            self.buffer.clear()
+
+    def write(self, data: bytes) -> None:
+        self.buffer.extend(data)
+
+    def close(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+def _fetch(url, sink, retries, retry_delay, timeout, on_progress, log) -> int:
+    have, meta = sink.load_state()
+    for attempt in range(1, retries + 1):
+        headers = {"Accept-Encoding": "identity"}
+        if have > 0:
+            headers["Range"] = f"bytes={have}-"
+            if meta.get("etag"):
+                headers["If-Range"] = meta["etag"]
+        try:
+            with http_session().get(url, headers=headers, stream=True, timeout=timeout) as resp:
+                if resp.status_code == 416:
+                    if have and have == meta.get("total"):
+                        sink.finish()
+                        return have  # 上次其实已下完
+                    raise RangeMismatch("服务器拒绝了续传范围")
+                resp.raise_for_status()
+
+                content_range = _parse_content_range(resp.headers.get("Content-Range"))
+                etag = resp.headers.get("ETag")
+                resumed = (
+                    resp.status_code == 206
+                    and have > 0
+                    and content_range is not None
+                    and content_range[0] == have
+                    and (not meta.get("total") or content_range[1] in (0, meta["total"]))
+                    and (not meta.get("etag") or not etag or etag == meta["etag"])
+                )
+                if resumed:
+                    total = meta.get("total") or content_range[1]
+                    log(f"   ↪️  从 {have / 1024:.1f} KB 处续传")
+                else:
+                    if resp.status_code == 206:
+                        raise RangeMismatch("服务器返回的分段与本地数据不匹配")
+                    have = 0
+                    total = int(resp.headers.get("Content-Length") or 0)
+                    meta = {"etag": etag, "total": total}
+                    sink.save_state(meta)
+
+                sink.open(append=resumed)
+                try:
+                    for block in resp.iter_content(chunk_size=adaptive_chunk_size(total)):
+                        if block:
+                            sink.write(block)
+                            have += len(block)
+                            if on_progress:
+                                on_progress(len(block), have, total)
+                finally:
+                    sink.close()
+
+            if total and have < total:
+                raise IncompleteDownload(f"只收到 {have}/{total} 字节")
+            if total and have > total:
+                raise RangeMismatch(f"收到 {have} 字节，超过 Content-Length {total}")
+            sink.finish()
+            return have
+        except requests.exceptions.HTTPError:
+            raise
+        except RESUMABLE_ERRORS as e:
+            if isinstance(e, RangeMismatch):
+                have, meta = 0, {}  # 本地数据不可信，下次从头下载
+            if attempt >= retries:
+                raise
+            delay = retry_delay * attempt
+            log(f"   ⚠️  下载中断: {e!r}，{delay} 秒后续传 ({attempt + 1}/{retries})")
+            time.sleep(delay)
+    return have
+
+
+def download_to_file(url: str, temp_path: Path, retries: int = 4, retry_delay: float = 2,
+                     timeout: float = 30, on_progress=None, log=print) -> int:
+    """
+    断点续传下载到 temp_path，返回总字节数。
+
+    - temp_path 已有上次中断留下的数据时直接续传（跨运行有效）
+    - 网络错误时按 retry_delay × 次数 等待后续传，HTTP 状态错误（如 403）直接抛出
+    - on_progress(本次字节数, 已下载, 总大小) 在每个分块写入后调用
+    """
+    temp_path = Path(temp_path)
+    temp_path.parent.mkdir(parents=True, exist_ok=True)
+    return _fetch(url, _FileSink(temp_path), retries, retry_delay, timeout, on_progress, log)
+
+
+def download_bytes(url: str, retries: int = 3, retry_delay: float = 10,
+                   timeout: float = 120, on_progress=None, log=print) -> bytes:
+    """断点续传下载到内存，重试时只请求尚未收到的部分。"""
+    sink = _MemorySink()
+    _fetch(url, sink, retries, retry_delay, timeout, on_progress, log)
+    return bytes(sink.buffer)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+监视模式（figmad --space URL --watch）
+让输出目录与 Figma 文件保持同步，代替 cron 定时重跑整个空间导出：
+每隔 --watch-interval 秒用 depth=1 的轻量请求查询文件版本（或收到 Figma webhook 时立即查询），
+版本变化时拉取最新文件结构，与上次快照逐个比较顶级画板（子树内容哈希），
+只重新导出新增/改动的画板，删除已不存在（或改名前）的画板文件。
+
+快照保存在输出目录的 .figmad-watch.json，重启监视后不会重新导出未变化的画板。
+API 地址取自 FIGMA_API_BASE，可以指向本地替身服务测试整个流程。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import download_figma_image as core
+from figma_client import FigmaError
+from figma_scales import variant_path
+from figma_selection import NodeIndex, selection_from_args
+
+SNAPSHOT_FILE = ".figmad-watch.json"
+DEFAULT_INTERVAL_SEC = 60.0
+DEFAULT_WEBHOOK_HOST = "127.0.0.1"
+# 触发重新检查的 Figma webhook 事件
+WEBHOOK_EVENTS = ("FILE_UPDATE", "FILE_VERSION_UPDATE")
+
+
+def _subtree_hash(node: dict) -> str:
+    payload = json.dumps(node, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def frame_fingerprints(document: dict, selection: dict | None = None) -> dict[str, dict]:
+    """
+    按与空间导出相同的筛选条件收集画板，返回 {node_id: {"hash", "name", "page", "with_id"}}。
+    with_id：与同页其他节点重名，文件名带 node id（core.space_name_clashes）。
+    """
+    index = NodeIndex(document)
+    nodes = core.collect_frame_nodes(index, selection)
+    clashes = core.space_name_clashes(nodes)
+    return {
+        node_id: {
+            "hash": _subtree_hash(index.get(node_id)["node"]), "name": name, "page": page,
+            "with_id": (core.sanitize_filename(page), core.sanitize_filename(name)) in clashes,
+        }
+        for node_id, name, page in nodes
+    }
+
+
+def diff_frames(old: dict[str, dict], new: dict[str, dict]) -> tuple[list[str], list[str]]:
+    """返回 (新增、改动或文件名变化的画板 id, 已删除的画板 id)。"""
+    changed = [
+        nid for nid, entry in new.items()
+        if old.get(nid, {}).get("hash") != entry["hash"] or old[nid].get("with_id", False) != entry["with_id"]
+    ]
+    removed = [nid for nid in old if nid not in new]
+    return changed, removed
+
+
+def parse_listen_address(value: str) -> tuple[str, int]:
+    """[HOST:]PORT → (host, port)，默认只监听本机。"""
+    host, _, port = value.rpartition(":")
+    return host or DEFAULT_WEBHOOK_HOST, int(port)
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    watcher: "FileWatcher"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            event = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        ok = self.watcher.on_webhook(event)
+        self.send_response(200 if ok else 403)
+        self.end_headers()
+
+
+class FileWatcher:
+    """
+    监视一个文件并把变化同步到输出目录。
+
+        watcher = FileWatcher(client, file_key, name, output_dir, args, scales, export_options)
+        watcher.run()        # 阻塞，Ctrl+C 结束
+    """
+
+    def __init__(self, client, file_key: str, name: str, output_dir: Path, args, scales, export_options: dict,
+                 interval: float = DEFAULT_INTERVAL_SEC, passcode: str | None = None, postprocessor=None):
+        self.client = client
+        self.file_key = file_key
+        self.name = name
+        self.output_dir = Path(output_dir)
+        self.args = args
+        self.scales = scales
+        self.export_options = export_options
+        self.interval = max(1.0, interval)
+        self.passcode = passcode
+        self.postprocessor = postprocessor
+        self.selection = selection_from_args(args)
+        self.snapshot_path = self.output_dir / SNAPSHOT_FILE
+        self.wake = threading.Event()
+        self.checks = 0
+        self.syncs = 0
+        self.snapshot = self._load_snapshot()
+
+    def _options(self) -> dict:
+        """影响输出文件的参数；与快照中记录的不同时整体重新导出。"""
+        return {
+            "scale": None if self.scales else self.args.scale,
+            "scales": list(self.scales or []),
+            "format": self.args.format,
+            "transcode": self.args.transcode,
+            "svg_precision": self.args.svg_precision if self.args.format == "svg" and not self.args.no_svg_optimize else None,
+            "selection": self.selection,
+        }
+
+    def _load_snapshot(self) -> dict:
+        try:
+            data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if data.get("file_key") != self.file_key or data.get("options") != self._options():
+            return {}
+        return data
+
+    def _save_snapshot(self) -> None:
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self.snapshot, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f"⚠️  监视快照写入失败 {self.snapshot_path}: {e}")
+
+    def output_files(self, entry: dict, node_id: str) -> list[Path]:
+        base = core.generate_space_output_filename(
+            entry["page"], entry["name"], node_id, None if self.scales else self.args.scale, self.args.format,
+            self.output_dir, with_id=entry.get("with_id", False)
+        )
+        paths = [variant_path(base, s) for s in self.scales] if self.scales else [base]
+        return [self.postprocessor.target(p) for p in paths] if self.postprocessor else paths
+
+    def on_webhook(self, event: dict) -> bool:
+        """处理 webhook 请求：校验 passcode，事件属于本文件时唤醒主循环；返回是否接受。"""
+        if self.passcode and event.get("passcode") != self.passcode:
+            return False
+        if event.get("file_key") == self.file_key and event.get("event_type") in WEBHOOK_EVENTS:
+            print(f"📨 收到 webhook {event.get('event_type')}，立即检查版本")
+            self.wake.set()
+        return True
+
+    def sync(self) -> bool:
+        """拉取最新文件结构，只重新导出有变化的画板；返回本轮是否全部同步成功。"""
+        try:
+            data = self.client.file(self.file_key, fresh=True)
+        except FigmaError as e:
+            print(f"❌ 错误: {e}")
+            return False
+        version = data.get("version")
+        old = self.snapshot.get("frames") or {}
+        new = frame_fingerprints(data["document"], self.selection)
+        changed, removed = diff_frames(old, new)
+        print(
+            f"🔄 [{time.strftime('%H:%M:%S')}] 版本 {self.snapshot.get('version') or '-'} → {version}："
+            f"{len(changed)} 个画板有变化，{len(removed)} 个已删除，{len(new) - len(changed)} 个未变"
+        )
+
+        synced = set()
+        if changed:
+            files = [(self.file_key, self.name, data, self.output_dir)]
+            core.run_space_export(self.client, files, self.args, self.scales, self.export_options,
+                                  only={self.file_key: set(changed)}, synced=synced, postprocessor=self.postprocessor)
+        synced_ids = {nid for _, nid in synced}
+
+        # 删除已不存在的画板，以及改名/换页后旧路径上的文件
+        stale = []
+        for nid in removed:
+            stale.extend(self.output_files(old[nid], nid))
+        for nid in synced_ids:
+            if nid in old:
+                current = set(self.output_files(new[nid], nid))
+                stale.extend(p for p in self.output_files(old[nid], nid) if p not in current)
+        deleted = 0
+        for path in stale:
+            if path.is_file() or path.is_symlink():
+                path.unlink()
+                deleted += 1
+        if deleted:
+            print(f"🗑️  删除 {deleted} 个过期文件")
+
+        # 导出失败的画板保留旧指纹，下一轮继续重试
+        frames = {nid: entry for nid, entry in new.items() if nid in synced_ids or nid not in changed}
+        for nid in changed:
+            if nid not in synced_ids and nid in old:
+                frames[nid] = old[nid]
+        failed = len(changed) - len(synced_ids & set(changed))
+        self.snapshot = {
+            "file_key": self.file_key,
+            "version": version if not failed else self.snapshot.get("version"),
+            "options": self._options(),
+            "frames": frames,
+        }
+        self._save_snapshot()
+        self.syncs += 1
+        if failed:
+            print(f"⚠️  {failed} 个画板导出失败，下一轮重试")
+        return not failed
+
+    def check(self) -> bool | None:
+        """查询一次版本，有变化时同步；返回 sync 的结果，版本未变或查询失败时返回 None。"""
+        self.checks += 1
+        version = self.client.version(self.file_key)
+        if version is None or version == self.snapshot.get("version"):
+            return None
+        return self.sync()
+
+    def _start_webhook(self, listen: str) -> ThreadingHTTPServer:
+        host, port = parse_listen_address(listen)
+        handler = type("WebhookHandler", (_WebhookHandler,), {"watcher": self})
+        server = ThreadingHTTPServer((host, port), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📨 webhook 监听: http://{host}:{server.server_address[1]}/（事件: {' / '.join(WEBHOOK_EVENTS)}）")
+        return server
+
+    def run(self, webhook: str | None = None, max_checks: int | None = None) -> bool:
+        """阻塞运行，直到 Ctrl+C（或完成 max_checks 次版本检查）；返回最后一轮是否同步成功。"""
+        server = self._start_webhook(webhook) if webhook else None
+        print(f"👀 监视中：每 {self.interval:g} 秒检查一次版本 → {self.output_dir}（Ctrl+C 结束）")
+        ok = True
+        try:
+            if not self.snapshot:
+                print("📸 没有上次的快照，先完整导出一次")
+                ok = self.sync()
+            else:
+                result = self.check()
+                ok = ok if result is None else result
+            while max_checks is None or self.checks < max_checks:
+                self.wake.wait(self.interval)
+                self.wake.clear()
+                result = self.check()
+                ok = ok if result is None else result
+        except KeyboardInterrupt:
+            print()
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        print(f"👋 已停止监视：检查 {self.checks} 次，同步 {self.syncs} 次")
+        return ok
@@ -12,17 +12,37 @@
 
 用法：
   python scripts/generate_level_icons.py
+  python scripts/generate_level_icons.py --jobs 0   # 多进程并行（0 = CPU 核数），输出与单进程逐字节一致
   # 输出：
   #   level_icons/level_001.png .. level_120.png         (1x, 135×60)
   #   level_icons/2.0x/level_001.png .. level_120.png    (2x, 270×120)
   #   level_icons/3.0x/level_001.png .. level_120.png    (3x, 405×180)
+
+  python scripts/generate_level_icons.py --atlas    # 精灵图模式：每个倍率一张图
+  # 输出：
+  #   level_icons/level_atlas.png                        (1x，10 列 × 12 行)
+  #   level_icons/2.0x/level_atlas.png
+  #   level_icons/3.0x/level_atlas.png
+  #   level_icons/level_atlas.json                       (等级 → 1x 逻辑坐标矩形，各倍率乘以倍数即可)
+
+增量生成：每个输出文件记录其输入哈希（配色、绘制代码与常量、字体文件、倍率、Pillow 版本）
+到 level_icons/.level_icons_manifest.json，只重画哈希变化或缺失的文件；--force 全部重画。
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import argparse
+import hashlib
+import inspect
+import json
 import math
+import os
 import sys
+import time
 
 try:
+    import PIL
     from PIL import Image, ImageDraw, ImageFont
 except ImportError:
     print("请先安装 Pillow: pip install Pillow", file=sys.stderr)
@@ -36,6 +56,20 @@ VARIANTS = [
     (2, "2.0x"),     # 2x 放在 2.0x/
     (3, "3.0x"),     # 3x 放在 3.0x/
 ]
+LEVELS = range(1, 121)
+# 精灵图：按等级顺序逐行排列，格子四周留透明边（1x 逻辑像素）防止采样串色
+ATLAS_NAME = "level_atlas"
+ATLAS_COLUMNS = 10
+ATLAS_PADDING = 2
+
+# 增量生成的输入哈希清单
+MANIFEST_NAME = ".level_icons_manifest.json"
+
+# 字体候选（依次尝试，macOS 优先）
+FONT_PATHS = [
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+]
 GOLD_BORDER = (0xD4, 0xA8, 0x4B)
 GOLD_STROKE = (0xFB, 0xBF, 0x24)
 WHITE = (0xFF, 0xFF, 0xFF)
@@ -51,9 +85,12 @@ SEGMENTS = [
 ]
 
 
+def segment_index(level: int) -> int:
+    return min(5, (level - 1) // 20)
+
+
 def segment_for_level(level: int):
-    idx = min(5, (level - 1) // 20)
-    return SEGMENTS[idx]
+    return SEGMENTS[segment_index(level)]
 
 
 def shield_verts(cx: float, cy: float, r: float):
@@ -87,21 +124,58 @@ def darken(rgb: tuple, amount: float) -> tuple:
     return tuple(max(0, int(c * (1 - amount))) for c in rgb)
 
 
-def draw_icon(level: int, scale: int = 1) -> Image.Image:
-    """绘制等级图标（盾形徽章+心形宝石+整图金边+右侧竖纹），与参考图风格一致。"""
+@lru_cache(maxsize=None)
+def find_font_path():
+    """第一个可用的字体文件路径；都不可用时为 None（使用 Pillow 默认字体）。"""
+    for path in FONT_PATHS:
+        try:
+            ImageFont.truetype(path, 12)
+            return path
+        except Exception:
+            continue
+    return None
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int):
+    """按字号缓存字体句柄。"""
+    path = find_font_path()
+    return ImageFont.truetype(path, size) if path else ImageFont.load_default()
+
+
+def icon_geometry(scale: int):
+    """与等级无关的版式参数。"""
     w, h = W * scale, H * scale
+    badge_w = w * 0.45
+    return {
+        "w": w,
+        "h": h,
+        "badge_w": badge_w,
+        "panel_w": w - badge_w,
+        "panel_left": int(badge_w),
+        "cx": badge_w * 0.5,
+        "cy": h * 0.5,
+        "badge_r": min(badge_w * 0.48, h * 0.42),
+        "radius": int(max(2, h * 0.18)),
+    }
+
+
+@lru_cache(maxsize=None)
+def static_layers(segment: int, scale: int):
+    """
+    按 (配色段, 倍率) 缓存的静态图层：同一段 20 个等级只画一次。
+
+    返回 (底图, 外框层)：底图含圆角底、竖纹、盾形徽章、心形宝石与高光；
+    外框层只有最外圈金色细边（透明背景），在数字之后叠加。
+    """
+    g = icon_geometry(scale)
+    w, h, radius = g["w"], g["h"], g["radius"]
+    bg_rgb, gem_rgb = SEGMENTS[segment]
+    cx, cy, badge_r = g["cx"], g["cy"], g["badge_r"]
+
     im = Image.new("RGBA", (w, h), (0, 0, 0, 0))
     draw = ImageDraw.Draw(im)
 
-    bg_rgb, gem_rgb = segment_for_level(level)
-    badge_w = w * 0.45
-    panel_w = w - badge_w
-    panel_left = int(badge_w)
-    cx, cy = badge_w * 0.5, h * 0.5
-    badge_r = min(badge_w * 0.48, h * 0.42)
-    corner_r = max(2, h * 0.18)
-    radius = int(corner_r)
-
     # 0) 整体圆角底
     if hasattr(draw, "rounded_rectangle"):
         draw.rounded_rectangle([0, 0, w - 1, h - 1], radius=radius, fill=bg_rgb, outline=None)
@@ -110,11 +184,11 @@ def draw_icon(level: int, scale: int = 1) -> Image.Image:
 
     # 1) 右侧数字区竖纹（左略暗→右略亮）
     stripe_count = 8
-    stripe_w = panel_w / stripe_count
+    stripe_w = g["panel_w"] / stripe_count
     for i in range(stripe_count):
         t = i / stripe_count
         shade = tuple(min(255, int(c + (255 - c) * (0.03 + 0.08 * t))) for c in bg_rgb)
-        x0 = panel_left + int(i * stripe_w)
+        x0 = g["panel_left"] + int(i * stripe_w)
         x1 = min(w, x0 + int(stripe_w) + 2)
         draw.rectangle([x0, 0, x1, h - 1], fill=shade)
 
@@ -142,17 +216,33 @@ def draw_icon(level: int, scale: int = 1) -> Image.Image:
     m_d.polygon(heart, fill=255)
     im.paste(hi, (0, 0), mask=mask)
 
-    # 4) 数字：白字 + 金描边（paste 之后重取 draw）
-    draw = ImageDraw.Draw(im)
+    # 5) 整体外圈金色细边（单独一层，数字画完后叠加在顶层）
+    border = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    b_d = ImageDraw.Draw(border)
+    if hasattr(b_d, "rounded_rectangle"):
+        b_d.rounded_rectangle(
+            [0, 0, w - 1, h - 1],
+            radius=radius,
+            fill=None,
+            outline=GOLD_BORDER,
+            width=max(1, int(1.5 * scale)),
+        )
+
+    return im, border
+
+
+def draw_icon(level: int, scale: int = 1) -> Image.Image:
+    """绘制等级图标（盾形徽章+心形宝石+整图金边+右侧竖纹），与参考图风格一致。"""
+    g = icon_geometry(scale)
+    w, h = g["w"], g["h"]
+    base, border = static_layers(segment_index(level), scale)
+    im = base.copy()
+
+    # 4) 数字：白字 + 金描边（FreeType 描边，一次 draw.text 完成）
     font_size = int(h * 0.38) if level >= 100 else int(h * 0.48)
-    try:
-        font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", font_size)
-    except Exception:
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-        except Exception:
-            font = ImageFont.load_default()
+    font = load_font(font_size)
     text = str(level)
+    draw = ImageDraw.Draw(im)
     if hasattr(draw, "textbbox"):
         bbox = draw.textbbox((0, 0), text, font=font)
     else:
@@ -160,48 +250,195 @@ def draw_icon(level: int, scale: int = 1) -> Image.Image:
         bbox = (0, 0, bbox[0], bbox[1])
     tw = bbox[2] - bbox[0]
     th = bbox[3] - bbox[1]
-    tx = panel_left + (panel_w - tw) / 2
+    tx = g["panel_left"] + (g["panel_w"] - tw) / 2
     ty = (h - th) / 2
     ox, oy = int(tx), int(ty)
     stroke = max(1, 2 * scale)
-    for dx in range(-stroke, stroke + 1):
-        for dy in range(-stroke, stroke + 1):
-            if dx == 0 and dy == 0:
-                continue
-            draw.text((ox + dx, oy + dy), text, font=font, fill=GOLD_STROKE)
-    draw.text((ox, oy), text, font=font, fill=WHITE)
-
-    # 5) 整体外圈金色细边（最后画，压在顶层）
-    if hasattr(draw, "rounded_rectangle"):
-        draw.rounded_rectangle(
-            [0, 0, w - 1, h - 1],
-            radius=radius,
-            fill=None,
-            outline=GOLD_BORDER,
-            width=max(1, int(1.5 * scale)),
-        )
+    draw.text((ox, oy), text, font=font, fill=WHITE, stroke_width=stroke, stroke_fill=GOLD_STROKE)
 
+    # 5) 外圈金边压在顶层
+    im.alpha_composite(border)
     return im
 
 
-def main():
-    root = Path(__file__).resolve().parent.parent
-    base_out = root / "ugc_flutter" / "assets" / "images" / "level_icons"
-    base_out.mkdir(parents=True, exist_ok=True)
+def render_to_file(task) -> str:
+    """绘制并保存单个图标（单进程与进程池共用，保证输出一致）。"""
+    level, scale, path = task
+    draw_icon(level, scale=scale).save(path, "PNG")
+    return path
+
+
+def atlas_layout():
+    """精灵图布局（1x 逻辑像素）：返回 (宽, 高, {level: (x, y, w, h)})。"""
+    cell_w, cell_h = W + 2 * ATLAS_PADDING, H + 2 * ATLAS_PADDING
+    rows = math.ceil(len(LEVELS) / ATLAS_COLUMNS)
+    rects = {}
+    for i, level in enumerate(LEVELS):
+        col, row = i % ATLAS_COLUMNS, i // ATLAS_COLUMNS
+        rects[level] = (col * cell_w + ATLAS_PADDING, row * cell_h + ATLAS_PADDING, W, H)
+    return ATLAS_COLUMNS * cell_w, rows * cell_h, rects
+
+
+def render_atlas(task) -> str:
+    """绘制某一倍率的整张精灵图并压缩保存。"""
+    scale, path = task
+    width, height, rects = atlas_layout()
+    sheet = Image.new("RGBA", (width * scale, height * scale), (0, 0, 0, 0))
+    for level, (x, y, _w, _h) in rects.items():
+        sheet.paste(draw_icon(level, scale=scale), (x * scale, y * scale))
+    sheet.save(path, "PNG", optimize=True)
+    return path
+
+
+def write_atlas_index(path: Path) -> None:
+    """写精灵图索引：紧凑 JSON，矩形为 1x 逻辑像素，{倍率}x/ 下的图按倍数换算。"""
+    width, height, rects = atlas_layout()
+    index = {
+        "image": f"{ATLAS_NAME}.png",
+        "size": [width, height],
+        "scales": [scale for scale, _subdir in VARIANTS],
+        "rects": {str(level): list(rect) for level, rect in rects.items()},
+    }
+    path.write_text(json.dumps(index, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def run_tasks(func, tasks, jobs: int) -> None:
+    """单进程或进程池执行，两种方式输出一致。"""
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            for _ in pool.map(func, tasks, chunksize=max(1, len(tasks) // (jobs * 4))):
+                pass
+    else:
+        for task in tasks:
+            func(task)
+
+
+@lru_cache(maxsize=None)
+def shared_input_digest() -> str:
+    """与等级无关的输入摘要：绘制代码、尺寸与颜色常量、字体文件内容、Pillow 版本。"""
+    h = hashlib.sha256()
+    for func in (segment_index, icon_geometry, static_layers, draw_icon, shield_verts, heart_verts, darken):
+        h.update(inspect.getsource(func).encode("utf-8"))
+    h.update(repr((W, H, GOLD_BORDER, GOLD_STROKE, WHITE)).encode("utf-8"))
+    font_path = find_font_path()
+    h.update(str(font_path).encode("utf-8"))
+    if font_path:
+        h.update(Path(font_path).read_bytes())
+    h.update(PIL.__version__.encode("utf-8"))
+    return h.hexdigest()
+
+
+def icon_hash(level: int, scale: int) -> str:
+    """单个图标的输入哈希：共享输入 + 等级 + 倍率 + 所在配色段的颜色。"""
+    h = hashlib.sha256(shared_input_digest().encode("utf-8"))
+    h.update(repr((level, scale, SEGMENTS[segment_index(level)])).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def atlas_hash(scale: int) -> str:
+    """精灵图的输入哈希：该倍率所有图标的哈希 + 布局与打包代码。"""
+    h = hashlib.sha256(inspect.getsource(render_atlas).encode("utf-8"))
+    h.update(repr((ATLAS_COLUMNS, ATLAS_PADDING)).encode("utf-8"))
+    for level in LEVELS:
+        h.update(icon_hash(level, scale).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def load_manifest(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
+
+def save_manifest(path: Path, manifest: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def select_changed(tasks, hashes, base_out: Path, manifest: dict, force: bool):
+    """挑出需要重画的任务：--force、输出缺失或输入哈希与清单不一致。"""
+    todo = []
+    for task, digest in zip(tasks, hashes):
+        path = Path(task[-1])
+        key = path.relative_to(base_out).as_posix()
+        if force or manifest.get(key) != digest or not path.exists():
+            todo.append(task)
+    return todo
+
+
+def record_hashes(tasks, hashes, base_out: Path, manifest: dict) -> None:
+    for task, digest in zip(tasks, hashes):
+        manifest[Path(task[-1]).relative_to(base_out).as_posix()] = digest
+
+
+def variant_dirs(base_out: Path):
+    """[(scale, subdir, out_dir), ...]，并创建目录。"""
+    dirs = []
     for scale, subdir in VARIANTS:
         out_dir = base_out / subdir if subdir else base_out
-        if subdir:
-            out_dir.mkdir(parents=True, exist_ok=True)
-        for level in range(1, 121):
-            im = draw_icon(level, scale=scale)
-            path = out_dir / f"level_{level:03d}.png"
-            im.save(path, "PNG")
-            print(path)
-        suffix = f" ({subdir})" if subdir else " (1x)"
-        print(f"已生成 120 个图标{suffix} -> {out_dir}")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        dirs.append((scale, subdir, out_dir))
+    return dirs
 
-    print(f"共输出 {len(VARIANTS) * 120} 个 PNG（1x + 2x + 3x）")
+
+def main():
+    parser = argparse.ArgumentParser(description="生成 1–120 级等级图标 PNG（1x、2.0x、3.0x）")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="并行进程数，0 表示 CPU 核数；默认 1（单进程）",
+    )
+    parser.add_argument(
+        "--atlas", action="store_true",
+        help=f"精灵图模式：每个倍率把全部等级打包成一张 {ATLAS_NAME}.png，并写 {ATLAS_NAME}.json 索引",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="忽略输入哈希清单，全部重新生成",
+    )
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    root = Path(__file__).resolve().parent.parent
+    base_out = root / "ugc_flutter" / "assets" / "images" / "level_icons"
+    dirs = variant_dirs(base_out)
+    manifest_path = base_out / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+
+    start = time.perf_counter()
+    if args.atlas:
+        tasks = [(scale, str(out_dir / f"{ATLAS_NAME}.png")) for scale, _subdir, out_dir in dirs]
+        hashes = [atlas_hash(scale) for scale, _path in tasks]
+        todo = select_changed(tasks, hashes, base_out, manifest, args.force)
+        run_tasks(render_atlas, todo, jobs)
+        write_atlas_index(base_out / f"{ATLAS_NAME}.json")
+        record_hashes(tasks, hashes, base_out, manifest)
+        save_manifest(manifest_path, manifest)
+        elapsed = time.perf_counter() - start
+        for _scale, subdir, out_dir in dirs:
+            suffix = f" ({subdir})" if subdir else " (1x)"
+            print(f"精灵图{suffix} -> {out_dir / f'{ATLAS_NAME}.png'}")
+        print(f"索引 -> {base_out / f'{ATLAS_NAME}.json'}")
+        print(f"重新生成 {len(todo)}/{len(tasks)} 张精灵图（其余输入未变化），用时 {elapsed:.2f}s（{jobs} 个进程）")
+        return
+
+    tasks = [
+        (level, scale, str(out_dir / f"level_{level:03d}.png"))
+        for scale, _subdir, out_dir in dirs
+        for level in LEVELS
+    ]
+    hashes = [icon_hash(level, scale) for level, scale, _path in tasks]
+    todo = select_changed(tasks, hashes, base_out, manifest, args.force)
+    run_tasks(render_to_file, todo, jobs)
+    record_hashes(tasks, hashes, base_out, manifest)
+    save_manifest(manifest_path, manifest)
+    elapsed = time.perf_counter() - start
+
+    for _scale, subdir, out_dir in dirs:
+        suffix = f" ({subdir})" if subdir else " (1x)"
+        print(f"{len(LEVELS)} 个图标{suffix} -> {out_dir}")
+    print(f"重新生成 {len(todo)}/{len(tasks)} 个 PNG（其余输入未变化），用时 {elapsed:.2f}s（{jobs} 个进程）")
 
 
 if __name__ == "__main__":
@@ -15,8 +15,31 @@ echo ""
 mkdir -p "$INSTALL_DIR"
 cd "$INSTALL_DIR"
 
-echo "📥 下载 download_figma_image.py ..."
-curl -fsSL "$REPO/download_figma_image.py" -o download_figma_image.py
+# 主脚本及其依赖的辅助模块
+FILES=(
+    download_figma_image.py
+    figma_render_cache.py
+    figma_transfer.py
+    figma_progress.py
+    figma_scales.py
+    figma_selection.py
+    figma_dedup.py
+    figma_batching.py
+    figma_schedule.py
+    figma_archive.py
+    figma_http.py
+    figma_daemon.py
+    figma_api.py
+    figma_client.py
+    figma_compress.py
+    figma_watch.py
+    figma_transcode.py
+    figma_svg.py
+)
+for f in "${FILES[@]}"; do
+    echo "📥 下载 $f ..."
+    curl -fsSL "$REPO/$f" -o "$f"
+done
 
 echo "📥 下载 requirements.txt ..."
 curl -fsSL "$REPO/requirements.txt" -o requirements.txt
@@ -43,8 +66,19 @@ fi
 
 # 创建 figmad 命令到 ~/.local/bin，确保全局可用
 mkdir -p "$BIN_DIR"
+# figmad daemon start|stop|status 管理常驻进程；常驻进程运行时自动转发（连不上时返回 75，回退为直接运行；--watch 始终直接运行）
 cat > "$BIN_DIR/figmad" << EOF
 #!/bin/bash
+if [ "\$1" = "daemon" ]; then
+    shift
+    exec "$PYTHON_BIN" "$INSTALL_DIR_ABS/figma_daemon.py" "\${1:-status}" "\${@:2}"
+fi
+case " \$* " in *" --watch "*) FIGMAD_NO_DAEMON=1 ;; esac
+if [ -z "\$FIGMAD_NO_DAEMON" ]; then
+    "$PYTHON_BIN" "$INSTALL_DIR_ABS/figma_daemon.py" forward "\$@"
+    STATUS=\$?
+    [ "\$STATUS" -ne 75 ] && exit "\$STATUS"
+fi
 exec "$PYTHON_BIN" "$INSTALL_DIR_ABS/download_figma_image.py" "\$@"
 EOF
 chmod +x "$BIN_DIR/figmad"
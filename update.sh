@@ -16,7 +16,9 @@ if [[ ! -d "$INSTALL_DIR" ]]; then
     exit 1
 fi
 
-cp "$SCRIPT_DIR/download_figma_image.py" "$INSTALL_DIR/"
+for f in download_figma_image.py figma_render_cache.py figma_transfer.py figma_progress.py figma_scales.py figma_selection.py figma_dedup.py figma_batching.py figma_schedule.py figma_archive.py figma_http.py figma_daemon.py figma_api.py figma_client.py figma_compress.py figma_watch.py figma_transcode.py figma_svg.py; do
+    cp "$SCRIPT_DIR/$f" "$INSTALL_DIR/"
+done
 cp "$SCRIPT_DIR/requirements.txt" "$INSTALL_DIR/" 2>/dev/null || true
 
 # 若存在 venv，更新依赖